@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import container
+import kdf
+from video import encrypt_message, decrypt_message
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32}{count:>6} ops {elapsed:>8.3f} s {elapsed / count * 1000:>9.2f} ms/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark repeated decrypts with and without the derived-key cache')
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args()
+
+    password = 'benchmark password'
+    token = encrypt_message('benchmark message', password)
+
+    def uncached():
+        for _ in range(args.count):
+            kdf.key_cache.clear()
+            decrypt_message(token, password)
+
+    def cached():
+        for _ in range(args.count):
+            decrypt_message(token, password)
+
+    kdf.key_cache.clear()
+    timed('decrypt, cache cleared each time', args.count, uncached)
+    kdf.key_cache.clear()
+    timed('decrypt, cached key', args.count, cached)
+    print(f"cache hits {kdf.key_cache.hits}, misses {kdf.key_cache.misses}")
+
+    messages = [f'message {i}' for i in range(args.count)]
+    timed('encrypt_message loop', args.count, lambda: [encrypt_message(m, password) for m in messages])
+    kdf.key_cache.clear()
+    timed('container.pack loop', args.count, lambda: [container.pack(m, password) for m in messages])
+    timed('container.pack_many batch', args.count, lambda: container.pack_many(messages, password))
+    packed = container.pack_many(messages, password)
+    kdf.key_cache.clear()
+    timed('container.unpack_many batch', args.count, lambda: container.unpack_many(packed, password))
+
+
+if __name__ == '__main__':
+    main()
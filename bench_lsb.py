@@ -0,0 +1,66 @@
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+from stegano import lsb
+
+import lsb_engine
+
+
+def random_image(megapixels, seed=0):
+    side = int((megapixels * 1_000_000) ** 0.5)
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+
+
+def best_of(repeat, func):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(megapixels, payload_sizes, repeat):
+    print(f"{'MP':>5} {'payload':>9} {'engine':>8} {'hide s':>8} {'reveal s':>9} {'MB/s':>8}")
+    for mp in megapixels:
+        array = random_image(mp)
+        for size in payload_sizes:
+            # base64-like text payload, as produced by Fernet in image_core
+            message = os.urandom(size).hex()[:size]
+            if len(message) * 8 + 32 > array.shape[0] * array.shape[1] * 3:
+                print(f"{mp:>5} {size:>9}  skipped: payload does not fit")
+                continue
+            for name, hide, reveal in (
+                ('numpy', lsb_engine.hide, lsb_engine.reveal),
+                ('stegano', lsb.hide, lsb.reveal),
+            ):
+                # stegano closes the image it is given, so hand each run a fresh one
+                hide_time, encoded = best_of(repeat, lambda: hide(Image.fromarray(array), message))
+                encoded = np.asarray(encoded)
+                reveal_time, revealed = best_of(repeat, lambda: reveal(Image.fromarray(encoded)))
+                assert revealed == message, f"{name} round trip failed"
+                throughput = size / 1e6 / (hide_time + reveal_time)
+                print(f"{mp:>5} {size:>9} {name:>8} {hide_time:>8.3f} {reveal_time:>9.3f} {throughput:>8.2f}")
+
+            # Cross-check format compatibility in both directions
+            assert lsb.reveal(lsb_engine.hide(Image.fromarray(array), message)) == message
+            assert lsb_engine.reveal(lsb.hide(Image.fromarray(array), message)) == message
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare NumPy LSB engine throughput against stegano')
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[1, 12])
+    parser.add_argument('--payload', type=int, nargs='+', default=[1024, 65536, 1048576],
+                        help='Payload sizes in bytes')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.megapixels, args.payload, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def scenarios(workdir):
+    from PIL import Image
+    carrier = os.path.join(workdir, 'carrier.png')
+    Image.new('RGB', (64, 64)).save(carrier)
+    return [
+        ('image CLI --help', ['image_gui_cli.py', '--help']),
+        ('image capacity', ['image_gui_cli.py', 'capacity', carrier]),
+        ('image encode', ['image_gui_cli.py', 'encode', carrier, 'startup', 'password']),
+        ('video CLI --help', ['video.py', '--help']),
+        ('launcher import', ['-c', 'import main_run']),
+    ]
+
+
+def parse_importtime(stderr):
+    """Return (total self time, {top-level module: cumulative time}) in microseconds."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), len(name) - len(name.lstrip()), name.strip()))
+    if not rows:
+        return 0, {}
+    top = min(indent for _, _, indent, _ in rows)
+    return sum(row[0] for row in rows), {name: cumulative for _, cumulative, indent, name in rows if indent == top}
+
+
+def run(argv, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + argv
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=HERE, capture_output=True, text=True)
+    return time.perf_counter() - start, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure CLI startup time and break it down with -X importtime')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per scenario (median is reported)')
+    parser.add_argument('--top', type=int, default=8, help='Slowest top-level imports to list per scenario')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, argv in scenarios(workdir):
+            run(argv)  # warm the OS file cache
+            wall = statistics.median(run(argv)[0] for _ in range(args.repeat))
+            total, modules = parse_importtime(run(argv, importtime=True)[1])
+            print(f"{label:<20} {wall * 1000:>8.1f} ms wall {total / 1000:>8.1f} ms importing")
+            for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+                print(f"    {name:<32}{cumulative / 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+# Reproducible throughput benchmark for image and video embed/extract.
+#
+# Synthetic carriers are generated locally with a fixed seed: random PNGs and
+# short lossless AVIs written with cv2.VideoWriter. Every case runs in a fresh
+# process so its peak RSS is reported on its own. Results are saved as JSON and
+# can be compared against a stored baseline to catch regressions:
+#
+#     python benchmark.py --output baseline.json
+#     python benchmark.py --baseline baseline.json
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+IMAGE_MEGAPIXELS = (1, 12, 48)
+VIDEO_SIZES = {'480p': (640, 480), '1080p': (1920, 1080), '4k': (3840, 2160)}
+VIDEO_CODECS = ('FFV1', 'HFYU')
+PAYLOAD_SIZES = (1024, 65536, 1048576)
+DEPTHS = (1, 2, 3, 4)
+PASSWORD = 'benchmark password'
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def make_image(path, megapixels, seed=0):
+    from PIL import Image
+    if os.path.exists(path):
+        return path
+    side = int((megapixels * 1_000_000) ** 0.5)
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (side, side, 3), dtype=np.uint8)).save(path, compress_level=1)
+    return path
+
+
+def make_video(path, size, codec, frames, seed=0):
+    import cv2
+    if os.path.exists(path):
+        return path
+    width, height = VIDEO_SIZES[size]
+    rng = np.random.default_rng(seed)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), 30, (width, height))
+    if not out.isOpened():
+        raise Exception(f"VideoWriter cannot write {codec}")
+    # A few distinct random frames repeated keeps generation fast but still incompressible
+    pool = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(min(frames, 4))]
+    for i in range(frames):
+        out.write(pool[i % len(pool)])
+    out.release()
+    return path
+
+
+def make_payload(size, seed=0):
+    # Incompressible, so payload size maps directly onto embedded bytes
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def best_time(repeat, func, setup=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(case):
+    """Run one benchmark case. Executed in a fresh worker process."""
+    import kdf
+    from image_core import encode_image, decode_image
+    from stats import NULL_STATS, Stats
+    from video import hide_video, unhide_data_from_video, unhide_video
+
+    payload = make_payload(case['payload'])
+    workdir = case['workdir']
+    carrier = case['carrier_path']
+    clear_keys = kdf.key_cache.clear
+    depth = case.get('depth', 1)
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    # The embed that sets up (or is) the case counts the pixels it changes
+    stats = Stats()
+
+    if case['kind'] == 'image':
+        output = os.path.join(workdir, f"out_{os.getpid()}.png")
+        encode_image(carrier, payload, PASSWORD, output, stats=stats, depth=depth)
+        if case['op'] == 'encode':
+            seconds = best_time(case['repeat'], lambda: encode_image(carrier, payload, PASSWORD, output, depth=depth),
+                                clear_keys)
+        else:
+            seconds = best_time(case['repeat'], lambda: decode_image(output, PASSWORD), clear_keys)
+            assert decode_image(output, PASSWORD) == payload
+    else:
+        import cv2
+        output = os.path.join(workdir, f"out_{os.getpid()}.avi")
+        width, height = VIDEO_SIZES[case['size']]
+        fourcc = cv2.VideoWriter_fourcc(*case['codec'])
+
+        def hide(stats=NULL_STATS):
+            # hide_video() raises, unlike hide_data_in_video(), so a failed hide is never timed
+            hide_video(carrier, output, 30, width, height, fourcc, payload, PASSWORD, stats=stats, depth=depth)
+
+        hide(stats)
+        if case['op'] == 'hide':
+            seconds = best_time(case['repeat'], hide, clear_keys)
+        else:
+            with quiet:
+                seconds = best_time(case['repeat'], lambda: unhide_data_from_video(output, PASSWORD), clear_keys)
+        assert unhide_video(output, PASSWORD) == payload, f"{case['id']}: the output does not decode to the payload"
+
+    if os.path.exists(output):
+        os.remove(output)
+    return {'id': case['id'], 'depth': depth, 'seconds': seconds, 'peak_rss_kb': peak_rss_kb(),
+            'pixels_touched': stats.counters.get('pixels_touched', 0),
+            'throughput_mb_s': case['payload'] / 1e6 / seconds if seconds else None}
+
+
+def case_id(base, depth):
+    # Depth 1 keeps the ids of results saved before depths were benchmarked
+    return base if depth == 1 else f"{base}/d{depth}"
+
+
+def fitting(plan, path, args):
+    """(payload size, depth) pairs whose payload fits in the carrier at that depth."""
+    for size in args.payload:
+        depths = plan(path, size)['depths']
+        for depth in args.depth:
+            if depths[depth]['fits']:
+                yield size, depth
+
+
+def build_cases(args, workdir):
+    import capacity
+
+    cases = []
+    for mp in args.image_mp:
+        path = make_image(os.path.join(workdir, f"carrier_{mp}mp.png"), mp)
+        for size, depth in fitting(capacity.plan, path, args):
+            for op in ('encode', 'decode'):
+                cases.append({'id': case_id(f"image/{op}/{mp}mp/{size}", depth), 'kind': 'image', 'op': op,
+                              'carrier_path': path, 'payload': size, 'depth': depth})
+    for size_name in args.video_size:
+        for codec in args.codec:
+            path = make_video(os.path.join(workdir, f"carrier_{size_name}_{codec}.avi"), size_name, codec, args.frames)
+            for size, depth in fitting(capacity.plan, path, args):
+                for op in ('hide', 'unhide'):
+                    cases.append({'id': case_id(f"video/{op}/{size_name}/{codec}/{size}", depth), 'kind': 'video',
+                                  'op': op, 'carrier_path': path, 'size': size_name, 'codec': codec, 'payload': size,
+                                  'depth': depth})
+    for case in cases:
+        case['workdir'] = workdir
+        case['repeat'] = args.repeat
+    return cases
+
+
+def environment():
+    import cv2
+    import PIL
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'opencv': cv2.__version__, 'pillow': PIL.__version__, 'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(results, baseline, threshold):
+    """Return the cases that got slower than ``threshold`` times their baseline time."""
+    previous = {result['id']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['id'])
+        if before is None or not before['seconds']:
+            continue
+        ratio = result['seconds'] / before['seconds']
+        result['baseline_ratio'] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark image and video embed/extract on synthetic carriers')
+    parser.add_argument('--image-mp', type=float, nargs='*', default=list(IMAGE_MEGAPIXELS))
+    parser.add_argument('--video-size', nargs='*', choices=sorted(VIDEO_SIZES), default=list(VIDEO_SIZES))
+    parser.add_argument('--codec', nargs='*', choices=VIDEO_CODECS, default=list(VIDEO_CODECS))
+    parser.add_argument('--payload', type=int, nargs='*', default=list(PAYLOAD_SIZES), help='Payload sizes in bytes')
+    parser.add_argument('--depth', type=int, nargs='*', choices=DEPTHS, default=list(DEPTHS), help='Bits per channel to embed at')
+    parser.add_argument('--frames', type=int, default=30, help='Frames per synthetic video')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--quick', action='store_true', help='Small carriers only: 1 MP image, 480p FFV1, 1 KiB/64 KiB payloads, depths 1 and 4')
+    parser.add_argument('--workdir', help='Directory for generated carriers (reused between runs)')
+    parser.add_argument('--output', help='Write results JSON here')
+    parser.add_argument('--baseline', help='Compare against a previous results JSON')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Slowdown ratio that counts as a regression')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.image_mp, args.video_size, args.codec = [1], ['480p'], ['FFV1']
+        args.payload, args.frames, args.depth = [1024, 65536], 10, [1, 4]
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(workdir, exist_ok=True)
+        cases = build_cases(args, workdir)
+
+        results = []
+        context = multiprocessing.get_context('spawn')
+        for case in cases:
+            # A new process per case keeps peak RSS from leaking between cases
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (case,))
+            results.append(result)
+            rss = f"{result['peak_rss_kb'] / 1024:.0f} MiB" if result['peak_rss_kb'] else 'n/a'
+            print(f"{result['id']:<44} {result['seconds']:>9.4f} s  {result['throughput_mb_s']:>9.2f} MB/s  "
+                  f"{result['pixels_touched']:>10} px touched  peak RSS {rss}")
+
+    report = {'environment': environment(), 'results': results}
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for result in regressions:
+            print(f"REGRESSION {result['id']}: {result['baseline_ratio']}x baseline")
+        status = 1 if regressions else 0
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import json
+import os
+
+# PIL and the payload container are imported where they are used, so the
+# CLIs can build their capacity subcommand without loading them
+VIDEO_EXTENSIONS = ('.avi', '.mp4', '.mov', '.mkv')
+DEPTHS = (1, 2, 3, 4)
+CARRIER_CHANNELS = 3
+
+
+def packed_size(payload_size):
+    """Worst-case container size for ``payload_size`` bytes, i.e. when compression doesn't help."""
+    import container
+    return container.HEADER.size + container.sealed_length(payload_size)
+
+
+def max_payload(container_bytes):
+    """Largest incompressible payload whose container fits in ``container_bytes``."""
+    import container
+    body = container_bytes - container.HEADER.size - container.SUBKEY_SALT
+    chunks, rest = divmod(max(0, body), container.STREAM_CHUNK + container.TAG_SIZE)
+    return chunks * container.STREAM_CHUNK + max(0, rest - container.TAG_SIZE)
+
+
+def carrier_bytes(npixels, header_size, depth):
+    """Container bytes ``npixels`` pixels hold at ``depth`` bits on R, G and B.
+
+    Mirrors lsb_engine.body_capacity(): the header is always written at 1 bit
+    per channel and the body starts on the next whole pixel. Kept here so
+    probing does not import numpy.
+    """
+    body_start = -(-header_size * 8 // CARRIER_CHANNELS)
+    return header_size + max(0, npixels - body_start) * CARRIER_CHANNELS * depth // 8
+
+
+def image_capacity(path):
+    """Capacity of an image carrier, from its header only (pixels are not decoded)."""
+    import container
+    from PIL import Image
+    with Image.open(path) as image:
+        width, height = image.size
+        mode = image.mode
+    depths = {}
+    for depth in DEPTHS:
+        total = carrier_bytes(width * height, container.HEADER.size, depth)
+        depths[depth] = {'container_bytes': total, 'payload_bytes': max_payload(total)}
+    return {'path': path, 'kind': 'image', 'width': width, 'height': height, 'mode': mode, 'depths': depths}
+
+
+def video_capacity(path):
+    """Capacity of a video carrier from the container metadata reported by OpenCV."""
+    import cv2
+    from video import frame_capacity
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise Exception(f"Error opening video file {path}.")
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    depths = {}
+    for depth in DEPTHS:
+        per_frame = frame_capacity(width, height, depth)
+        total = per_frame * frame_count
+        depths[depth] = {'frame_bytes': per_frame, 'container_bytes': total, 'payload_bytes': max_payload(total)}
+    return {'path': path, 'kind': 'video', 'width': width, 'height': height, 'frame_count': frame_count,
+            'fps': fps, 'depths': depths}
+
+
+def probe(path):
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        return video_capacity(path)
+    return image_capacity(path)
+
+
+def plan(path, payload_size):
+    """Probe ``path`` and work out, per depth, whether a payload fits and how many frames it needs."""
+    report = probe(path)
+    needed = packed_size(payload_size)
+    report['payload_size'] = payload_size
+    report['container_size'] = needed
+    for info in report['depths'].values():
+        info['fits'] = needed <= info['container_bytes']
+        if report['kind'] == 'video':
+            info['frames_needed'] = -(-needed // info['frame_bytes']) if info['frame_bytes'] > 0 else None
+    return report
+
+
+def format_report(report):
+    lines = [f"{report['path']}: {report['kind']} {report['width']}x{report['height']}"
+             + (f", {report['frame_count']} frames" if report['kind'] == 'video' else f", {report['mode']}")]
+    for depth, info in report['depths'].items():
+        line = f"  {depth} bit/channel: {info['payload_bytes']} payload bytes"
+        if report['kind'] == 'video':
+            line += f" ({info['frame_bytes']} container bytes per frame)"
+        if 'fits' in info:
+            line += ", fits" if info['fits'] else ", does not fit"
+            if info.get('frames_needed') is not None:
+                line += f" in {info['frames_needed']} carrier frame(s)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def add_capacity_arguments(parser):
+    parser.add_argument('carriers', nargs='+', help='Image or video files to probe')
+    parser.add_argument('--payload-size', type=int, help='Plan for a payload of this many bytes')
+    parser.add_argument('--payload', help='Plan for the contents of this file')
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per carrier')
+
+
+def capacity_cli(args):
+    payload_size = args.payload_size
+    if args.payload:
+        payload_size = os.path.getsize(args.payload)
+    for path in args.carriers:
+        try:
+            report = probe(path) if payload_size is None else plan(path, payload_size)
+        except Exception as e:
+            report = {'path': path, 'error': str(e)}
+            if not args.json:
+                print(f"{path}: error: {e}")
+                continue
+        print(json.dumps(report) if args.json else format_report(report))
@@ -0,0 +1,442 @@
+import base64
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+from stats import NULL_STATS
+
+# Binary payload container shared by the image and video paths:
+#
+#   magic | version | codec | flags | KDF iterations | salt | body length | body
+#
+# The plaintext is compressed before it is encrypted, because ciphertext does
+# not compress; the codec byte names one of CODECS below. bz2 and lzma are
+# imported only when they are used.
+#
+# A version 2 body is sealed in chunks: the compressed plaintext is cut into
+# STREAM_CHUNK byte pieces, each encrypted with AES-256-GCM under the derived
+# key with the header as associated data. The nonce is the chunk index and a
+# last-chunk flag, so chunks cannot be reordered, dropped or cut off
+# unnoticed. Every chunk is sealed and opened on its own: Sealer encrypts
+# only the byte ranges asked for, and Opener decrypts and verifies chunks as
+# their bytes arrive, so a video is encrypted as its frames are embedded and
+# decrypted as they are extracted without the whole ciphertext in memory.
+#
+# Version 3 adds a key hierarchy so that many containers cost one PBKDF2 run:
+# the header salt and iterations give the master key (see master_key()), and
+# the body starts with a random SUBKEY_SALT from which HKDF derives that
+# container's own GCM key. Containers may share a master key, and with it a
+# header salt, without ever sharing a GCM key, so the index nonces are never
+# reused. Version 2 bodies, sealed under the PBKDF2 key itself, and version 1
+# bodies, a Fernet token with its base64 layer removed, are still read.
+#
+# cryptography is imported where it is used so that reading headers
+# (capacity planning, probing) does not pay for loading it.
+MAGIC = b'SGC'
+FERNET_VERSION = 1
+STREAM_VERSION = 2
+SUBKEY_VERSION = 3
+VERSION = SUBKEY_VERSION
+HEADER = struct.Struct('>3sBBBI16sI')
+
+STREAM_CHUNK = 1 << 16
+TAG_SIZE = 16
+SUBKEY_SALT = 16
+# 96-bit GCM nonce: chunk index and last-chunk flag
+NONCE = struct.Struct('>3xQB')
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_BZ2 = 2
+CODEC_LZMA = 3
+
+# auto tries every codec on this much of a larger payload and compresses the
+# whole payload only with the one that shrank the sample most
+AUTO_SAMPLE = 1 << 16
+
+FLAG_BINARY = 0x01
+# Bits 1-5 of the flags hold the carrier layout byte (see lsb_engine) the body
+# was embedded with; 0 is 1 bit on R, G and B, which older containers use
+LAYOUT_SHIFT = 1
+LAYOUT_BITS = 0x1F
+
+ContainerHeader = namedtuple('ContainerHeader', 'version codec flags iterations salt body_length')
+MasterKey = namedtuple('MasterKey', 'salt iterations key')
+
+
+def _bz2_compress(data, level):
+    import bz2
+    return bz2.compress(data, level)
+
+
+def _bz2_decompress(data):
+    import bz2
+    return bz2.decompress(data)
+
+
+def _lzma_compress(data, level):
+    import lzma
+    # The GCM tags already cover the body, so the xz check is left out
+    return lzma.compress(data, check=lzma.CHECK_NONE, preset=level)
+
+
+def _lzma_decompress(data):
+    import lzma
+    return lzma.decompress(data)
+
+
+def _bz2_decompressor():
+    import bz2
+    return bz2.BZ2Decompressor()
+
+
+def _lzma_decompressor():
+    import lzma
+    return lzma.LZMADecompressor()
+
+
+class _PassThrough:
+    def decompress(self, data):
+        return data
+
+
+Codec = namedtuple('Codec', 'id name compress decompress decompressor levels default_level')
+
+CODECS = {codec.name: codec for codec in (
+    Codec(CODEC_NONE, 'none', lambda data, level: data, lambda data: data, _PassThrough, range(0, 1), 0),
+    Codec(CODEC_ZLIB, 'zlib', zlib.compress, zlib.decompress, zlib.decompressobj, range(0, 10), 9),
+    Codec(CODEC_BZ2, 'bz2', _bz2_compress, _bz2_decompress, _bz2_decompressor, range(1, 10), 9),
+    Codec(CODEC_LZMA, 'lzma', _lzma_compress, _lzma_decompress, _lzma_decompressor, range(0, 10), 6),
+)}
+CODEC_NAMES = ('auto',) + tuple(CODECS)
+_CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+
+def compress(data, codec='auto', level=None):
+    """Compress ``data`` with the named codec. Returns (codec id, compressed data).
+
+    ``auto`` picks the codec, at its default level, that compresses the
+    first AUTO_SAMPLE bytes best, and falls back to ``none`` when nothing
+    helps. ``level`` applies to a named codec.
+    """
+    if codec != 'auto':
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}; choose from {', '.join(CODEC_NAMES)}")
+        entry = CODECS[codec]
+        level = entry.default_level if level is None else level
+        if level not in entry.levels:
+            raise ValueError(f"Level {level} is out of range for {codec}")
+        return entry.id, entry.compress(data, level)
+
+    sample = data[:AUTO_SAMPLE]
+    best = (None, sample)
+    for entry in CODECS.values():
+        if entry.id != CODEC_NONE:
+            compressed = entry.compress(sample, entry.default_level)
+            if len(compressed) < len(best[1]):
+                best = (entry, compressed)
+    entry, compressed = best
+    if entry is None:
+        return CODEC_NONE, data
+    if len(data) > AUTO_SAMPLE:
+        # Only the winner runs over the whole payload
+        compressed = entry.compress(data, entry.default_level)
+        if len(compressed) >= len(data):
+            return CODEC_NONE, data
+    return entry.id, compressed
+
+
+def decompress(codec, data):
+    if codec not in _CODECS_BY_ID:
+        raise ValueError(f"Unsupported payload codec {codec}")
+    return _CODECS_BY_ID[codec].decompress(data)
+
+
+def sealed_length(size):
+    """Version 3 body length for ``size`` bytes of compressed plaintext."""
+    return SUBKEY_SALT + size + TAG_SIZE * max(1, -(-size // STREAM_CHUNK))
+
+
+def master_key(password, salt=None, iterations=None, stats=NULL_STATS):
+    """Run PBKDF2 once for any number of containers sealed or opened with the result.
+
+    ``salt`` defaults to a fresh random one and ``iterations`` to
+    ``kdf.ITERATIONS``.
+    """
+    from kdf import ITERATIONS, derive_key
+
+    salt = salt or os.urandom(16)
+    iterations = iterations or ITERATIONS
+    with stats.span('kdf'):
+        key = derive_key(password, salt, iterations)
+    return MasterKey(salt, iterations, base64.urlsafe_b64decode(key))
+
+
+def _aead(password, header, stats):
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    return AESGCM(master_key(password, header.salt, header.iterations, stats).key)
+
+
+def _subkey_aead(key, subkey_salt):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    hkdf = HKDF(algorithm=hashes.SHA256(), length=32, salt=subkey_salt, info=MAGIC + bytes([SUBKEY_VERSION]))
+    return AESGCM(hkdf.derive(key.key))
+
+
+class Sealer:
+    """A version 3 container whose body is encrypted on demand.
+
+    The payload is compressed and the key derived up front, from ``key`` (a
+    MasterKey) when one is given and otherwise from ``password``; ``read()``
+    encrypts only the chunks a byte range overlaps. The last chunk sealed is
+    kept, so reads smaller than a chunk (a video frame's worth) walking
+    through the body seal each chunk once. ``read()`` may be called from
+    several threads at once; a chunk is at worst sealed again.
+    """
+
+    def __init__(self, payload, password, iterations=None, stats=NULL_STATS, layout=0, codec='auto', level=None,
+                 key=None):
+        binary = isinstance(payload, (bytes, bytearray, memoryview))
+        data = bytes(payload) if binary else payload.encode('utf-8')
+        with stats.span('compress'):
+            codec, self._data = compress(data, codec, level)
+        stats.count('compressed_bytes', len(self._data))
+
+        key = key or master_key(password, iterations=iterations, stats=stats)
+        flags = (FLAG_BINARY if binary else 0) | (layout & LAYOUT_BITS) << LAYOUT_SHIFT
+        self.head = HEADER.pack(MAGIC, SUBKEY_VERSION, codec, flags, key.iterations, key.salt,
+                                sealed_length(len(self._data)))
+        self.header = parse_header(self.head)
+        self.total_length = total_length(self.header)
+        self.chunk_count = max(1, -(-len(self._data) // STREAM_CHUNK))
+        subkey_salt = os.urandom(SUBKEY_SALT)
+        self._prefix = self.head + subkey_salt
+        self._aead = _subkey_aead(key, subkey_salt)
+        self._stats = stats
+        # (index, sealed chunk), replaced as a whole so threads never see half of it
+        self._last = (None, None)
+
+    def seal_chunk(self, index):
+        last_index, sealed = self._last
+        if last_index == index:
+            return sealed
+        plaintext = self._data[index * STREAM_CHUNK:(index + 1) * STREAM_CHUNK]
+        with self._stats.span('encrypt'):
+            sealed = self._aead.encrypt(NONCE.pack(index, index == self.chunk_count - 1), plaintext, self.head)
+        self._last = (index, sealed)
+        return sealed
+
+    def read(self, offset, length):
+        """Return ``length`` bytes of the container from ``offset`` (fewer at its end)."""
+        end = min(offset + length, self.total_length)
+        prefix = len(self._prefix)
+        parts = [self._prefix[offset:end]] if offset < prefix else []
+        sealed = STREAM_CHUNK + TAG_SIZE
+        lo, hi = max(0, offset - prefix), end - prefix
+        for index in range(lo // sealed, -(-hi // sealed) if hi > lo else 0):
+            base = index * sealed
+            parts.append(self.seal_chunk(index)[max(0, lo - base):hi - base])
+        return b''.join(parts)
+
+
+def pack(payload, password, iterations=None, stats=NULL_STATS, layout=0, codec='auto', level=None, key=None):
+    """Compress, encrypt and frame ``payload`` (str or bytes) into a container.
+
+    ``iterations`` defaults to ``kdf.ITERATIONS``; ``layout`` is recorded in
+    the header for the carrier. ``codec`` and ``level`` are as in compress().
+    A MasterKey ``key`` replaces ``password`` and ``iterations``.
+    """
+    sealer = Sealer(payload, password, iterations, stats, layout, codec, level, key)
+    return sealer.read(0, sealer.total_length)
+
+
+def pack_many(payloads, password, iterations=None, stats=NULL_STATS, layout=0, codec='auto', level=None):
+    """pack() every payload under one master key, so PBKDF2 runs once for the lot."""
+    key = master_key(password, iterations=iterations, stats=stats)
+    return [pack(payload, None, stats=stats, layout=layout, codec=codec, level=level, key=key) for payload in payloads]
+
+
+def parse_header(data):
+    """Parse the first ``HEADER.size`` bytes of a container.
+
+    Raises ValueError if they are not a container header.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("Not a payload container: too short")
+    magic, version, codec, flags, iterations, salt, body_length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a payload container")
+    if version not in (FERNET_VERSION, STREAM_VERSION, SUBKEY_VERSION):
+        raise ValueError(f"Unsupported payload container version {version}")
+    return ContainerHeader(version, codec, flags, iterations, salt, body_length)
+
+
+def is_container(data):
+    try:
+        parse_header(data)
+    except ValueError:
+        return False
+    return True
+
+
+def layout(header):
+    return header.flags >> LAYOUT_SHIFT & LAYOUT_BITS
+
+
+def total_length(header):
+    return HEADER.size + header.body_length
+
+
+class Opener:
+    """Decrypts a container as its bytes arrive.
+
+    ``write(offset, data)`` takes any byte range of the container; ranges may
+    come out of order or more than once. Each chunk of a version 2 body is
+    verified, decrypted and decompressed as soon as it and every byte before
+    it have arrived, so only out-of-order data is held, and a wrong password
+    or tampered chunk raises InvalidToken at the first chunk. Version 1
+    bodies are decrypted whole by finish(). A MasterKey ``key`` is used for
+    a version 3 container with its salt and iterations instead of deriving
+    one from ``password``.
+    """
+
+    def __init__(self, password, stats=NULL_STATS, key=None):
+        self.password = password
+        self.stats = stats
+        self.key = key
+        self.head = None
+        self.header = None
+        self.received = 0
+        self._pending = {}
+        self._buffer = bytearray()
+        self._chunk = 0
+        self._plaintext = []
+        self._aead = None
+
+    def write(self, offset, data):
+        if offset < self.received:
+            data = data[self.received - offset:]
+            offset = self.received
+        if data:
+            self._pending[offset] = bytes(data)
+        while self.received in self._pending:
+            data = self._pending.pop(self.received)
+            if self.header is not None:
+                data = data[:total_length(self.header) - self.received]
+            self.received += len(data)
+            self._buffer += data
+            self._consume()
+
+    def _consume(self):
+        if self.header is None:
+            if len(self._buffer) < HEADER.size:
+                return
+            self.head = bytes(self._buffer[:HEADER.size])
+            self.header = parse_header(self.head)
+            del self._buffer[:HEADER.size]
+            if self.received > total_length(self.header):
+                del self._buffer[self.header.body_length:]
+                self.received = total_length(self.header)
+            if self.header.version == FERNET_VERSION:
+                return
+            if self.header.codec not in _CODECS_BY_ID:
+                raise ValueError(f"Unsupported payload codec {self.header.codec}")
+            if self.header.version == STREAM_VERSION:
+                self._aead = _aead(self.password, self.header, self.stats)
+            self._decompressor = _CODECS_BY_ID[self.header.codec].decompressor()
+        if self.header.version == FERNET_VERSION:
+            return
+        from cryptography.exceptions import InvalidTag
+        from cryptography.fernet import InvalidToken
+
+        if self._aead is None:
+            if len(self._buffer) < SUBKEY_SALT:
+                return
+            subkey_salt = bytes(self._buffer[:SUBKEY_SALT])
+            del self._buffer[:SUBKEY_SALT]
+            key = self.key
+            if key is None or (key.salt, key.iterations) != (self.header.salt, self.header.iterations):
+                if self.password is None:
+                    raise InvalidToken
+                key = master_key(self.password, self.header.salt, self.header.iterations, self.stats)
+            self._aead = _subkey_aead(key, subkey_salt)
+
+        sealed = STREAM_CHUNK + TAG_SIZE
+        complete = self.received == total_length(self.header)
+        while len(self._buffer) >= sealed or complete and self._buffer:
+            last = len(self._buffer) <= sealed and complete
+            chunk = bytes(self._buffer[:sealed])
+            del self._buffer[:sealed]
+            try:
+                with self.stats.span('decrypt'):
+                    data = self._aead.decrypt(NONCE.pack(self._chunk, last), chunk, self.head)
+            except InvalidTag:
+                raise InvalidToken from None
+            self._chunk += 1
+            with self.stats.span('decompress'):
+                self._plaintext.append(self._decompressor.decompress(data))
+
+    def finish(self):
+        """Return the payload, str or bytes. Raises ValueError if bytes are missing."""
+        if self.header is None or self.received < total_length(self.header):
+            raise ValueError("Payload container is truncated")
+        if self.header.version == FERNET_VERSION:
+            self._plaintext = [self._open_fernet()]
+        elif getattr(self._decompressor, 'eof', True) is False:
+            raise ValueError("Payload is truncated")
+        data = b''.join(self._plaintext)
+        if self.header.flags & FLAG_BINARY:
+            return data
+        return data.decode('utf-8')
+
+    def _open_fernet(self):
+        from cryptography.fernet import Fernet
+        from kdf import derive_key
+
+        token = base64.urlsafe_b64encode(bytes(self._buffer))
+        with self.stats.span('kdf'):
+            key = derive_key(self.password, self.header.salt, self.header.iterations)
+        with self.stats.span('decrypt'):
+            data = Fernet(key).decrypt(token)
+        with self.stats.span('decompress'):
+            return decompress(self.header.codec, data)
+
+
+def unpack(container, password, stats=NULL_STATS, key=None):
+    """Decrypt a container. Returns str, or bytes for binary payloads.
+
+    Raises ValueError for malformed data and cryptography's InvalidToken
+    for a wrong password or tampered body. ``key`` is as for Opener.
+    """
+    opener = Opener(password, stats, key)
+    opener.write(0, container)
+    return opener.finish()
+
+
+def unpack_many(containers, password, stats=NULL_STATS):
+    """unpack() every container, running PBKDF2 once per distinct header salt.
+
+    Containers that fail to open come back as None.
+    """
+    from cryptography.fernet import InvalidToken
+
+    keys = {}
+    results = []
+    for data in containers:
+        try:
+            header = parse_header(data)
+            key = None
+            if header.version == SUBKEY_VERSION:
+                key = keys.get((header.salt, header.iterations))
+                if key is None:
+                    key = keys[header.salt, header.iterations] = master_key(password, header.salt,
+                                                                           header.iterations, stats)
+            results.append(unpack(data, password, stats, key))
+        except (ValueError, InvalidToken):
+            results.append(None)
+    return results
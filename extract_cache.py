@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Cache of extracted payload containers, so a second decode of the same
+# carrier (typically after a mistyped password) only repeats the decryption.
+# Entries are keyed on the file's path, size, mtime and a hash of a few
+# sampled blocks, plus what was extracted from it; a file that changes gets
+# a new key and its old entry simply ages out. The cached bytes are the
+# container as embedded, still encrypted, so neither the memory nor the
+# on-disk cache holds a plaintext.
+SAMPLE_SIZE = 1 << 16
+
+
+def fingerprint(path, sample_size=SAMPLE_SIZE):
+    """(absolute path, size, mtime, hash of the first, middle and last ``sample_size`` bytes) of a file."""
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for offset in sorted({0, max(0, (stat.st_size - sample_size) // 2), max(0, stat.st_size - sample_size)}):
+            f.seek(offset)
+            digest.update(f.read(sample_size))
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+class ExtractionCache:
+    """Bounded LRU cache of extracted containers, optionally backed by a directory.
+
+    Memory holds at most ``maxsize`` entries and ``max_bytes`` bytes. With
+    ``directory`` every entry is also written there (readable by the owner
+    only), so separate CLI runs share it; the least recently used files are
+    removed once the directory holds more than ``max_disk_bytes``.
+    """
+
+    def __init__(self, maxsize=16, max_bytes=256 << 20, directory=None, max_disk_bytes=1 << 30):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def make_key(path, what):
+        """Key for ``what`` (e.g. 'video', 'image:0') extracted from the file at ``path``."""
+        return fingerprint(path) + (what,)
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode('utf-8')).hexdigest() + '.bin')
+
+    def get(self, key):
+        """Return the cached bytes for ``key``, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        data = bytes(data)
+        self._remember(key, data)
+        if self.directory:
+            self._write(key, data)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= len(self._entries[key])
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            self._nbytes += len(data)
+            while len(self._entries) > self.maxsize or self._nbytes > self.max_bytes:
+                self._nbytes -= len(self._entries.popitem(last=False)[1])
+
+    def _write(self, key, data):
+        path = self._disk_path(key)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, old in sorted(files):
+            if total <= self.max_disk_bytes or old == path:
+                break
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+extraction_cache = ExtractionCache()
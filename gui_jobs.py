@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def format_progress(done, total, elapsed):
+    """'Frames 120/3000 - 45.2 fps - ETA 01:04', leaving out what isn't known yet."""
+    fps = done / elapsed if elapsed > 0 else 0.0
+    text = f"Frames {done}/{total}" if total else f"Frames {done}"
+    text += f" - {fps:.1f} fps"
+    if total and fps > 0 and done < total:
+        minutes, seconds = divmod(int((total - done) / fps), 60)
+        text += f" - ETA {minutes:02d}:{seconds:02d}"
+    return text
+
+
+def describe_error(error):
+    """Text for an error dialog. A wrong password raises InvalidToken, whose str() is empty."""
+    from cryptography.fernet import InvalidToken
+
+    if isinstance(error, InvalidToken):
+        return "Wrong password or corrupted data"
+    return str(error) or type(error).__name__
+
+
+class JobRunner:
+    """Runs one background job at a time for a Tk window.
+
+    The job runs on a worker thread and never touches Tk. It reports through a
+    queue that the window drains with ``after()``, so every callback runs on
+    the Tk main thread. ``on_progress(done, total, text)`` is called at most
+    once every ``poll_ms``.
+    """
+
+    def __init__(self, widget, on_progress, poll_ms=100):
+        self.widget = widget
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self._on_done = None
+        self._on_error = None
+        self._events = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._started = 0.0
+
+    @property
+    def busy(self):
+        return self._thread is not None
+
+    def start(self, func, on_done, on_error):
+        """Run ``func(progress)`` in the background.
+
+        ``on_done(result)`` is called when it returns and ``on_error(exception)``
+        when it raises, including JobCancelled after cancel(). Returns False
+        without starting anything if a job is already running.
+        """
+        if self.busy:
+            return False
+        self._cancel.clear()
+        self._on_done = on_done
+        self._on_error = on_error
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, args=(func,), daemon=True)
+        self._thread.start()
+        self.widget.after(self.poll_ms, self._poll)
+        return True
+
+    def cancel(self):
+        """Ask the running job to stop at its next progress report."""
+        self._cancel.set()
+
+    def _progress(self, done, total):
+        # Called on the worker thread; this is where cancellation takes effect
+        if self._cancel.is_set():
+            raise JobCancelled("Cancelled by user")
+        self._events.put(('progress', (done, total)))
+
+    def _run(self, func):
+        try:
+            result = func(self._progress)
+            if self._cancel.is_set():
+                raise JobCancelled("Cancelled by user")
+            self._events.put(('done', result))
+        except Exception as e:
+            self._events.put(('error', e))
+
+    def _poll(self):
+        latest = None
+        finished = None
+        while True:
+            try:
+                kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                latest = value
+            else:
+                finished = (kind, value)
+
+        if latest:
+            done, total = latest
+            self.on_progress(done, total, format_progress(done, total, time.monotonic() - self._started))
+        if finished:
+            self._thread = None
+            kind, value = finished
+            (self._on_done if kind == 'done' else self._on_error)(value)
+        else:
+            self.widget.after(self.poll_ms, self._poll)
@@ -0,0 +1,141 @@
+import base64
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from image_core import encode_image, decode_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_manifest(path):
+    """Read batch items from a CSV file with a header row or from a JSONL file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return [dict(row) for row in csv.DictReader(f)]
+
+
+def expand_source(source, skip_encoded=False):
+    """Return the image paths named by a directory or a glob pattern, sorted."""
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    paths = [path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS)]
+    if skip_encoded:
+        # Don't re-encode the outputs of an earlier run in the same directory
+        paths = [path for path in paths if not path.lower().endswith('_encoded.png')]
+    return sorted(paths)
+
+
+def build_items(source, message=None, payload=None, skip_encoded=False):
+    if source.lower().endswith(('.csv', '.jsonl')) and os.path.isfile(source):
+        return load_manifest(source)
+    items = [{'input': path} for path in expand_source(source, skip_encoded)]
+    for item in items:
+        if message is not None:
+            item['message'] = message
+        if payload is not None:
+            item['payload'] = payload
+    return items
+
+
+def encode_item(item):
+    """Worker for encode-batch. Never raises; failures are reported in the result."""
+    start = time.perf_counter()
+    result = {'input': item.get('input')}
+    try:
+        message = item.get('message')
+        if not message and item.get('payload'):
+            with open(item['payload'], 'rb') as f:
+                message = f.read()
+        if not message:
+            raise ValueError("item has no message or payload")
+        result['output'] = encode_image(item['input'], message, item['password'], item.get('output') or None,
+                                        key=item.get('key'))
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def decode_item(item):
+    """Worker for decode-batch. Writes the payload to ``output`` when one is given.
+
+    Without ``output`` a text message is returned as ``message`` and a binary
+    payload base64-encoded as ``payload_b64``, so every result is valid JSON.
+    """
+    start = time.perf_counter()
+    result = {'input': item.get('input')}
+    try:
+        # The batch already runs one process per core
+        payload = decode_image(item['input'], item['password'], workers=1)
+        if item.get('output'):
+            with open(item['output'], 'wb') as f:
+                f.write(payload if isinstance(payload, bytes) else payload.encode('utf-8'))
+            result['output'] = item['output']
+        elif isinstance(payload, bytes):
+            result['payload_b64'] = base64.b64encode(payload).decode('ascii')
+        else:
+            result['message'] = payload
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def run_batch(worker, items, password, results, workers=None, chunksize=16):
+    """Run ``worker`` over ``items`` in a process pool, writing one JSON line per item.
+
+    Returns (succeeded, failed) counts.
+    """
+    for item in items:
+        item.setdefault('password', password)
+    if worker is encode_item:
+        # PBKDF2 runs once per password for the whole batch rather than once
+        # per item; every container still gets its own subkey (see container)
+        import container
+        keys = {}
+        for item in items:
+            if item['password'] not in keys:
+                keys[item['password']] = container.master_key(item['password'])
+            item['key'] = keys[item['password']]
+    succeeded = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() submits the items in chunks and yields results in input order
+        for result in executor.map(worker, items, chunksize=max(1, chunksize)):
+            results.write(json.dumps(result) + '\n')
+            results.flush()
+            if result['status'] == 'ok':
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
+
+
+def batch_cli(args):
+    if args.command == 'encode-batch':
+        items = build_items(args.source, args.message, args.payload, skip_encoded=True)
+        worker = encode_item
+    else:
+        items = build_items(args.source)
+        worker = decode_item
+
+    results = sys.stdout if args.results == '-' else open(args.results, 'w', encoding='utf-8')
+    try:
+        start = time.perf_counter()
+        succeeded, failed = run_batch(worker, items, args.password, results, args.workers, args.chunksize)
+    finally:
+        if results is not sys.stdout:
+            results.close()
+    print(f"{args.command}: {succeeded} succeeded, {failed} failed in {time.perf_counter() - start:.2f} s",
+          file=sys.stderr)
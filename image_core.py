@@ -0,0 +1,154 @@
+import base64
+import json
+import os
+
+import numpy as np
+
+import container
+import image_records
+import lsb_engine
+from stats import NULL_STATS
+
+# GUI-free image encode/decode used by the CLI, the GUI, batch jobs and the
+# daemon. Nothing here imports tkinter, and the strip-streaming encoder and
+# the legacy Fernet path are imported only when they are used.
+
+
+def generate_key(password):
+    return base64.urlsafe_b64encode(password.ljust(32)[:32].encode('utf-8'))
+
+def encoded_image_path(input_image):
+    return input_image.rsplit('.', 1)[0] + '_encoded.png'
+
+def encode_image(input_image, message, password, output_image=None, stats=NULL_STATS, stream=False, strip_rows=None,
+                 depth=1, channels=lsb_engine.ALL_CHANNELS, compression='auto', compression_level=None, key=None):
+    """Encrypt ``message`` (str or bytes) and hide it in ``input_image``. Returns the output path.
+
+    The body is written ``depth`` bits per channel into the channels of the
+    ``channels`` mask; both are recorded in the container header, as is the
+    ``compression`` codec (see container.compress). With
+    ``stream`` the carrier is read and written ``strip_rows`` rows at a time
+    instead of being loaded whole (PNG, PPM, BMP and uncompressed TIFF).
+    A container.MasterKey ``key`` saves deriving one from ``password``.
+    """
+    layout = lsb_engine.pack_layout(depth, channels)
+    payload = container.pack(message, password, stats=stats, layout=layout, codec=compression, level=compression_level,
+                             key=key)
+
+    # Encode the payload into the image
+    output_image = output_image or encoded_image_path(input_image)
+    if stream:
+        import strip_stream
+        strip_stream.hide_bytes(input_image, output_image, payload, strip_rows or strip_stream.STRIP_ROWS, stats=stats,
+                                header_size=container.HEADER.size, depth=depth, mask=channels)
+        return output_image
+    encoded = lsb_engine.hide_bytes(input_image, payload, stats=stats, header_size=container.HEADER.size,
+                                    depth=depth, mask=channels)
+    with stats.span('save'):
+        encoded.save(output_image)
+    return output_image
+
+def reveal_container(array, workers=None, record=0):
+    """Read a payload container from an HxWxC carrier array, or None if there isn't one.
+
+    ``record`` picks one of several containers appended to the carrier (see
+    image_records); only the headers of the records before it are read. The
+    header says where the body is, so a long body is extracted in row
+    stripes by ``workers`` threads (default: CPU count).
+    """
+    found = image_records.find_record(array, record)
+    if found is None:
+        return None
+    return image_records.read_record(array, found, workers)
+
+def decode_image(input_image, password, stats=NULL_STATS, workers=None, record=0, cache=None):
+    """Reveal and decrypt the payload hidden in ``input_image``. Returns str or bytes.
+
+    ``record`` is the index of the payload to decrypt when several were
+    appended. ``workers`` is the number of extraction threads (default: CPU
+    count). With an extract_cache.ExtractionCache as ``cache`` a container
+    extracted before from the unchanged file is only decrypted.
+    """
+    key = payload = None
+    if cache is not None and isinstance(input_image, str):
+        with stats.span('cache'):
+            key = cache.make_key(input_image, f'image:{record}')
+            payload = cache.get(key)
+        if payload is not None:
+            stats.count('cache_hits')
+            return container.unpack(payload, password, stats=stats)
+    with stats.span('open'):
+        image = lsb_engine.open_image(input_image)
+        array = np.asarray(image)
+    with stats.span('extract'):
+        payload = reveal_container(array, workers, record)
+    if payload is not None:
+        stats.count('bytes_extracted', len(payload))
+        if key is not None:
+            cache.put(key, payload)
+        return container.unpack(payload, password, stats=stats)
+    if record:
+        raise Exception(f"The image has no record {record}")
+
+    # Images written before the binary container hold a Fernet token as text
+    from cryptography.fernet import Fernet
+    key = generate_key(password)
+    cipher = Fernet(key)
+    encrypted_message = lsb_engine.reveal(image)
+    return cipher.decrypt(encrypted_message.encode('utf-8')).decode('utf-8')
+
+def read_payload_argument(message, is_file):
+    if not is_file:
+        return message
+    with open(message, 'rb') as f:
+        return f.read()
+
+def encode_image_cli(input_image, message, password, stats=NULL_STATS, stream=False, strip_rows=None,
+                     depth=1, channels=lsb_engine.ALL_CHANNELS, compression='auto', compression_level=None,
+                     append=False):
+    try:
+        if append:
+            index, output_image = image_records.append_record(input_image, message, password, stats=stats, depth=depth,
+                                                              channels=channels, compression=compression,
+                                                              compression_level=compression_level)
+            print(f"Message appended as record {index} and saved to {output_image}")
+            return
+        output_image = encode_image(input_image, message, password, stats=stats, stream=stream, strip_rows=strip_rows,
+                                    depth=depth, channels=channels, compression=compression,
+                                    compression_level=compression_level)
+        print(f"Message successfully encoded and saved to {output_image}")
+    except Exception as e:
+        print(f"Error encoding the message: {str(e)}")
+
+def decode_image_cli(input_image, password, output=None, stats=NULL_STATS, workers=None, record=0, cache_dir=None):
+    try:
+        cache = None
+        if cache_dir:
+            from extract_cache import ExtractionCache
+            cache = ExtractionCache(directory=cache_dir)
+        decoded_message = decode_image(input_image, password, stats=stats, workers=workers, record=record, cache=cache)
+        if isinstance(decoded_message, bytes) or output:
+            output = output or input_image.rsplit('.', 1)[0] + '_payload.bin'
+            with open(output, 'wb') as f:
+                f.write(decoded_message if isinstance(decoded_message, bytes) else decoded_message.encode('utf-8'))
+            print(f"Decoded payload ({os.path.getsize(output)} bytes) saved to {output}")
+        else:
+            print(f"Decoded Message: {decoded_message}")
+    except Exception as e:
+        print(f"Error decoding the message: {str(e) or type(e).__name__}")
+
+def records_cli(input_image, as_json=False):
+    try:
+        records = image_records.list_records(input_image)
+    except Exception as e:
+        print(f"Error reading records: {str(e) or type(e).__name__}")
+        return
+    if not records:
+        print(f"{input_image}: no records")
+    for record in records:
+        if as_json:
+            print(json.dumps(record))
+        else:
+            print(f"record {record['index']}: {record['container_bytes']} bytes, {record['codec']}, "
+                  f"{'binary' if record['binary'] else 'text'}, depth {record['depth']} on {record['channels']}, "
+                  f"pixels {record['start_pixel']}-{record['end_pixel']}")
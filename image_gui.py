@@ -0,0 +1,236 @@
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from PIL import ImageTk
+import customtkinter as ctk
+from gui_jobs import JobCancelled, JobRunner, describe_error
+from extract_cache import extraction_cache
+from image_core import encode_image, decode_image, encoded_image_path
+from thumbnails import thumbnail_cache
+
+class SteganographyGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Image Steganography Tool")
+        self.center_window(800, 600)
+
+        ctk.set_appearance_mode("Dark")
+        ctk.set_default_color_theme("dark-blue")
+
+        self.style = ttk.Style()
+        self.style.theme_use("clam")
+        self.style.configure("Treeview.Heading", font=("Helvetica", 14, "bold"), background="#2e2e2e", foreground="#d3d3d3")
+        self.style.configure("Treeview", font=("Helvetica", 12), rowheight=24, background="#2e2e2e", fieldbackground="#2e2e2e", foreground="#d3d3d3")
+        self.style.map("Treeview", background=[("selected", "#3e3e3e")], foreground=[("selected", "white")])
+
+        # Store image reference to prevent garbage collection
+        self.image_photo = None
+
+        # Encode/decode run on a worker thread so the window keeps repainting
+        self.jobs = JobRunner(self.root, lambda done, total, text: None)
+        # Thumbnails have their own worker so browsing never waits behind a job;
+        # only the latest selection is loaded once the current one finishes
+        self.thumbnail_jobs = JobRunner(self.root, lambda done, total, text: None, poll_ms=20)
+        self.pending_thumbnail = None
+
+        self.create_widgets()
+        self.setup_layout()
+
+    def center_window(self, width, height):
+        screen_width = self.root.winfo_screenwidth()
+        screen_height = self.root.winfo_screenheight()
+        x = int((screen_width / 1.43) - (800 / 1.5))
+        y = int((screen_height / 1.75) - (600 / 1.5))
+        self.root.geometry(f'{width}x{height}+{x}+{y}')
+
+    def create_widgets(self):
+        # Title with icon
+        self.title_frame = ctk.CTkFrame(self.root, corner_radius=20, fg_color="#2e2e2e")
+        self.title_label = ctk.CTkLabel(self.title_frame, text="  Image Steganography Tool", font=("Helvetica", 18, "bold"))
+
+        self.encode_button = ctk.CTkButton(self.root, text="Encode Message", command=self.encode_message, width=150)
+        self.decode_button = ctk.CTkButton(self.root, text="Decode Message", command=self.decode_message, width=150)
+        self.cancel_button = ctk.CTkButton(self.root, text="Cancel", command=self.jobs.cancel, width=100, state='disabled')
+        self.status_label = ctk.CTkLabel(self.root, text="")
+
+        # File selection
+        self.file_label = ctk.CTkLabel(self.root, text="Select File")
+        self.file_entry = ctk.CTkEntry(self.root, width=200, state='readonly')  # Make it readonly
+        self.browse_button = ctk.CTkButton(self.root, text="Browse", command=self.browse_file, width=100)
+
+        # Message entry
+        self.message_label = ctk.CTkLabel(self.root, text="Enter Message")
+        self.message_text = tk.Text(self.root, wrap='word', height=8, width=40, bg='#2e2e2e', fg='#d3d3d3', insertbackground='white', font=("Helvetica", 16))
+
+        # Password entry
+        self.password_label = ctk.CTkLabel(self.root, text="Enter Password")
+        self.password_entry = ctk.CTkEntry(self.root, width=200, show='*')
+
+        # Image display
+        self.image_label = ctk.CTkLabel(self.root, text="No image selected", image=None)
+
+        # Results display
+        self.results_label = ctk.CTkLabel(self.root, text="Decoded Message")
+        self.results_text = tk.Text(self.root, wrap='word', state='disabled', height=3, width=40, bg='#2e2e2e', fg='#d3d3d3', insertbackground='white', font=("Helvetica", 16))
+        self.results_scroll = ctk.CTkScrollbar(self.root, command=self.results_text.yview)
+        self.results_text.configure(yscrollcommand=self.results_scroll.set)
+
+    def setup_layout(self):
+        # Layout for title
+        self.title_frame.grid(column=0, row=0, columnspan=3, padx=10, pady=10, sticky='ew')
+        self.title_label.grid(column=0, row=0, padx=10, pady=5, sticky='w')
+        self.title_frame.grid_columnconfigure(1, weight=1)
+
+        self.file_label.grid(column=0, row=1, padx=10, pady=5, sticky='w')
+        self.file_entry.grid(column=1, row=1, padx=5, pady=5, sticky='ew')
+        self.browse_button.grid(column=2, row=1, padx=10, pady=5, sticky='ew')
+
+        self.message_label.grid(column=0, row=2, padx=10, pady=5, sticky='w')
+        self.message_text.grid(column=0, row=3, padx=10, pady=5, columnspan=3, sticky='nsew')
+
+        self.password_label.grid(column=0, row=4, padx=10, pady=5, sticky='w')
+        self.password_entry.grid(column=1, row=4, padx=5, pady=5, sticky='ew')
+
+        self.encode_button.grid(column=0, row=5, padx=10, pady=10, sticky='ew')
+        self.decode_button.grid(column=1, row=5, padx=5, pady=10, sticky='ew')
+        self.cancel_button.grid(column=2, row=5, padx=10, pady=10, sticky='ew')
+        self.status_label.grid(column=1, row=4, columnspan=2, padx=10, pady=5, sticky='e')
+
+        self.image_label.grid(column=0, row=6, padx=10, pady=5, columnspan=3, sticky='nsew')
+
+        self.results_label.grid(column=0, row=7, padx=10, pady=5, sticky='w')
+        self.results_text.grid(column=0, row=8, padx=10, pady=5, columnspan=3, sticky='nsew')
+        self.results_scroll.grid(column=3, row=8, sticky='ns')
+
+        self.root.grid_columnconfigure(1, weight=1)
+        self.root.grid_rowconfigure(8, weight=1)
+
+    def browse_file(self):
+        file_path = filedialog.askopenfilename(title="Select File", filetypes=(
+            ("Image Files", "*.png;*.jpg;*.jpeg"), 
+            ))
+        
+        if file_path:
+            self.file_entry.configure(state='normal')  # Allow writing to entry
+            self.file_entry.delete(0, tk.END)
+            self.file_entry.insert(0, file_path)
+            self.file_entry.configure(state='readonly')  # Set back to readonly
+
+            # Determine the file type and display accordingly
+            if file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
+                self.display_image(file_path)
+
+    def display_image(self, file_path):
+        try:
+            thumbnail = thumbnail_cache.cached(file_path)
+        except OSError:
+            thumbnail = None
+        if thumbnail is not None:
+            self.pending_thumbnail = None
+            self.show_thumbnail(thumbnail)
+            return
+        self.pending_thumbnail = file_path
+        if not self.thumbnail_jobs.busy:
+            self.load_thumbnail()
+
+    def load_thumbnail(self):
+        file_path, self.pending_thumbnail = self.pending_thumbnail, None
+
+        def done(thumbnail):
+            if self.pending_thumbnail:
+                self.load_thumbnail()
+            elif self.file_entry.get() == file_path:
+                self.show_thumbnail(thumbnail)
+
+        def failed(error):
+            if self.pending_thumbnail:
+                self.load_thumbnail()
+            elif self.file_entry.get() == file_path:
+                messagebox.showerror("Image Error", f"Could not display image: {str(error)}")
+                self.image_label.configure(image=None, text="No image selected")
+
+        self.thumbnail_jobs.start(lambda progress: thumbnail_cache.get(file_path), done, failed)
+
+    def show_thumbnail(self, thumbnail):
+        # PhotoImage must be created on the Tk thread; keep a reference so it is not garbage collected
+        self.image_photo = ImageTk.PhotoImage(thumbnail)
+        self.image_label.configure(image=self.image_photo, text="")
+
+    def encode_message(self):
+        file_path = self.file_entry.get().strip()
+        message = self.message_text.get("1.0", tk.END).strip()
+        password = self.password_entry.get().strip()
+        if not file_path or not message or not password:
+            messagebox.showerror("Error", "Please select a file, enter a message, and provide a password.")
+            return
+
+        def done(output_path):
+            self.finish_job("")
+            messagebox.showinfo("Success", f"Message encoded and saved to {output_path}")
+            self.reset_entries()  # Clear entries after successful encoding
+
+        def failed(error):
+            if isinstance(error, JobCancelled):
+                # The image is written in one go, so a cancelled encode has a complete file to discard
+                output_path = encoded_image_path(file_path)
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                self.finish_job("Cancelled")
+            else:
+                self.finish_job("")
+                messagebox.showerror("Encoding Error", f"An error occurred: {describe_error(error)}")
+
+        self.start_job(lambda progress: encode_image(file_path, message, password), done, failed, "Encoding...")
+
+    def decode_message(self):
+        file_path = self.file_entry.get().strip()
+        password = self.password_entry.get().strip()
+        if not file_path or not password:
+            messagebox.showerror("Error", "Please select a file and provide a password.")
+            return
+
+        def done(decoded_message):
+            self.finish_job("")
+            if isinstance(decoded_message, bytes):
+                decoded_message = f"<binary payload, {len(decoded_message)} bytes>"
+
+            self.results_text.configure(state='normal')  # Enable text box to insert text
+            self.results_text.delete('1.0', tk.END)
+            self.results_text.insert(tk.END, decoded_message)
+            self.results_text.configure(state='disabled')  # Set back to read-only
+
+        def failed(error):
+            if isinstance(error, JobCancelled):
+                self.finish_job("Cancelled")
+            else:
+                self.finish_job("")
+                messagebox.showerror("Decoding Error", f"An error occurred: {describe_error(error)}")
+
+        # A retry after a wrong password only repeats the decryption
+        self.start_job(lambda progress: decode_image(file_path, password, cache=extraction_cache), done, failed,
+                       "Decoding...")
+
+    def start_job(self, func, on_done, on_error, text):
+        if not self.jobs.start(func, on_done, on_error):
+            messagebox.showinfo("Busy", "Another job is still running in this window.")
+            return
+        self.status_label.configure(text=text)
+        self.cancel_button.configure(state='normal')
+
+    def finish_job(self, text):
+        self.status_label.configure(text=text)
+        self.cancel_button.configure(state='disabled')
+
+    def reset_entries(self):
+        self.file_entry.configure(state='normal')  # Allow clearing file entry
+        self.file_entry.delete(0, tk.END)
+        self.file_entry.configure(state='readonly')  # Set back to read-only
+
+        self.message_text.delete("1.0", tk.END)
+        self.password_entry.delete(0, tk.END)
+        self.image_label.configure(image=None, text="No image selected")
+
+if __name__ == "__main__":
+    root = ctk.CTk()
+    app = SteganographyGUI(root)
+    root.mainloop()
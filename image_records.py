@@ -0,0 +1,237 @@
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+
+import container
+import lsb_engine
+from stats import NULL_STATS
+
+# An image can carry several payload containers, "records", laid end to end.
+# Record 0 starts at the first pixel, exactly where encode_image() puts its
+# container, and each later record starts on the first whole pixel after the
+# one before it. A record's header gives its length and layout, so the chain
+# of headers is the record table: listing the records reads only their
+# headers, the free space starts where the chain ends, and appending a record
+# writes only its own pixels. Every record is encrypted on its own, so one can
+# be extracted without decrypting the others.
+HEADER_PIXELS = lsb_engine.body_start(container.HEADER.size)
+
+Record = namedtuple('Record', 'index start end head header')
+
+
+def record_pixels(header):
+    """Pixels a record spans, from the first header pixel to the last body pixel."""
+    depth, mask = lsb_engine.unpack_layout(container.layout(header))
+    per_pixel = len(lsb_engine.mask_channels(mask)) * depth
+    return HEADER_PIXELS + -(-header.body_length * 8 // per_pixel)
+
+
+def array_pixels(array):
+    """Pixel source for walk() over an HxWxC carrier array."""
+    flat = array.reshape(-1, array.shape[-1])
+    return lambda first, count: flat[first:first + count]
+
+
+class ReaderPixels:
+    """Pixel source for walk() over a strip_stream reader, decoding only the rows asked for.
+
+    PNG rows are unfiltered in order, so pixels must be asked for front to back.
+    """
+
+    def __init__(self, reader, strip_rows=None):
+        import strip_stream
+        self.reader = reader
+        self.is_png = isinstance(reader, strip_stream.PngReader)
+        self.strip_rows = strip_rows or strip_stream.STRIP_ROWS
+        self.rows = np.empty((0, reader.width, len(reader.mode)), dtype=np.uint8)
+        # PNG rows unfiltered so far; self.rows are the last of them
+        self.end = 0
+
+    def _unfilter(self, count):
+        previous = self.rows[-1] if len(self.rows) else None
+        rows = self.reader.unfilter(self.reader.read_rows(count), previous)
+        self.end += count
+        return rows
+
+    def __call__(self, first, count):
+        width = self.reader.width
+        r0, r1 = first // width, -(-(first + count) // width)
+        if not self.is_png:
+            rows = self.reader.read(r0, r1)
+        else:
+            if r0 < self.end - len(self.rows):
+                raise ValueError("PNG pixels can only be read front to back")
+            while self.end < r0:
+                # Rows nobody asked for, unfiltered only for the row above the next ones
+                self.rows = self._unfilter(min(self.strip_rows, r0 - self.end))
+            rows = self.rows[len(self.rows) - (self.end - r0):]
+            if self.end < r1:
+                rows = np.concatenate([rows, self._unfilter(r1 - self.end)])
+            self.rows = rows
+        offset = first - r0 * width
+        return rows.reshape(-1, rows.shape[-1])[offset:offset + count]
+
+
+def walk(read_pixels, npixels):
+    """Yield the Records of a carrier of ``npixels`` pixels, in order.
+
+    ``read_pixels(first, count)`` returns those pixels as a (count, C) RGB[A]
+    array. The walk stops at the first pixel that does not start a record
+    which fits in the carrier.
+    """
+    start = 0
+    index = 0
+    while start + HEADER_PIXELS <= npixels:
+        pixels = lsb_engine.pixel_view(read_pixels(start, HEADER_PIXELS))
+        head = lsb_engine.extract_bytes(pixels, container.HEADER.size)
+        try:
+            header = container.parse_header(head)
+            end = start + record_pixels(header)
+        except ValueError:
+            return
+        if end > npixels:
+            return
+        yield Record(index, start, end, head, header)
+        start, index = end, index + 1
+
+
+def find_record(array, index):
+    """Return the Record ``index`` of an HxWxC carrier array, or None."""
+    for record in walk(array_pixels(array), array.shape[0] * array.shape[1]):
+        if record.index == index:
+            return record
+    return None
+
+
+def read_record(array, record, workers=None):
+    """Extract the whole container of ``record`` from an HxWxC carrier array."""
+    depth, mask = lsb_engine.unpack_layout(container.layout(record.header))
+    flat = array.reshape(-1, array.shape[-1])[record.start:]
+    return record.head + lsb_engine.extract_body(flat, record.header.body_length, container.HEADER.size, depth, mask,
+                                                 workers=workers)
+
+
+def _scan(read_pixels, npixels):
+    """Return (the records, the first free pixel), refusing carriers that hold a legacy payload."""
+    records = list(walk(read_pixels, npixels))
+    if records:
+        return records, records[-1].end
+    from scan import LEGACY_PREFIX
+    head = lsb_engine.extract_bytes(lsb_engine.pixel_view(read_pixels(0, min(npixels, HEADER_PIXELS))), 16)
+    if LEGACY_PREFIX.match(head):
+        raise Exception("The image holds a message from an older version; re-encode it before appending")
+    return records, 0
+
+
+def open_records(path):
+    """Return (the records of the image at ``path``, its pixel count).
+
+    PNG, PPM, BMP and uncompressed TIFF carriers are read only up to the end
+    of the last record; anything else is decoded whole.
+    """
+    import strip_stream
+    try:
+        reader = strip_stream.open_reader(path)
+    except ValueError:
+        array = np.asarray(lsb_engine.open_image(path))
+        npixels = array.shape[0] * array.shape[1]
+        return list(walk(array_pixels(array), npixels)), npixels
+    try:
+        npixels = reader.width * reader.height
+        return list(walk(ReaderPixels(reader), npixels)), npixels
+    finally:
+        reader.close()
+
+
+def describe(record, npixels):
+    """The fields of a record that can be read without the password."""
+    from scan import check_container
+    found = check_container(record.head, npixels - record.start)
+    found.pop('format')
+    return dict(index=record.index, start_pixel=record.start, end_pixel=record.end, **found)
+
+
+def list_records(path):
+    records, npixels = open_records(path)
+    return [describe(record, npixels) for record in records]
+
+
+def append_record(input_image, message, password, output_image=None, stats=NULL_STATS, depth=1,
+                  channels=lsb_engine.ALL_CHANNELS, compression='auto', compression_level=None):
+    """Encrypt ``message`` and hide it after the last record of ``input_image``.
+
+    Returns (the new record's index, the output path). PPM, BMP and
+    uncompressed TIFF carriers are written in place (or copied to
+    ``output_image`` first) and only the new record's rows are touched. A PNG
+    is rewritten with its rows passed through still filtered, except those
+    of the new record. Other images are loaded whole and saved as a new PNG.
+    """
+    import strip_stream
+    layout = lsb_engine.pack_layout(depth, channels)
+    payload = container.pack(message, password, stats=stats, layout=layout, codec=compression, level=compression_level)
+
+    with stats.span('open'):
+        try:
+            reader = strip_stream.open_reader(input_image)
+        except ValueError:
+            reader = None
+            array = np.array(lsb_engine.open_image(input_image))
+            width = array.shape[1]
+            npixels = array.shape[0] * width
+    if reader is not None:
+        width = reader.width
+        npixels = width * reader.height
+        try:
+            with stats.span('records'):
+                records, start = _scan(ReaderPixels(reader), npixels)
+        finally:
+            reader.close()
+    else:
+        with stats.span('records'):
+            records, start = _scan(array_pixels(array), npixels)
+
+    if len(payload) - container.HEADER.size > lsb_engine.body_capacity(npixels - start, container.HEADER.size,
+                                                                        depth, channels):
+        raise Exception(f"The message you want to hide is too long for the space left: {len(payload)} bytes")
+    end = start + record_pixels(container.parse_header(payload))
+
+    if reader is None:
+        from PIL import Image
+        from image_core import encoded_image_path
+        output_image = output_image or encoded_image_path(input_image)
+        with stats.span('embed'):
+            touched = lsb_engine.embed_payload(array.reshape(-1, array.shape[-1])[start:], payload,
+                                               container.HEADER.size, depth, channels)
+        with stats.span('save'):
+            Image.fromarray(array).save(output_image)
+    elif isinstance(reader, strip_stream.RawReader):
+        output_image = output_image or input_image
+        if os.path.abspath(output_image) != os.path.abspath(input_image):
+            shutil.copyfile(input_image, output_image)
+        writer = strip_stream.RawReader(output_image, writable=True)
+        try:
+            r0, r1 = start // width, -(-end // width)
+            with stats.span('embed'):
+                strip = writer.read(r0, r1)
+                touched = lsb_engine.embed_payload(strip, payload, container.HEADER.size, depth, channels,
+                                                   first_pixel=r0 * width - start)
+                writer.write(r0, strip)
+        finally:
+            writer.close()
+    else:
+        output_image = output_image or input_image
+        partial = output_image + '.part'
+        try:
+            strip_stream.hide_bytes(input_image, partial, payload, header_size=container.HEADER.size, depth=depth,
+                                    mask=channels, stats=stats, start_pixel=start)
+            os.replace(partial, output_image)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        # hide_bytes() counted the embedded bytes and touched pixels
+        return len(records), output_image
+    stats.count('bytes_embedded', len(payload))
+    stats.count('pixels_touched', touched)
+    return len(records), output_image
@@ -0,0 +1,83 @@
+import atexit
+import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+ITERATIONS = 100000
+
+
+class DerivedKeyCache:
+    """Bounded LRU cache of PBKDF2 results with a time-to-live per entry.
+
+    Entries are keyed on a SHA-256 of the password rather than the password
+    itself, together with the salt and iteration count.
+    """
+
+    def __init__(self, maxsize=32, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(password, salt, iterations):
+        return hashlib.sha256(password.encode()).digest(), bytes(salt), iterations
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+key_cache = DerivedKeyCache()
+# Don't leave derived keys around longer than the process
+atexit.register(key_cache.clear)
+
+
+def derive_key(password, salt, iterations=ITERATIONS, use_cache=True):
+    """Return the url-safe base64 Fernet key for ``password`` and ``salt``."""
+    cache_key = DerivedKeyCache.make_key(password, salt, iterations)
+    if use_cache:
+        key = key_cache.get(cache_key)
+        if key is not None:
+            return key
+
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+        backend=default_backend()
+    )
+    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+    if use_cache:
+        key_cache.put(cache_key, key)
+    return key
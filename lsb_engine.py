@@ -0,0 +1,294 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from stats import NULL_STATS
+
+# Bits are written MSB-first into the least significant bit of the R, G and B
+# channels, pixel by pixel in row-major order. This is the layout used by
+# stegano.lsb, so images produced here can be read by stegano and vice versa.
+RGB_CHANNELS = (0, 1, 2)
+# OpenCV frames are BGR; embedding in this order keeps the R, G, B bit layout
+BGR_CHANNELS = (2, 1, 0)
+
+# A payload body can also be written ``depth`` (1-4) bits per channel into a
+# subset of the channels, given as a mask with R=1, G=2, B=4. The header in
+# front of the body always uses 1 bit on all three channels, so a reader can
+# parse it before it knows the layout; the body then starts at the first whole
+# pixel after it. In a header the layout is one byte, (depth - 1) << 3 | the
+# mask of *unused* channels, so the default layout is 0.
+CHANNEL_BITS = {'r': 1, 'g': 2, 'b': 4}
+ALL_CHANNELS = 0b111
+MAX_DEPTH = 4
+
+# Reads at least this long are split into stripes that a thread pool extracts
+# in parallel; the numpy operations involved release the GIL
+PARALLEL_MIN_BYTES = 1 << 20
+
+
+def open_image(image):
+    """Open a path or PIL image as an RGB/RGBA image, converting other modes."""
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    return image
+
+
+def pixel_view(array, channels=RGB_CHANNELS):
+    """Return an (N, len(channels)) view of the carrier channels of an HxWxC array.
+
+    ``channels`` lists channel indices in embedding order, e.g. ``(2, 1, 0)``
+    to embed R, G, B on a BGR frame. The indices must be evenly spaced so the
+    result stays a view that can be written in place.
+    """
+    pixels = array.reshape(-1, array.shape[-1])
+    channels = list(channels)
+    step = channels[1] - channels[0] if len(channels) > 1 else 1
+    if step == 0 or channels != list(range(channels[0], channels[0] + step * len(channels), step)):
+        raise ValueError(f"Channels {tuple(channels)} cannot be addressed as a view")
+    stop = channels[-1] + (1 if step > 0 else -1)
+    return pixels[:, channels[0]:stop if stop >= 0 else None:step]
+
+
+def parse_channels(text):
+    """Turn 'rgb', 'b', 'rb', ... into a channel mask."""
+    mask = 0
+    for name in text.lower():
+        if name not in CHANNEL_BITS:
+            raise ValueError(f"Unknown channel {name!r}; use a combination of r, g and b")
+        mask |= CHANNEL_BITS[name]
+    if not mask:
+        raise ValueError("At least one channel is needed")
+    return mask
+
+
+def mask_channels(mask, channels=RGB_CHANNELS):
+    """Indices of the channels in ``mask``, for an array whose R, G, B are at ``channels``."""
+    return tuple(index for bit, index in zip((1, 2, 4), channels) if mask & bit)
+
+
+def pack_layout(depth=1, mask=ALL_CHANNELS):
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Depth must be between 1 and {MAX_DEPTH} bits per channel")
+    if not 0 < mask <= ALL_CHANNELS:
+        raise ValueError(f"Invalid channel mask {mask}")
+    return (depth - 1) << 3 | (ALL_CHANNELS ^ mask)
+
+
+def unpack_layout(layout):
+    """Return (depth, mask) for a layout byte, or raise ValueError."""
+    if layout >> 5 or layout & ALL_CHANNELS == ALL_CHANNELS:
+        raise ValueError(f"Invalid layout byte {layout}")
+    return (layout >> 3) + 1, ALL_CHANNELS ^ (layout & ALL_CHANNELS)
+
+
+def body_start(header_size, ncha=3):
+    """First pixel of a body that follows a ``header_size`` byte header at 1 bit on ``ncha`` channels."""
+    return -(-header_size * 8 // ncha)
+
+
+def body_capacity(npixels, header_size, depth=1, mask=ALL_CHANNELS):
+    """Body bytes that fit in ``npixels`` pixels after the header."""
+    return (npixels - body_start(header_size)) * len(mask_channels(mask)) * depth // 8
+
+
+def capacity_bits(pixels, depth=1):
+    return pixels.shape[0] * pixels.shape[1] * depth
+
+
+def _check_range(pixels, bit_start, nbits, depth):
+    if not 1 <= depth <= MAX_DEPTH:
+        raise ValueError(f"Depth must be between 1 and {MAX_DEPTH} bits per channel")
+    if bit_start + nbits > capacity_bits(pixels, depth):
+        raise ValueError(f"Cannot fit {nbits} bits at offset {bit_start}: carrier holds {capacity_bits(pixels, depth)}")
+
+
+def _low_bits(region, depth):
+    """The ``depth`` low bits of every value of ``region``, MSB-first, as a flat 0/1 array."""
+    values = (region & ((1 << depth) - 1)).reshape(-1, 1)
+    return np.unpackbits(values, axis=1)[:, 8 - depth:].reshape(-1)
+
+
+def embed_bits(pixels, bits, bit_start=0, depth=1):
+    """Write a 0/1 uint8 array into the low ``depth`` bits of ``pixels`` starting at ``bit_start``.
+
+    Bits fill each channel value MSB-first, then the next channel. Only the
+    pixels covering the bit range are read and written. Returns the bit index
+    following the last written bit.
+    """
+    _check_range(pixels, bit_start, bits.size, depth)
+    per_pixel = pixels.shape[1] * depth
+    bit_end = bit_start + bits.size
+    first, last = bit_start // per_pixel, -(-bit_end // per_pixel)
+    region = pixels[first:last]
+    offset = bit_start - first * per_pixel
+    if offset or bits.size != region.size * depth:
+        # Keep the bits of the partially covered first/last pixel
+        current = (region & 1).reshape(-1) if depth == 1 else _low_bits(region, depth)
+        current[offset:offset + bits.size] = bits
+        bits = current
+    if depth == 1:
+        region &= 0xFE
+        region |= bits.reshape(region.shape)
+    else:
+        values = np.packbits(bits.reshape(-1, depth), axis=1) >> (8 - depth)
+        region &= 0xFF ^ ((1 << depth) - 1)
+        region |= values.reshape(region.shape)
+    return bit_end
+
+
+def extract_bits(pixels, nbits, bit_start=0, depth=1):
+    """Read ``nbits`` bits written by embed_bits() as a 0/1 array."""
+    _check_range(pixels, bit_start, nbits, depth)
+    per_pixel = pixels.shape[1] * depth
+    first, last = bit_start // per_pixel, -(-(bit_start + nbits) // per_pixel)
+    offset = bit_start - first * per_pixel
+    region = pixels[first:last]
+    bits = (region & 1).reshape(-1) if depth == 1 else _low_bits(region, depth)
+    return bits[offset:offset + nbits]
+
+
+def embed_bytes(pixels, data, bit_start=0, depth=1):
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    return embed_bits(pixels, bits, bit_start, depth)
+
+
+def extract_bytes(pixels, nbytes, bit_start=0, depth=1):
+    return np.packbits(extract_bits(pixels, nbytes * 8, bit_start, depth)).tobytes()
+
+
+def extract_bytes_parallel(pixels, nbytes, bit_start=0, depth=1, workers=None):
+    """extract_bytes() split into one stripe of consecutive pixels per worker thread.
+
+    ``workers`` defaults to the CPU count. The stripes are joined in order.
+    """
+    workers = min(workers or os.cpu_count() or 1, max(1, nbytes // (PARALLEL_MIN_BYTES // 4)))
+    if workers == 1 or nbytes < PARALLEL_MIN_BYTES:
+        return extract_bytes(pixels, nbytes, bit_start, depth)
+    _check_range(pixels, bit_start, nbytes * 8, depth)
+    bounds = [nbytes * i // workers for i in range(workers + 1)]
+
+    def stripe(i):
+        return extract_bytes(pixels, bounds[i + 1] - bounds[i], bit_start + bounds[i] * 8, depth)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lsb-extract') as pool:
+        return b''.join(pool.map(stripe, range(workers)))
+
+
+def embed_region(pixels, data, start_pixel=0, depth=1, first_pixel=0):
+    """Embed ``data`` from pixel ``start_pixel`` of a carrier whose pixels from ``first_pixel`` on are ``pixels``.
+
+    Only the part of ``data`` that lands in ``pixels`` is written, so a carrier
+    can be processed one strip at a time. Returns the number of pixels written.
+    """
+    per_pixel = pixels.shape[1] * depth
+    lo = max(0, (first_pixel - start_pixel) * per_pixel)
+    hi = min(len(data) * 8, (first_pixel + pixels.shape[0] - start_pixel) * per_pixel)
+    if lo >= hi:
+        return 0
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8)[lo // 8:-(-hi // 8)])[lo % 8:lo % 8 + hi - lo]
+    bit_start = (start_pixel - first_pixel) * per_pixel + lo
+    embed_bits(pixels, bits, bit_start, depth)
+    return -(-(bit_start + bits.size) // per_pixel) - bit_start // per_pixel
+
+
+def embed_payload(array, data, header_size, depth=1, mask=ALL_CHANNELS, channels=RGB_CHANNELS, first_pixel=0):
+    """Embed ``data[:header_size]`` at 1 bit on every channel and the rest with the given layout.
+
+    ``array`` may be a strip of rows starting at pixel ``first_pixel`` of the
+    carrier. Returns the number of pixels written.
+    """
+    touched = embed_region(pixel_view(array, channels), data[:header_size], 0, 1, first_pixel)
+    body = pixel_view(array, mask_channels(mask, channels))
+    return touched + embed_region(body, data[header_size:], body_start(header_size, len(channels)), depth, first_pixel)
+
+
+def extract_body(array, nbytes, header_size, depth=1, mask=ALL_CHANNELS, channels=RGB_CHANNELS, workers=1):
+    """Read the ``nbytes`` body that embed_payload() wrote after a ``header_size`` byte header.
+
+    Long bodies are read by ``workers`` threads (None for the CPU count).
+    """
+    body = pixel_view(array, mask_channels(mask, channels))
+    start = body_start(header_size, len(channels))
+    return extract_bytes_parallel(body, nbytes, start * body.shape[1] * depth, depth, workers)
+
+
+def hide_array(array, message, channels=RGB_CHANNELS, encoding="UTF-8"):
+    """Embed ``message`` in place into an HxWxC uint8 array using the stegano layout."""
+    if isinstance(message, str):
+        message = message.encode(encoding)
+    if not message:
+        raise ValueError("message length is zero")
+
+    pixels = pixel_view(array, channels)
+    payload = f"{len(message)}:".encode("ascii") + message
+    nbits = len(payload) * 8
+    # stegano pads the last pixel with zero bits; do the same for identical output
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8), count=nbits + (-nbits % pixels.shape[1]))
+    if bits.size > capacity_bits(pixels):
+        raise Exception(f"The message you want to hide is too long: {len(message)} bytes")
+
+    embed_bits(pixels, bits)
+    return array
+
+
+def hide(image, message, encoding="UTF-8"):
+    """Vectorised equivalent of ``stegano.lsb.hide`` returning a new PIL image."""
+    array = np.array(open_image(image))
+    return Image.fromarray(hide_array(array, message, encoding=encoding))
+
+
+def hide_bytes(image, data, channels=RGB_CHANNELS, stats=NULL_STATS, header_size=0, depth=1, mask=ALL_CHANNELS):
+    """Embed raw ``data`` (no length prefix) from the first pixel. Returns a new PIL image.
+
+    With ``header_size`` the body after the header uses ``depth`` bits on the
+    ``mask`` channels, as in embed_payload().
+    """
+    with stats.span('open'):
+        array = np.array(open_image(image))
+    npixels = array.shape[0] * array.shape[1]
+    if len(data) - header_size > body_capacity(npixels, header_size, depth, mask):
+        raise Exception(f"The message you want to hide is too long: {len(data)} bytes")
+    with stats.span('embed'):
+        touched = embed_payload(array, data, header_size, depth, mask, channels)
+    stats.count('bytes_embedded', len(data))
+    stats.count('pixels_touched', touched)
+    return Image.fromarray(array)
+
+
+def read_length_prefix(pixels, max_digits=20):
+    """Parse the stegano ``<n>:`` prefix. Returns (length, bit offset of the message)."""
+    digits = b""
+    bit = 0
+    while len(digits) <= max_digits:
+        # Read the prefix a few bytes at a time so large carriers are not scanned
+        chunk = extract_bytes(pixels, min(8, capacity_bits(pixels) // 8 - bit // 8), bit)
+        for byte in chunk:
+            bit += 8
+            if byte == ord(":") and digits:
+                return int(digits), bit
+            if not 0x30 <= byte <= 0x39:
+                # Not a stegano prefix; give up without scanning the rest of the carrier
+                raise IndexError("Impossible to detect message.")
+            digits += bytes([byte])
+        if not chunk:
+            break
+    raise IndexError("Impossible to detect message.")
+
+
+def reveal_array(array, channels=RGB_CHANNELS, encoding="UTF-8"):
+    """Read a stegano-layout message from an HxWxC uint8 array without copying it."""
+    pixels = pixel_view(array, channels)
+    length, bit_start = read_length_prefix(pixels)
+    try:
+        return extract_bytes(pixels, length, bit_start).decode(encoding)
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise IndexError("Impossible to detect message.") from exc
+
+
+def reveal(encoded_image, encoding="UTF-8"):
+    """Vectorised equivalent of ``stegano.lsb.reveal``."""
+    return reveal_array(np.asarray(open_image(encoded_image)), encoding=encoding)
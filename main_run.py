@@ -1,10 +1,7 @@
-import tkinter as tk
-from tkinter import messagebox
 import customtkinter as ctk
 
-# Import the video and image steganography GUIs
-from video_gui import VideoSteganographyGUI
-from image_gui_cli import SteganographyGUI
+# The video and image GUIs (and cv2 behind the video one) are imported only
+# when their window is opened, so the launcher itself appears quickly
 
 class SteganographyLauncher(ctk.CTk):
     def __init__(self):
@@ -52,10 +49,12 @@ class SteganographyLauncher(ctk.CTk):
         self.after(0, self.open_image_window)
 
     def open_video_window(self):
+        from video_gui import VideoSteganographyGUI
         video_app = VideoSteganographyGUI()
         video_app.mainloop()
 
     def open_image_window(self):
+        from image_gui import SteganographyGUI
         root = ctk.CTk()
         image_app = SteganographyGUI(root)
         root.mainloop()
@@ -0,0 +1,202 @@
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import capacity
+
+# Bulk triage: does a file carry a payload from this tool? Only the leading
+# pixels of an image (or the first frames of a video) are decoded and checked
+# for a header that parses and a length that fits the carrier. Nothing is
+# decrypted and no password is needed. numpy, PIL, cv2 and the readers are
+# imported in the workers, so the CLIs can build the subcommand cheaply.
+SCAN_EXTENSIONS = ('.png', '.bmp', '.ppm', '.tif', '.tiff', '.jpg', '.jpeg') + capacity.VIDEO_EXTENSIONS
+# Enough for a container header and for the "<length>:gAAAAA" start of a
+# legacy stegano/Fernet image
+PREFIX_BYTES = 32
+LEGACY_PREFIX = re.compile(rb'^([1-9][0-9]{0,18}):gAAAAA')
+VIDEO_FRAMES = 2
+
+
+def expand_paths(sources):
+    """Files to scan from file, directory (recursive) and glob arguments, sorted."""
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                paths.update(os.path.join(root, name) for name in names)
+        elif os.path.isfile(source):
+            paths.add(source)
+        else:
+            paths.update(glob.glob(source, recursive=True))
+    return sorted(path for path in paths if path.lower().endswith(SCAN_EXTENSIONS))
+
+
+def read_image_prefix(path, nbytes=PREFIX_BYTES):
+    """Return (the first ``nbytes`` hidden bytes, (width, height), how the pixels were read).
+
+    PNG, PPM, BMP and uncompressed TIFF carriers are read only up to the rows
+    that hold those bytes; anything else is decoded whole.
+    """
+    import lsb_engine
+    import numpy as np
+    import strip_stream
+
+    pixels_needed = -(-nbytes * 8 // 3)
+    try:
+        reader = strip_stream.open_reader(path)
+    except ValueError:
+        # Palette or interlaced PNGs, compressed TIFFs, JPEGs...
+        image = lsb_engine.open_image(path)
+        array, size, read = np.asarray(image), image.size, 'full'
+    else:
+        try:
+            rows = min(reader.height, -(-pixels_needed // reader.width))
+            if isinstance(reader, strip_stream.PngReader):
+                array = reader.unfilter(reader.read_rows(rows))
+            else:
+                array = reader.read(0, rows)
+            size, read = (reader.width, reader.height), 'prefix'
+        finally:
+            reader.close()
+    pixels = lsb_engine.pixel_view(array)
+    nbytes = min(nbytes, lsb_engine.capacity_bits(pixels) // 8)
+    return lsb_engine.extract_bytes(pixels, nbytes), size, read
+
+
+def check_container(head, npixels):
+    """Describe the container whose header starts ``head``, or None if there isn't a sane one."""
+    import container
+    import lsb_engine
+
+    try:
+        header = container.parse_header(head)
+        depth, mask = lsb_engine.unpack_layout(container.layout(header))
+    except ValueError:
+        return None
+    if header.body_length > lsb_engine.body_capacity(npixels, container.HEADER.size, depth, mask):
+        return None
+    codecs = {codec.id: name for name, codec in container.CODECS.items()}
+    return {'format': 'container', 'container_bytes': container.total_length(header),
+            'codec': codecs.get(header.codec, header.codec), 'binary': bool(header.flags & container.FLAG_BINARY),
+            'depth': depth, 'channels': ''.join(name for name, bit in lsb_engine.CHANNEL_BITS.items() if mask & bit)}
+
+
+def scan_image(path):
+    head, (width, height), read = read_image_prefix(path)
+    result = {'kind': 'image', 'read': read}
+    found = check_container(head, width * height)
+    if found is None:
+        legacy = LEGACY_PREFIX.match(head)
+        if legacy and len(legacy.group(1)) + 1 + int(legacy.group(1)) <= width * height * 3 // 8:
+            found = {'format': 'legacy', 'message_bytes': int(legacy.group(1))}
+    result['payload'] = found is not None
+    result.update(found or {})
+    return result
+
+
+def scan_video(path, frames=VIDEO_FRAMES):
+    import container
+    import cv2
+    import video
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise Exception(f"Error opening video file {path}.")
+    result = {'kind': 'video', 'payload': False}
+    try:
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame = None
+        for index in range(frames):
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            result['frames_read'] = index + 1
+            key_header = video.read_key_header(frame)
+            if key_header:
+                _, key_frames, chunk_count, total_length, _, _ = key_header
+                if frame_count and key_frames > frame_count:
+                    break
+                result.update(payload=True, format='keyed', chunks=chunk_count, container_bytes=total_length)
+                break
+            header = video.read_chunk_header(frame)
+            if header is None:
+                continue
+            if header.index == 0:
+                # Chunk 0 starts with the container header, which must agree with the frame header
+                chunk = video.extract_chunk(frame, header)
+                try:
+                    parsed = container.parse_header(chunk)
+                except ValueError:
+                    break
+                if container.total_length(parsed) != header.total_length:
+                    break
+            result.update(payload=True, format='sequential', chunks=header.count, container_bytes=header.total_length,
+                          depth=header.depth)
+            break
+    finally:
+        cap.release()
+    return result
+
+
+def scan_item(path):
+    """Worker for scan. Never raises; failures are reported in the result."""
+    start = time.perf_counter()
+    result = {'path': path}
+    try:
+        result.update(scan_video(path) if path.lower().endswith(capacity.VIDEO_EXTENSIONS) else scan_image(path))
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def scan_chunk(paths):
+    """Worker for run_scan(): scan_item() over one chunk of paths."""
+    return [scan_item(path) for path in paths]
+
+
+def run_scan(paths, results, workers=None, chunksize=64):
+    """Scan ``paths`` in a process pool, writing one JSON line per file as results arrive.
+
+    Files go to the workers in chunks of ``chunksize`` and each chunk's lines
+    are written as soon as it completes, so a slow file only holds back its
+    own chunk; the lines are therefore not in ``paths`` order.
+
+    Returns (files with a payload, files without, errors).
+    """
+    counts = {True: 0, False: 0, None: 0}
+    chunksize = max(1, chunksize)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_chunk, paths[i:i + chunksize]) for i in range(0, len(paths), chunksize)]
+        for future in as_completed(futures):
+            for result in future.result():
+                results.write(json.dumps(result) + '\n')
+                counts[result.get('payload') if result['status'] == 'ok' else None] += 1
+            results.flush()
+    return counts[True], counts[False], counts[None]
+
+
+def add_scan_arguments(parser):
+    parser.add_argument('sources', nargs='+', help='Files, directories (searched recursively) or glob patterns')
+    parser.add_argument('--results', default='-', help='Results JSONL file (default: stdout)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunksize', type=int, default=64, help='Files sent to a worker per task')
+
+
+def scan_cli(args):
+    paths = expand_paths(args.sources)
+    results = sys.stdout if args.results == '-' else open(args.results, 'w', encoding='utf-8')
+    try:
+        start = time.perf_counter()
+        found, clean, errors = run_scan(paths, results, args.workers, args.chunksize)
+    finally:
+        if results is not sys.stdout:
+            results.close()
+    print(f"scan: {len(paths)} files, {found} with a payload, {clean} without, {errors} errors "
+          f"in {time.perf_counter() - start:.2f} s", file=sys.stderr)
@@ -0,0 +1,107 @@
+import csv
+import json
+import sys
+import threading
+import time
+
+
+class _Span:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_span(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Stats:
+    """Monotonic-clock spans and counters for one encode/decode run.
+
+    ``callback(name, value)`` is called after every span (value in seconds)
+    and every counter update (value is the new total), from whichever thread
+    recorded it.
+    """
+
+    enabled = True
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.spans = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add_span(self, name, elapsed_ns, calls=1):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0])
+            entry[0] += calls
+            entry[1] += elapsed_ns
+        if self.callback:
+            self.callback(name, elapsed_ns / 1e9)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + amount
+        if self.callback:
+            self.callback(name, total)
+
+    def as_dict(self):
+        return {
+            'spans': {name: {'calls': calls, 'seconds': ns / 1e9} for name, (calls, ns) in self.spans.items()},
+            'counters': dict(self.counters),
+        }
+
+    def write(self, path):
+        """Write to ``path`` as CSV if it ends in .csv, otherwise JSON ('-' is stdout)."""
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['kind', 'name', 'calls', 'value'])
+                for name, (calls, ns) in self.spans.items():
+                    writer.writerow(['span', name, calls, f"{ns / 1e9:.9f}"])
+                for name, value in self.counters.items():
+                    writer.writerow(['counter', name, '', value])
+        elif path == '-':
+            json.dump(self.as_dict(), sys.stdout, indent=2)
+            print()
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.as_dict(), f, indent=2)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullStats:
+    """Stand-in used when instrumentation is off; every call is a no-op."""
+
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def add_span(self, name, elapsed_ns, calls=1):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+
+NULL_STATS = NullStats()
@@ -1,13 +1,64 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import numpy as np
 from video import (
     encrypt_message, decrypt_message, compress_message, decompress_message,
-    hide_data_in_video, unhide_data_from_video, frame_to_pil_image, pil_image_to_opencv
+    hide_data_in_video, unhide_data_from_video, frame_to_pil_image, pil_image_to_opencv,
+    read_chunk_header, hide_video, unhide_video, read_key_header,
+    extract_chunk, FRAME_HEADER_V1, FRAME_MAGIC, SEEK_MIN_GAP, FrameAllocationReport
 )
+from cryptography.fernet import InvalidToken
+from extract_cache import ExtractionCache
+from gui_jobs import JobCancelled, describe_error, format_progress
+import kdf
+import lsb_engine
+from stats import Stats
+import threading
+import time
+import video_pipeline
 from PIL import Image
 import cv2
 
+class FakeCapture:
+    """In-memory stand-in for cv2.VideoCapture that records how frames were reached."""
+
+    def __init__(self, frames, accurate_seek=True):
+        self.frames = frames
+        self.accurate_seek = accurate_seek
+        self.position = 0
+        self.reads = []
+        self.grabs = 0
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return len(self.frames) if prop == cv2.CAP_PROP_FRAME_COUNT else 30
+
+    def set(self, prop, value):
+        # An inaccurate seek lands a few frames early, like a seek to the previous keyframe
+        self.position = int(value) if self.accurate_seek else max(0, int(value) - 3)
+        return True
+
+    def grab(self):
+        if self.position >= len(self.frames):
+            return False
+        self.position += 1
+        self.grabs += 1
+        return True
+
+    def read(self, image=None):
+        if self.position >= len(self.frames):
+            return False, None
+        self.reads.append(self.position)
+        self.position += 1
+        return True, self.frames[self.position - 1].copy()
+
+    def release(self):
+        pass
+
 class TestStegoVideo(unittest.TestCase):
 
     def setUp(self):
@@ -21,6 +72,23 @@ class TestStegoVideo(unittest.TestCase):
         decrypted = decrypt_message(encrypted, self.password)
         self.assertEqual(decrypted, self.message)
 
+    def test_decrypt_reuses_cached_key(self):
+        decrypt_message(self.encrypted_message, self.password)
+        hits = kdf.key_cache.hits
+        with patch('kdf.PBKDF2HMAC') as mock_kdf:
+            self.assertEqual(decrypt_message(self.encrypted_message, self.password), self.message)
+            mock_kdf.assert_not_called()
+        self.assertEqual(kdf.key_cache.hits, hits + 1)
+
+    def test_key_cache_ttl_and_bound(self):
+        cache = kdf.DerivedKeyCache(maxsize=2, ttl=60)
+        for i in range(3):
+            cache.put(i, b'key')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(0))
+        with patch('kdf.time.monotonic', return_value=time.monotonic() + 120):
+            self.assertIsNone(cache.get(2))
+
     def test_compress_decompress_message(self):
         compressed = compress_message(self.message)
         decompressed = decompress_message(compressed)
@@ -41,51 +109,338 @@ class TestStegoVideo(unittest.TestCase):
         opencv_frame = pil_image_to_opencv(pil_img)
         self.assertIsInstance(opencv_frame, np.ndarray)
 
-    @patch('cv2.VideoCapture')
+    def encode_frames(self, frames, width, height, **kwargs):
+        """Run hide_data_in_video over in-memory frames and return what was written."""
+        written = []
+        with patch('cv2.VideoCapture') as mock_video_capture, patch('cv2.VideoWriter') as mock_video_writer:
+            mock_cap = MagicMock()
+            mock_video_capture.return_value = mock_cap
+            mock_cap.isOpened.return_value = True
+            mock_cap.get.return_value = len(frames)
+            mock_cap.read.side_effect = [(True, frame.copy()) for frame in frames] + [(False, None)]
+
+            mock_out = MagicMock()
+            mock_video_writer.return_value = mock_out
+            mock_out.write.side_effect = lambda frame: written.append(frame.copy())
+
+            hide_data_in_video("input.avi", "output.avi", 30, width, height, 'FFV1', self.message, self.password, **kwargs)
+        return written
+
+    def test_hide_data_in_video(self):
+        frames = [np.full((480, 640, 3), 7, dtype=np.uint8) for _ in range(5)]
+        written = self.encode_frames(frames, 640, 480)
+
+        # Every frame is written, but only the first one carries the payload
+        self.assertEqual(len(written), 5)
+        self.assertFalse(np.array_equal(written[0], frames[0]))
+        for original, output in zip(frames[1:], written[1:]):
+            np.testing.assert_array_equal(original, output)
+
+    def test_hide_data_spreads_across_frames(self):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        written = self.encode_frames(frames, 16, 16)
+
+        carriers = [i for i, frame in enumerate(written) if frame.any()]
+        self.assertGreater(len(carriers), 1)
+        self.assertEqual(carriers, list(range(len(carriers))))
+
+    def test_pipelined_hide_writes_frames_in_order(self):
+        frames = [np.full((16, 16, 3), i, dtype=np.uint8) for i in range(30)]
+        written = self.encode_frames(frames, 16, 16, workers=4, queue_depth=3)
+
+        self.assertEqual(len(written), len(frames))
+        for original, output in zip(frames, written):
+            # Embedding only touches the LSBs, so each frame keeps its fill value
+            np.testing.assert_array_equal(original >> 1, output >> 1)
+        self.assertIsNotNone(read_chunk_header(written[0]))
+
+    def test_pipelined_hide_reports_stages_from_stats(self):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(12)]
+        with patch('builtins.print') as mock_print:
+            self.encode_frames(frames, 16, 16, workers=3)
+        report = mock_print.call_args_list[0].args[0]
+        for stage in ('decode', 'process', 'write'):
+            self.assertRegex(report, rf"{stage}\s+12\s")
+        self.assertIn("overall: 12 frames", report)
+
+    def test_pipeline_write_error_stops_the_threads(self):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(50)]
+        cap = FakeCapture(frames)
+        out = MagicMock()
+        out.write.side_effect = [None, None, OSError("disk full")]
+        before = threading.active_count()
+        with self.assertRaisesRegex(OSError, "disk full"):
+            video_pipeline.run_pipeline(cap, out, lambda index, frame: None, workers=3, queue_depth=2)
+        # The reader and workers were joined before the error reached the caller
+        self.assertEqual(threading.active_count(), before)
+        reads = len(cap.reads)
+        time.sleep(0.05)
+        self.assertEqual(len(cap.reads), reads)
+        self.assertLess(reads, len(frames))
+        self.assertEqual(out.write.call_count, 3)
+
+    def test_hide_records_stats(self):
+        events = []
+        stats = Stats(callback=lambda name, value: events.append(name))
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        written = self.encode_frames(frames, 16, 16, stats=stats)
+
+        report = stats.as_dict()
+        self.assertEqual(report['counters']['frames'], 20)
+        carriers = sum(1 for frame in written if read_chunk_header(frame) is not None)
+        self.assertEqual(report['counters']['carrier_frames'], carriers)
+        self.assertEqual(report['spans']['embed']['calls'], carriers)
+        for stage in ('decode', 'write', 'kdf', 'encrypt'):
+            self.assertIn(stage, report['spans'])
+        self.assertIn('frames', events)
+
     @patch('cv2.VideoWriter')
-    @patch('stegano.lsb.hide')
-    def test_hide_data_in_video(self, mock_hide, mock_video_writer, mock_video_capture):
-        # Mocking video processing functions
+    @patch('cv2.VideoCapture')
+    def test_hide_progress_can_cancel(self, mock_video_capture, mock_video_writer):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
         mock_cap = MagicMock()
         mock_video_capture.return_value = mock_cap
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.side_effect = [(True, np.zeros((480, 640, 3), dtype=np.uint8)), (False, None)]  # Valid frame followed by end
+        mock_cap.get.return_value = len(frames)
+        mock_cap.read.side_effect = [(True, frame) for frame in frames] + [(False, None)]
+        mock_out = mock_video_writer.return_value
+
+        reports = []
+        def progress(done, total):
+            reports.append((done, total))
+            if done == 3:
+                raise JobCancelled("Cancelled by user")
+
+        with self.assertRaises(JobCancelled):
+            hide_video("input.avi", "output.avi", 30, 16, 16, 'FFV1', self.message, self.password, progress=progress)
+        self.assertEqual(reports, [(1, 20), (2, 20), (3, 20)])
+        self.assertEqual(mock_out.write.call_count, 3)
+        mock_cap.release.assert_called_once()
+        mock_out.release.assert_called_once()
+
+    @patch('cv2.VideoWriter')
+    @patch('cv2.VideoCapture')
+    def test_failed_hide_removes_only_its_own_output(self, mock_video_capture, mock_video_writer):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "output.avi")
+            def create_output(path, *args):
+                open(path, 'wb').close()
+                return MagicMock()
+            mock_video_writer.side_effect = create_output
+
+            # The input cannot be opened: a file already at the output path is left alone
+            open(output, 'wb').close()
+            mock_video_capture.return_value.isOpened.return_value = False
+            with self.assertRaisesRegex(Exception, "opening input"):
+                hide_video("input.avi", output, 30, 16, 16, 'FFV1', self.message, self.password)
+            self.assertTrue(os.path.exists(output))
+
+            # The video ends before the last carrier: the partial output is removed
+            mock_cap = MagicMock()
+            mock_video_capture.return_value = mock_cap
+            mock_cap.get.return_value = 1
+            mock_cap.read.side_effect = [(True, np.zeros((16, 16, 3), dtype=np.uint8)), (False, None)]
+            with self.assertRaisesRegex(Exception, "only has 1"):
+                hide_video("input.avi", output, 30, 16, 16, 'FFV1', os.urandom(500).hex(), self.password)
+            self.assertFalse(os.path.exists(output))
+            mock_cap.release.assert_called_once()
 
-        mock_out = MagicMock()
-        mock_video_writer.return_value = mock_out
+    def keyed_video(self, frame_count=200):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(frame_count)]
+        return self.encode_frames(frames, 16, 16, keyed=True)
 
-        # Mock the hide function to simulate successful hiding
-        mock_hide.return_value = MagicMock()
+    def test_keyed_layout_spreads_chunks(self):
+        written = self.keyed_video()
+        self.assertIsNotNone(read_key_header(written[0]))
+        carriers = [i for i, frame in enumerate(written) if read_chunk_header(frame) is not None]
+        self.assertGreater(len(carriers), 1)
+        self.assertNotEqual(carriers, list(range(1, len(carriers) + 1)))
 
-        try:
-            hide_data_in_video("input.mp4", "output.mp4", 30, 640, 480, 'XVID', self.message, self.password)
-        except Exception as e:
-            self.fail(f"Exception during hide_data_in_video: {e}")
+    def test_keyed_unhide_reads_only_carrier_frames(self):
+        written = self.keyed_video()
+        carriers = [i for i, frame in enumerate(written) if read_chunk_header(frame) is not None]
+        gaps = [target - position for target, position in zip(carriers, [1] + [c + 1 for c in carriers])]
+        seeks = any(gap >= SEEK_MIN_GAP for gap in gaps)
 
-        # Ensure that the VideoWriter.write was called with a valid frame
-        self.assertTrue(mock_out.write.called, "VideoWriter.write was not called.")
+        for seek, accurate in (('auto', True), ('auto', False), ('grab', True)):
+            captures = []
+            def open_capture(path):
+                captures.append(FakeCapture(written, accurate))
+                return captures[-1]
+            with patch('cv2.VideoCapture', side_effect=open_capture):
+                self.assertEqual(unhide_video("input.avi", self.password, seek=seek), self.message)
+            # Frames other than frame 0 and the carriers are never retrieved;
+            # an inaccurate seek is detected and redone on a fresh capture
+            self.assertEqual(len(captures), 2 if seek == 'auto' and seeks and not accurate else 1)
+            self.assertEqual([index for index in captures[-1].reads if index], carriers)
+            if seek == 'auto' and accurate:
+                # Only gaps shorter than SEEK_MIN_GAP are crossed with grab()
+                self.assertEqual(captures[-1].grabs, sum(gap for gap in gaps if gap < SEEK_MIN_GAP))
+
+    def test_keyed_unhide_wrong_password(self):
+        written = self.keyed_video()
+        capture = FakeCapture(written)
+        with patch('cv2.VideoCapture', return_value=capture):
+            with self.assertRaises(InvalidToken):
+                unhide_video("input.avi", "wrong_password")
+        self.assertEqual(capture.reads, [0])
+
+    def test_describe_error(self):
+        self.assertEqual(describe_error(InvalidToken()), "Wrong password or corrupted data")
+        self.assertEqual(describe_error(KeyError()), "KeyError")
+        self.assertEqual(describe_error(ValueError("bad layout")), "bad layout")
+
+    def test_format_progress(self):
+        self.assertEqual(format_progress(120, 3000, 2.0), "Frames 120/3000 - 60.0 fps - ETA 00:48")
+        self.assertEqual(format_progress(5, 0, 1.0), "Frames 5 - 5.0 fps")
 
     @patch('cv2.VideoCapture')
-    @patch('stegano.lsb.reveal')
-    def test_unhide_data_from_video(self, mock_reveal, mock_video_capture):
+    def test_unhide_data_from_video(self, mock_video_capture):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        written = self.encode_frames(frames, 16, 16)
+
         mock_cap = MagicMock()
         mock_video_capture.return_value = mock_cap
         mock_cap.isOpened.return_value = True
-        mock_cap.read.side_effect = [(True, np.zeros((480, 640, 3), dtype=np.uint8)), (False, None)]
+        mock_cap.read.side_effect = [(True, frame) for frame in written] + [(False, None)]
 
-        # Mock the reveal function to return the compressed message
-        mock_reveal.return_value = self.compressed_message
-
-        decrypted_message = None
-        try:
-            compressed_message = unhide_data_from_video("input.mp4", self.password)
-            if compressed_message:
-                decrypted_message = decompress_message(compressed_message)
-        except Exception as e:
-            self.fail(f"Exception during unhide_data_from_video: {e}")
+        decrypted_message = unhide_data_from_video("input.avi", self.password)
 
         # Ensure the message is successfully decrypted
         self.assertEqual(decrypted_message, self.message, "The decrypted message does not match the original.")
 
+    @patch('cv2.VideoCapture')
+    def test_unhide_stops_after_last_chunk(self, mock_video_capture):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        written = self.encode_frames(frames, 16, 16)
+        carriers = sum(1 for frame in written if read_chunk_header(frame) is not None)
+
+        mock_cap = MagicMock()
+        mock_video_capture.return_value = mock_cap
+        mock_cap.read.side_effect = [(True, frame) for frame in written] + [(False, None)]
+
+        self.assertEqual(unhide_data_from_video("input.avi", self.password), self.message)
+        self.assertEqual(mock_cap.read.call_count, carriers)
+        mock_cap.release.assert_called_once()
+
+    @patch('cv2.VideoCapture')
+    def test_hide_at_depth_uses_fewer_frames(self, mock_video_capture):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        shallow = sum(1 for frame in self.encode_frames(frames, 16, 16) if frame.any())
+        written = self.encode_frames(frames, 16, 16, depth=4, channels=lsb_engine.parse_channels('gb'))
+        carriers = [frame for frame in written if frame.any()]
+        self.assertLess(len(carriers), shallow)
+        header = read_chunk_header(carriers[0])
+        self.assertEqual((header.depth, header.mask), (4, lsb_engine.parse_channels('gb')))
+
+        mock_cap = MagicMock()
+        mock_video_capture.return_value = mock_cap
+        mock_cap.read.side_effect = [(True, frame) for frame in written] + [(False, None)]
+        self.assertEqual(unhide_data_from_video("input.avi", self.password), self.message)
+
+    @patch('cv2.VideoCapture')
+    def test_unhide_decrypts_chunks_as_frames_arrive(self, mock_video_capture):
+        # Several sealed chunks per frame and several frames
+        self.message = np.random.default_rng(1).integers(0, 256, 300000, dtype=np.uint8).tobytes()
+        frames = [np.zeros((480, 640, 3), dtype=np.uint8) for _ in range(5)]
+        written = self.encode_frames(frames, 640, 480)
+        carriers = sum(1 for frame in written if read_chunk_header(frame) is not None)
+        self.assertGreater(carriers, 2)
+
+        mock_cap = MagicMock()
+        mock_video_capture.return_value = mock_cap
+        mock_cap.read.side_effect = [(True, frame) for frame in written] + [(False, None)]
+        self.assertEqual(unhide_video("input.avi", self.password), self.message)
+
+        # A wrong password fails on the first sealed chunk, in the first frame
+        mock_cap.read.reset_mock()
+        mock_cap.read.side_effect = [(True, frame) for frame in written] + [(False, None)]
+        with self.assertRaises(InvalidToken):
+            unhide_video("input.avi", "wrong_password")
+        self.assertEqual(mock_cap.read.call_count, 1)
+
+    def test_unhide_retry_uses_extraction_cache(self):
+        frames = [np.zeros((16, 16, 3), dtype=np.uint8) for _ in range(20)]
+        written = self.encode_frames(frames, 16, 16)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "input.avi")
+            with open(path, 'wb') as f:
+                f.write(b"stand-in for the video file")
+            cache = ExtractionCache()
+            with patch('cv2.VideoCapture', return_value=FakeCapture(written)) as capture:
+                with self.assertRaises(InvalidToken):
+                    unhide_video(path, "wrong_password", cache=cache)
+                self.assertEqual(unhide_video(path, self.password, cache=cache), self.message)
+            capture.assert_called_once()
+
+    def ffv1_video(self, tmpdir, frame_count, width=64, height=48, **kwargs):
+        source = os.path.join(tmpdir, "source.avi")
+        output = os.path.join(tmpdir, "output.avi")
+        out = cv2.VideoWriter(source, cv2.VideoWriter_fourcc(*'FFV1'), 10, (width, height))
+        rng = np.random.default_rng(2)
+        for _ in range(frame_count):
+            out.write(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+        out.release()
+        hide_video(source, output, 10, width, height, cv2.VideoWriter_fourcc(*'FFV1'), self.message, self.password,
+                   **kwargs)
+        return output
+
+    def test_alloc_report_charges_no_frame_buffer_to_a_frame(self):
+        reports = []
+        def make_report():
+            reports.append(FrameAllocationReport())
+            return reports[-1]
+        for keyed in (False, True):
+            with tempfile.TemporaryDirectory() as tmpdir, patch('video.FrameAllocationReport', side_effect=make_report), \
+                    patch('builtins.print'):
+                self.ffv1_video(tmpdir, 4, 320, 240, alloc_report=True, keyed=keyed)
+        for report in reports:
+            # Frame 0 is a carrier in the leading layout and a pass-through frame in the keyed one
+            samples = report.carrier_frames + report.passthrough_frames
+            self.assertEqual(len(samples), 4)
+            self.assertLess(max(samples), report.frame_nbytes / 8)
+
+        with self.assertRaises(ValueError):
+            hide_video("input.avi", "output.avi", 30, 16, 16, 'FFV1', self.message, self.password, alloc_report=True,
+                       workers=2)
+
+    def test_parallel_unhide_matches_serial(self):
+        self.message = np.random.default_rng(3).integers(0, 256, 20000, dtype=np.uint8).tobytes()
+        for keyed in (False, True):
+            with self.subTest(keyed=keyed), tempfile.TemporaryDirectory() as tmpdir:
+                output = self.ffv1_video(tmpdir, 40, keyed=keyed)
+                reports = []
+                stats = Stats()
+                result = unhide_video(output, self.password, stats=stats, workers=3,
+                                      progress=lambda done, total: reports.append((done, total)))
+                self.assertEqual(result, self.message)
+                chunks = reports[-1][1]
+                self.assertGreaterEqual(chunks, 18)
+                self.assertEqual(reports[-1], (chunks, chunks))
+                self.assertEqual(stats.counters['carrier_frames'], chunks)
+
+    def test_parallel_unhide_can_cancel(self):
+        self.message = np.random.default_rng(3).integers(0, 256, 20000, dtype=np.uint8).tobytes()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = self.ffv1_video(tmpdir, 40)
+
+            def progress(done, total):
+                if done == 3:
+                    raise JobCancelled("Cancelled by user")
+
+            with self.assertRaises(JobCancelled):
+                unhide_video(output, self.password, workers=3, progress=progress)
+
+    def test_reads_version_1_frames(self):
+        frame = np.zeros((16, 16, 3), dtype=np.uint8)
+        header = FRAME_HEADER_V1.pack(FRAME_MAGIC, 1, 0, 1, 5, 0, 5)
+        lsb_engine.embed_bytes(lsb_engine.pixel_view(frame, lsb_engine.BGR_CHANNELS), header + b"hello")
+        chunk = read_chunk_header(frame)
+        self.assertEqual((chunk.version, chunk.length), (1, 5))
+        self.assertEqual(extract_chunk(frame, chunk), b"hello")
+
+    def test_read_chunk_header_rejects_plain_frame(self):
+        frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        self.assertIsNone(read_chunk_header(frame))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,160 @@
+import argparse
+import base64
+import json
+import os
+import socket
+import sys
+
+# Thin client for stego_daemon.py. It deliberately imports nothing beyond the
+# standard library so a request costs a socket round trip, not a Python
+# startup full of cv2/PIL/cryptography imports.
+#
+# Protocol: one JSON object per line in each direction. A request names an
+# ``op`` (ping, encode, decode, capacity) and its parameters; the daemon
+# answers with zero or more {"event": "progress"} lines followed by one
+# {"event": "done", "result": ...} or {"event": "error", "error": ...} line.
+# A connection can carry any number of requests, one after the other.
+#
+# A Unix socket is created readable by its owner only. Any local user can
+# connect to a TCP port, so a TCP daemon writes a random token to TOKEN_FILE
+# (mode 0600) when it starts and refuses requests that do not carry it.
+TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.stego-daemon-token')
+if hasattr(socket, 'AF_UNIX'):
+    DEFAULT_ADDRESS = os.path.join(os.environ.get('TMPDIR', '/tmp'), f"stego-daemon-{os.getuid()}.sock")
+else:
+    DEFAULT_ADDRESS = '127.0.0.1:8765'
+
+
+class DaemonError(Exception):
+    pass
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+def read_token(path=None):
+    """The TCP daemon's token from ``path`` (default TOKEN_FILE), or None if there is none."""
+    try:
+        with open(path or TOKEN_FILE, encoding='ascii') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class Client:
+    """A connection to the daemon that can be reused for many requests."""
+
+    def __init__(self, address=None, timeout=None, token_file=None):
+        family, target = parse_address(address or os.environ.get('STEGO_DAEMON', DEFAULT_ADDRESS))
+        self.token = read_token(token_file) if family == socket.AF_INET else None
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(target)
+        self.file = self.sock.makefile('rwb')
+
+    def request(self, op, progress=None, **params):
+        """Send one request and return its result.
+
+        ``progress(done, total)`` receives the daemon's progress events; the
+        daemon only sends them when a callback is given. Raises DaemonError
+        if the request fails.
+        """
+        params['op'] = op
+        params['progress'] = progress is not None
+        if self.token:
+            params['token'] = self.token
+        self.file.write(json.dumps(params).encode('utf-8') + b'\n')
+        self.file.flush()
+        for line in self.file:
+            reply = json.loads(line)
+            if reply['event'] == 'progress':
+                progress(reply['done'], reply['total'])
+            elif reply['event'] == 'done':
+                return reply['result']
+            else:
+                raise DaemonError(reply['error'])
+        raise DaemonError("Connection closed by the daemon")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_progress(done, total):
+    sys.stderr.write(f"\r{done}/{total}" if total else f"\r{done}")
+    sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send encode/decode/capacity requests to a running stego_daemon.py')
+    parser.add_argument('--address', help=f"Daemon socket path or host:port (default: $STEGO_DAEMON or {DEFAULT_ADDRESS})")
+    parser.add_argument('--token-file', help=f"Token of a TCP daemon (default: {TOKEN_FILE})")
+    parser.add_argument('--progress', action='store_true', help='Show progress on stderr')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('ping', help='Check that the daemon is up')
+
+    encode_parser = subparsers.add_parser('encode', help='Hide a message in an image or video')
+    encode_parser.add_argument('input', help='Carrier image or video')
+    encode_parser.add_argument('message', help='The message to hide')
+    encode_parser.add_argument('password', help='Password to encrypt the message')
+    encode_parser.add_argument('--file', action='store_true', help='Treat MESSAGE as the path of a (binary) file to hide')
+    encode_parser.add_argument('--output', help='Output path (required for video)')
+    encode_parser.add_argument('--codec', help='FourCC for video output (default FFV1)')
+    encode_parser.add_argument('--stream', action='store_true', help='Strip-streaming embed for large images')
+    encode_parser.add_argument('--keyed', action='store_true', help='Password-selected carrier frames for video')
+    encode_parser.add_argument('--depth', type=int, choices=range(1, 5), help='Bits per channel (default 1)')
+    encode_parser.add_argument('--channels', help="Channels to embed in, e.g. 'rgb' (default) or 'b'")
+    encode_parser.add_argument('--compression', choices=('auto', 'none', 'zlib', 'bz2', 'lzma'), help="Plaintext codec (default auto)")
+    encode_parser.add_argument('--level', type=int, help='Compression level for a named codec')
+
+    decode_parser = subparsers.add_parser('decode', help='Reveal the message in an image or video')
+    decode_parser.add_argument('input', help='Encoded image or video')
+    decode_parser.add_argument('password', help='Password used for encryption')
+    decode_parser.add_argument('--output', help='Write the payload to this file')
+    decode_parser.add_argument('--seek', choices=('auto', 'grab'), help='How keyed videos skip non-carrier frames')
+
+    capacity_parser = subparsers.add_parser('capacity', help='Report carrier capacity')
+    capacity_parser.add_argument('input', help='Image or video to probe')
+    capacity_parser.add_argument('--payload-size', type=int, help='Plan for a payload of this many bytes')
+
+    args = parser.parse_args()
+    params = {key: value for key, value in vars(args).items()
+              if key not in ('address', 'token_file', 'progress', 'command', 'file') and value not in (None, False)}
+    # The daemon resolves paths relative to its own working directory
+    for key in ('input', 'output'):
+        if key in params:
+            params[key] = os.path.abspath(params[key])
+    if getattr(args, 'file', False):
+        params['payload_file'] = os.path.abspath(params.pop('message'))
+
+    try:
+        with Client(args.address, token_file=args.token_file) as client:
+            result = client.request(args.command, print_progress if args.progress else None, **params)
+    except (OSError, DaemonError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.progress:
+        sys.stderr.write("\n")
+    if 'payload_b64' in result:
+        sys.stdout.buffer.write(base64.b64decode(result['payload_b64']))
+    elif 'message' in result:
+        print(result['message'])
+    else:
+        print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
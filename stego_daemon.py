@@ -0,0 +1,264 @@
+import argparse
+import base64
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Importing these up front is the point of the daemon: cv2, PIL, numpy and
+# cryptography are loaded once and every request reuses them, along with
+# the derived key cache
+import cv2
+
+import capacity
+import container
+import lsb_engine
+import video
+from extract_cache import extraction_cache
+from image_core import decode_image, encode_image
+from stego_client import DEFAULT_ADDRESS, TOKEN_FILE, parse_address
+
+PROGRESS_INTERVAL = 0.1
+# Encodes seal under one master key per password, derived with this salt; kdf
+# caches it, so a warm daemon runs PBKDF2 once per password instead of once per
+# request. Each container still gets its own subkey (see container).
+MASTER_SALT = os.urandom(16)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+def _video_codec(name):
+    return cv2.VideoWriter_fourcc(*(name or 'FFV1'))
+
+
+def _payload(request):
+    if 'payload_file' in request:
+        with open(request['payload_file'], 'rb') as f:
+            return f.read()
+    if 'payload_b64' in request:
+        return base64.b64decode(request['payload_b64'])
+    return request['message']
+
+
+def _decoded(request, payload):
+    if payload is None:
+        raise Exception("No hidden message found")
+    if request.get('output'):
+        with open(request['output'], 'wb') as f:
+            f.write(payload if isinstance(payload, bytes) else payload.encode('utf-8'))
+        return {'output': request['output'], 'bytes': os.path.getsize(request['output'])}
+    if isinstance(payload, bytes):
+        return {'payload_b64': base64.b64encode(payload).decode('ascii')}
+    return {'message': payload}
+
+
+def handle_request(request, progress):
+    """Run one request and return its JSON-serialisable result.
+
+    ``progress(done, total)`` is called during video jobs and raises to abort them.
+    """
+    op = request.get('op')
+    path = request.get('input')
+    is_video = bool(path) and path.lower().endswith(capacity.VIDEO_EXTENSIONS)
+
+    if op == 'ping':
+        return {'pid': os.getpid()}
+    if op == 'capacity':
+        if request.get('payload_size') is not None:
+            return capacity.plan(path, request['payload_size'])
+        return capacity.probe(path)
+    if op == 'encode':
+        payload = _payload(request)
+        key = container.master_key(request['password'], MASTER_SALT)
+        depth = request.get('depth', 1)
+        channels = lsb_engine.parse_channels(request.get('channels', 'rgb'))
+        if not is_video:
+            output = encode_image(path, payload, request['password'], request.get('output'), stream=request.get('stream', False),
+                                  depth=depth, channels=channels, compression=request.get('compression', 'auto'),
+                                  compression_level=request.get('level'), key=key)
+            return {'output': output}
+        if not request.get('output'):
+            raise Exception("Video encode requests need an output path")
+        info = capacity.video_capacity(path)
+        carriers = video.hide_video(path, request['output'], info['fps'], info['width'], info['height'],
+                                    _video_codec(request.get('codec')), payload, request['password'], progress=progress,
+                                    keyed=request.get('keyed', False), depth=depth, channels=channels,
+                                    compression=request.get('compression', 'auto'), compression_level=request.get('level'),
+                                    key=key)
+        return {'output': request['output'], 'carrier_frames': carriers}
+    if op == 'decode':
+        # Requests for the same unchanged file share the extracted container
+        if is_video:
+            return _decoded(request, video.unhide_video(path, request['password'], progress=progress,
+                                                        seek=request.get('seek', 'auto'), cache=extraction_cache))
+        return _decoded(request, decode_image(path, request['password'], cache=extraction_cache))
+    raise Exception(f"Unknown op {op!r}")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.send({'event': 'error', 'error': f"Malformed request: {e}"})
+                continue
+            token = self.server.token
+            if token and not hmac.compare_digest(str(request.pop('token', '')).encode(), token.encode()):
+                self.send({'event': 'error', 'error': "Missing or wrong daemon token"})
+                return
+            if not self.run(request):
+                return
+
+    def run(self, request):
+        """Run a request on the worker pool, relaying its progress. Returns False if the client went away."""
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def progress(done, total):
+            # Runs on the pool thread; a closed connection stops the job at its next frame
+            if cancelled.is_set():
+                raise RequestCancelled("Client disconnected")
+            events.put(('progress', (done, total)))
+
+        def job():
+            try:
+                events.put(('done', handle_request(request, progress)))
+            except Exception as e:
+                events.put(('error', str(e) or type(e).__name__))
+
+        self.server.pool.submit(job)
+        last_sent = 0.0
+        while True:
+            kind, value = events.get()
+            try:
+                if kind == 'progress':
+                    now = time.monotonic()
+                    if request.get('progress') and now - last_sent >= PROGRESS_INTERVAL:
+                        last_sent = now
+                        self.send({'event': 'progress', 'done': value[0], 'total': value[1]})
+                    continue
+                self.send({'event': kind, ('result' if kind == 'done' else 'error'): value})
+                return True
+            except OSError:
+                cancelled.set()
+                if kind != 'progress':
+                    return False
+
+
+class _DaemonMixin:
+    daemon_threads = True
+    allow_reuse_address = True
+    # Requests must carry this token; None where the socket itself is private
+    token = None
+
+    def __init__(self, address, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stego-worker')
+        super().__init__(address, RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class TcpDaemon(_DaemonMixin, socketserver.ThreadingTCPServer):
+
+    def __init__(self, address, workers, token_file=TOKEN_FILE):
+        super().__init__(address, workers)
+        self.token = secrets.token_hex(32)
+        # Written with a private mode and swapped in, so the token is never readable by others
+        partial = f"{token_file}.{os.getpid()}.part"
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(self.token)
+        os.replace(partial, token_file)
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class UnixDaemon(_DaemonMixin, socketserver.ThreadingUnixStreamServer):
+        _bound = False
+
+        def server_bind(self):
+            self._remove_stale_socket()
+            # Only the current user may connect
+            umask = os.umask(0o177)
+            try:
+                super().server_bind()
+            finally:
+                os.umask(umask)
+            self._bound = True
+
+        def _remove_stale_socket(self):
+            """Remove a socket left behind by a daemon that died, but never take over a live one."""
+            try:
+                mode = os.stat(self.server_address).st_mode
+            except FileNotFoundError:
+                return
+            if not stat.S_ISSOCK(mode):
+                raise OSError(f"{self.server_address} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.server_address)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.server_address)
+                return
+            finally:
+                probe.close()
+            raise OSError(f"A daemon is already listening on {self.server_address}")
+
+        def server_close(self):
+            super().server_close()
+            # A daemon that failed to bind leaves the path to whoever owns it
+            if self._bound and os.path.exists(self.server_address):
+                os.remove(self.server_address)
+
+
+def make_server(address=DEFAULT_ADDRESS, workers=None, token_file=TOKEN_FILE):
+    """Create (but do not start) a daemon listening on a Unix socket path or host:port.
+
+    A TCP daemon writes the token its clients must send to ``token_file``.
+    """
+    workers = workers or os.cpu_count() or 1
+    family, target = parse_address(address)
+    if family == socket.AF_INET:
+        # TcpDaemon is IPv4 only, so the IPv6 loopback is not accepted either
+        if target[0] not in ('127.0.0.1', 'localhost'):
+            raise ValueError("The daemon only listens on the IPv4 loopback interface")
+        return TcpDaemon(target, workers, token_file)
+    return UnixDaemon(target, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the steganography modules loaded and serve encode/decode/capacity requests')
+    parser.add_argument('--address', default=os.environ.get('STEGO_DAEMON', DEFAULT_ADDRESS),
+                        help=f"Unix socket path, or 127.0.0.1:PORT for TCP (default: {DEFAULT_ADDRESS})")
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent jobs (default: CPU count)')
+    parser.add_argument('--token-file', default=TOKEN_FILE, help=f"Where a TCP daemon writes its client token (default: {TOKEN_FILE})")
+    args = parser.parse_args()
+
+    server = make_server(args.address, args.workers, args.token_file)
+    print(f"Listening on {args.address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import io
+import mmap
+import struct
+import zlib
+
+import numpy as np
+from PIL import BmpImagePlugin, Image, PpmImagePlugin, TiffImagePlugin
+
+import lsb_engine
+from stats import NULL_STATS
+
+# Strip-streaming embed for carriers too large to hold in memory.
+#
+# The carrier is read in strips of whole rows. Raw formats (PPM, BMP and
+# uncompressed TIFF) are memory-mapped; PNG is inflated incrementally and
+# each strip is unfiltered on its own. The payload is embedded from the
+# first pixel, so only the leading strips change. Every strip after that is
+# passed through to the output PNG still filtered when the input is a PNG,
+# and is otherwise filtered and compressed one strip at a time. Peak memory
+# is a few strips, whatever the image size.
+STRIP_ROWS = 256
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+IHDR = struct.Struct('>IIBBBBB')
+COLOR_TYPES = {'RGB': 2, 'RGBA': 6}
+IDAT_SIZE = 1 << 16
+
+# PIL rawmode -> (image mode, bytes per pixel, channel order as RGB[A])
+RAW_MODES = {
+    'RGB': ('RGB', 3, [0, 1, 2]),
+    'BGR': ('RGB', 3, [2, 1, 0]),
+    'RGBX': ('RGB', 4, [0, 1, 2]),
+    'BGRX': ('RGB', 4, [2, 1, 0]),
+    'RGBA': ('RGBA', 4, [0, 1, 2, 3]),
+}
+
+
+def _chunk(ctype, data):
+    return struct.pack('>I', len(data)) + ctype + data + struct.pack('>I', zlib.crc32(ctype + data))
+
+
+def _copy_safe(ctype):
+    # Critical chunks always describe the image; of the ancillary ones only
+    # those marked safe-to-copy may survive a change to the pixel data
+    return not ctype[0] & 0x20 or ctype[3] & 0x20
+
+
+class PngReader:
+    """Reads an 8-bit, non-interlaced RGB/RGBA PNG a few scanlines at a time."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            if self.file.read(8) != PNG_SIGNATURE:
+                raise ValueError(f"{path} is not a PNG file")
+            self.chunks_before = []
+            self.chunks_after = []
+            header = None
+            while True:
+                ctype, data = self._read_chunk()
+                if ctype == b'IHDR':
+                    header = IHDR.unpack(data)
+                elif ctype == b'IDAT':
+                    self._pending = data
+                    break
+                elif ctype == b'IEND':
+                    raise ValueError(f"{path} has no image data")
+                elif _copy_safe(ctype):
+                    self.chunks_before.append((ctype, data))
+            if header is None:
+                raise ValueError(f"{path} has no IHDR chunk")
+            self.width, self.height, depth, color_type, _, _, interlace = header
+            modes = {v: k for k, v in COLOR_TYPES.items()}
+            if depth != 8 or color_type not in modes or interlace:
+                raise ValueError(f"Only 8-bit non-interlaced RGB/RGBA PNGs can be streamed: {path}")
+        except Exception:
+            self.file.close()
+            raise
+        self.mode = modes[color_type]
+        self.row_bytes = 1 + self.width * len(self.mode)
+        self._inflate = zlib.decompressobj()
+        self._buffer = bytearray()
+
+    def _read_chunk(self):
+        head = self.file.read(8)
+        if len(head) < 8:
+            raise ValueError("PNG file is truncated")
+        length, ctype = struct.unpack('>I4s', head)
+        data = self.file.read(length)
+        crc = self.file.read(4)
+        if len(crc) < 4 or struct.unpack('>I', crc)[0] != zlib.crc32(ctype + data):
+            raise ValueError(f"PNG chunk {ctype.decode('latin-1')} is corrupt")
+        return ctype, data
+
+    def _next_idat(self):
+        if self._pending is not None:
+            data, self._pending = self._pending, None
+            return data
+        if self.chunks_after is None:
+            return None
+        while True:
+            ctype, data = self._read_chunk()
+            if ctype == b'IDAT' and not self.chunks_after:
+                return data
+            if ctype == b'IEND':
+                return None
+            if ctype != b'IDAT' and _copy_safe(ctype):
+                self.chunks_after.append((ctype, data))
+
+    def read_rows(self, count):
+        """Return the next ``count`` scanlines, still filtered, as bytes."""
+        need = count * self.row_bytes
+        while len(self._buffer) < need:
+            data = self._inflate.unconsumed_tail or self._next_idat()
+            if data is None:
+                raise ValueError("PNG image data is truncated")
+            # max_length keeps the inflated buffer at the size of one strip
+            self._buffer += self._inflate.decompress(data, need - len(self._buffer))
+        rows = bytes(self._buffer[:need])
+        del self._buffer[:need]
+        return rows
+
+    def unfilter(self, filtered, previous=None):
+        """Unfilter scanlines into an (rows, W, C) array.
+
+        ``previous`` is the unfiltered row above the first scanline. The rows
+        are wrapped in a minimal in-memory PNG behind that row, stored
+        uncompressed, so PIL's decoder does the actual unfiltering.
+        """
+        if previous is not None:
+            filtered = b'\x00' + previous.tobytes() + filtered
+        rows = len(filtered) // self.row_bytes
+        png = (PNG_SIGNATURE
+               + _chunk(b'IHDR', IHDR.pack(self.width, rows, 8, COLOR_TYPES[self.mode], 0, 0, 0))
+               + _chunk(b'IDAT', zlib.compress(filtered, 0))
+               + _chunk(b'IEND', b''))
+        with Image.open(io.BytesIO(png)) as image:
+            array = np.array(image)
+        return array[1:] if previous is not None else array
+
+    def finish(self):
+        """Skip the remaining image data, collecting the chunks that follow it."""
+        while self._next_idat() is not None:
+            pass
+        self.chunks_after, chunks = None, self.chunks_after
+        return chunks or []
+
+    def close(self):
+        self.file.close()
+
+
+class RawReader:
+    """Memory-mapped row access to an uncompressed PPM, BMP or TIFF."""
+
+    OPENERS = {
+        b'P6': PpmImagePlugin.PpmImageFile,
+        b'BM': BmpImagePlugin.BmpImageFile,
+        b'II': TiffImagePlugin.TiffImageFile,
+        b'MM': TiffImagePlugin.TiffImageFile,
+    }
+
+    def __init__(self, path, writable=False):
+        with open(path, 'rb') as f:
+            opener = self.OPENERS.get(f.read(2))
+        if opener is None:
+            raise ValueError(f"{path} is not a PNG, PPM, BMP or TIFF file")
+        # The plugin classes are used directly because only the header is read
+        # here; Image.open() would refuse a very large image outright
+        with opener(path) as image:
+            self.width, self.height = image.size
+            tiles = image.tile
+
+        with open(path, 'r+b' if writable else 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        data = np.frombuffer(self._map, dtype=np.uint8)
+        self.mode = None
+        self.tiles = []
+        for tile in tiles:
+            codec, (x0, y0, x1, y1), offset, args = tile
+            rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else args[:3]
+            if codec != 'raw' or rawmode not in RAW_MODES or (x0, x1) != (0, self.width):
+                raise ValueError(f"{path} is compressed or uses an unsupported pixel layout")
+            mode, bpp, order = RAW_MODES[rawmode]
+            if self.mode not in (None, mode):
+                raise ValueError(f"{path} mixes pixel layouts")
+            self.mode = mode
+            stride = stride or self.width * bpp
+            rows = data[offset:offset + (y1 - y0) * stride].reshape(y1 - y0, stride)
+            if orientation < 0:
+                rows = rows[::-1]
+            self.tiles.append((y0, y1, rows[:, :self.width * bpp].reshape(y1 - y0, self.width, bpp), order))
+
+    def read(self, y0, y1):
+        """Copy rows ``y0:y1`` out of the map as an (rows, W, C) RGB[A] array."""
+        parts = []
+        for top, bottom, rows, order in self.tiles:
+            if top < y1 and bottom > y0:
+                parts.append(rows[max(y0, top) - top:min(y1, bottom) - top][..., order])
+        strip = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            # Drop the pages just copied from this process's resident set; they
+            # stay in the page cache, so RSS follows the strip size
+            self._map.madvise(mmap.MADV_DONTNEED)
+        return strip
+
+    def write(self, y0, strip):
+        """Write an (rows, W, C) RGB[A] strip back over rows ``y0:`` of a writable map."""
+        y1 = y0 + strip.shape[0]
+        for top, bottom, rows, order in self.tiles:
+            if top < y1 and bottom > y0:
+                rows[max(y0, top) - top:min(y1, bottom) - top][..., order] = strip[max(y0, top) - y0:min(y1, bottom) - y0]
+        self._map.flush()
+
+    def close(self):
+        # The map is unmapped once the last view of it is gone
+        self.tiles = []
+        self._map = None
+
+
+class PngWriter:
+    """Writes a PNG scanline strip by scanline strip."""
+
+    def __init__(self, path, width, height, mode, chunks=(), compress_level=6):
+        self.file = open(path, 'wb')
+        self.file.write(PNG_SIGNATURE)
+        self.file.write(_chunk(b'IHDR', IHDR.pack(width, height, 8, COLOR_TYPES[mode], 0, 0, 0)))
+        for ctype, data in chunks:
+            self.file.write(_chunk(ctype, data))
+        self._deflate = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+
+    def _emit(self, data):
+        self._pending += data
+        while len(self._pending) >= IDAT_SIZE:
+            self.file.write(_chunk(b'IDAT', bytes(self._pending[:IDAT_SIZE])))
+            del self._pending[:IDAT_SIZE]
+
+    def write_filtered(self, scanlines):
+        """Append scanlines that already carry their filter bytes."""
+        self._emit(self._deflate.compress(scanlines))
+
+    def write_rows(self, rows, previous=None):
+        """Append an (rows, W, C) strip with the Up filter; ``previous`` is the row above it."""
+        flat = rows.reshape(rows.shape[0], -1)
+        above = np.empty_like(flat)
+        above[0] = 0 if previous is None else previous.reshape(-1)
+        above[1:] = flat[:-1]
+        scanlines = np.empty((flat.shape[0], flat.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 0] = 2
+        np.subtract(flat, above, out=scanlines[:, 1:])
+        self.write_filtered(scanlines.tobytes())
+
+    def close(self, chunks=()):
+        self._emit(self._deflate.flush())
+        if self._pending:
+            self.file.write(_chunk(b'IDAT', bytes(self._pending)))
+        for ctype, data in chunks:
+            self.file.write(_chunk(ctype, data))
+        self.file.write(_chunk(b'IEND', b''))
+        self.file.close()
+
+
+def open_reader(path):
+    with open(path, 'rb') as f:
+        is_png = f.read(8) == PNG_SIGNATURE
+    return PngReader(path) if is_png else RawReader(path)
+
+
+def hide_bytes(input_path, output_path, data, strip_rows=STRIP_ROWS, header_size=0, depth=1,
+               mask=lsb_engine.ALL_CHANNELS, compress_level=6, stats=NULL_STATS, start_pixel=0):
+    """Streaming counterpart of ``lsb_engine.hide_bytes`` that writes a PNG to ``output_path``.
+
+    Produces the same pixels as the in-memory version. With ``start_pixel``
+    the payload is written from that pixel on and the pixels before it are
+    left as they are (see image_records).
+    """
+    with stats.span('open'):
+        reader = open_reader(input_path)
+    try:
+        width, height = reader.width, reader.height
+        if len(data) - header_size > lsb_engine.body_capacity(width * height - start_pixel, header_size, depth, mask):
+            raise Exception(f"The message you want to hide is too long: {len(data)} bytes")
+        body_bits = len(lsb_engine.mask_channels(mask)) * depth
+        last_pixel = start_pixel + max(lsb_engine.body_start(header_size),
+                                       lsb_engine.body_start(header_size) + -(-(len(data) - header_size) * 8 // body_bits))
+        # Rows holding payload bits, plus one more for a PNG: its filter refers
+        # to the changed row above it, so it cannot be passed through as is.
+        # PNG rows above the payload are passed through too, but still
+        # unfiltered to know the row above the first changed one
+        first_row = start_pixel // width
+        modified = -(-last_pixel // width)
+        is_png = isinstance(reader, PngReader)
+        if is_png:
+            modified = min(height, modified + 1)
+
+        writer = PngWriter(output_path, width, height, reader.mode,
+                           reader.chunks_before if is_png else (), compress_level)
+        previous = None
+        original = None
+        touched = 0
+        y0 = 0
+        while y0 < height:
+            y1 = min(height, y0 + strip_rows, first_row if y0 < first_row else modified if y0 < modified else height)
+            if is_png and y0 < first_row:
+                filtered = reader.read_rows(y1 - y0)
+                with stats.span('decode'):
+                    original = reader.unfilter(filtered, original)[-1].copy()
+                with stats.span('passthrough'):
+                    writer.write_filtered(filtered)
+                previous = original
+            elif is_png and y0 >= modified:
+                with stats.span('passthrough'):
+                    writer.write_filtered(reader.read_rows(y1 - y0))
+            else:
+                with stats.span('decode'):
+                    if is_png:
+                        strip = reader.unfilter(reader.read_rows(y1 - y0), original)
+                        original = strip[-1].copy()
+                    else:
+                        strip = reader.read(y0, y1)
+                with stats.span('embed'):
+                    touched += lsb_engine.embed_payload(strip, data, header_size, depth, mask,
+                                                        first_pixel=y0 * width - start_pixel)
+                with stats.span('encode'):
+                    writer.write_rows(strip, previous)
+                previous = strip[-1]
+            stats.count('strips')
+            y0 = y1
+        writer.close(reader.finish() if is_png else ())
+    finally:
+        reader.close()
+    stats.count('bytes_embedded', len(data))
+    stats.count('pixels_touched', touched)
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+THUMBNAIL_SIZE = (100, 80)
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    """Return a loaded RGB/RGBA thumbnail that fits in ``size``, decoding as little as possible.
+
+    ``thumbnail()`` is called on the unloaded image: JPEGs are then decoded
+    at 1/2 to 1/8 scale in the DCT domain via ``draft()``, and other formats
+    are shrunk by an integer factor with ``reduce()`` (``reducing_gap``)
+    before the LANCZOS pass, which only ever sees a small image.
+    """
+    with Image.open(path) as image:
+        image.thumbnail(size, Image.LANCZOS, reducing_gap=2.0)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+class ThumbnailCache:
+    """Bounded LRU cache of thumbnails keyed on (path, mtime, file size).
+
+    A file that changes on disk gets a new key, so stale thumbnails are never
+    returned; they simply age out.
+    """
+
+    def __init__(self, maxsize=64, size=THUMBNAIL_SIZE):
+        self.maxsize = maxsize
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def _lookup(self, key):
+        with self._lock:
+            thumbnail = self._entries.get(key)
+            if thumbnail is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return thumbnail
+
+    def cached(self, path):
+        """Return the thumbnail for ``path`` if it is cached, without making it."""
+        return self._lookup(self.make_key(path))
+
+    def get(self, path):
+        """Return the thumbnail for ``path``, making it on a miss. Safe to call from any thread."""
+        key = self.make_key(path)
+        thumbnail = self._lookup(key)
+        if thumbnail is not None:
+            return thumbnail
+        with self._lock:
+            self.misses += 1
+        thumbnail = make_thumbnail(path, self.size)
+        with self._lock:
+            self._entries[key] = thumbnail
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return thumbnail
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,187 @@
+import base64
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+from cryptography.fernet import Fernet, InvalidToken
+import container
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from kdf import derive_key
+
+class TestContainer(unittest.TestCase):
+
+    def setUp(self):
+        self.password = "testpassword"
+        self.message = "This is a test message " * 20
+
+    def test_pack_unpack_text(self):
+        packed = container.pack(self.message, self.password)
+        self.assertTrue(packed.startswith(container.MAGIC))
+        self.assertEqual(container.unpack(packed, self.password), self.message)
+
+    def test_pack_unpack_binary(self):
+        payload = bytes(range(256))
+        self.assertEqual(container.unpack(container.pack(payload, self.password), self.password), payload)
+
+    def test_compresses_before_encrypting(self):
+        packed = container.pack(self.message, self.password)
+        self.assertEqual(container.parse_header(packed).codec, container.CODEC_ZLIB)
+        self.assertLess(len(packed), len(self.message))
+
+    def test_codecs_round_trip(self):
+        for codec in container.CODEC_NAMES:
+            packed = container.pack(self.message, self.password, codec=codec)
+            self.assertEqual(container.unpack(packed, self.password), self.message)
+        packed = container.pack(self.message, self.password, codec='bz2', level=1)
+        self.assertEqual(container.parse_header(packed).codec, container.CODEC_BZ2)
+        with self.assertRaises(ValueError):
+            container.pack(self.message, self.password, codec='bz2', level=0)
+        with self.assertRaises(ValueError):
+            container.pack(self.message, self.password, codec='brotli')
+
+    def test_auto_picks_smallest(self):
+        sizes = {name: container.compress(self.message.encode(), name)[1] for name in container.CODECS}
+        codec, data = container.compress(self.message.encode())
+        self.assertEqual(len(data), min(len(value) for value in sizes.values()))
+        self.assertEqual(container.decompress(codec, data), self.message.encode())
+
+    def test_auto_skips_incompressible_payloads(self):
+        payload = os.urandom(container.AUTO_SAMPLE * 4)
+        codec, data = container.compress(payload)
+        self.assertEqual(codec, container.CODEC_NONE)
+        self.assertIs(data, payload)
+
+    def test_auto_compresses_a_large_payload_once(self):
+        payload = b''.join(b'{"id": %d, "name": "item %d", "tags": ["a", "b"]}\n' % (i, i * 7) for i in range(20000))
+        calls = []
+        def counting(entry):
+            def compress(data, level):
+                calls.append((entry.name, len(data)))
+                return entry.compress(data, level)
+            return entry._replace(compress=compress)
+        codecs = {name: counting(entry) for name, entry in container.CODECS.items()}
+        with patch.dict(container.CODECS, codecs):
+            codec, data = container.compress(payload)
+        full = [name for name, size in calls if size == len(payload)]
+        self.assertEqual(len(full), 1)
+        self.assertEqual(container.CODECS[full[0]].id, codec)
+        self.assertEqual(container.decompress(codec, data), payload)
+
+    def test_wrong_password(self):
+        packed = container.pack(self.message, self.password)
+        with self.assertRaises(InvalidToken):
+            container.unpack(packed, "wrong_password")
+
+    def test_rejects_non_container(self):
+        self.assertFalse(container.is_container(b"12:not a container at all......"))
+        with self.assertRaises(ValueError):
+            container.unpack(b"short", self.password)
+
+    body_start = container.HEADER.size + container.SUBKEY_SALT
+
+    def sealed(self, size=container.STREAM_CHUNK * 2 + 1000):
+        payload = os.urandom(size)
+        sealer = container.Sealer(payload, self.password, codec='none')
+        return payload, sealer, sealer.read(0, sealer.total_length)
+
+    def test_body_is_sealed_in_chunks(self):
+        payload, sealer, packed = self.sealed()
+        self.assertEqual(sealer.chunk_count, 3)
+        self.assertEqual(len(packed), container.HEADER.size + container.SUBKEY_SALT + len(payload) + 3 * container.TAG_SIZE)
+        # Any byte range can be sealed on its own
+        pieces = [sealer.read(offset, 5000) for offset in range(0, sealer.total_length, 5000)]
+        self.assertEqual(b''.join(pieces), packed)
+        self.assertEqual(container.unpack(packed, self.password), payload)
+
+    def test_frame_sized_reads_seal_each_chunk_once(self):
+        aeads = []
+        def counting_aead(*args):
+            aeads.append(MagicMock(wraps=real_aead(*args)))
+            return aeads[-1]
+        real_aead = container._subkey_aead
+        with patch('container._subkey_aead', side_effect=counting_aead):
+            payload, sealer, packed = self.sealed()
+            aeads[0].encrypt.reset_mock()
+            # Like a video embedding one frame's capacity at a time
+            pieces = [sealer.read(offset, 3000) for offset in range(0, sealer.total_length, 3000)]
+        self.assertEqual(b''.join(pieces), packed)
+        self.assertEqual(aeads[0].encrypt.call_count, sealer.chunk_count)
+
+    def test_opener_takes_ranges_out_of_order(self):
+        payload, sealer, packed = self.sealed()
+        opener = container.Opener(self.password)
+        ranges = [(offset, packed[offset:offset + 40000]) for offset in range(0, len(packed), 40000)]
+        for offset, data in reversed(ranges):
+            opener.write(offset, data)
+        opener.write(*ranges[1])
+        self.assertEqual(opener.finish(), payload)
+
+    def test_opener_decrypts_chunks_as_they_arrive(self):
+        _, _, packed = self.sealed()
+        opener = container.Opener(self.password)
+        opener.write(0, packed[:self.body_start + container.STREAM_CHUNK + container.TAG_SIZE])
+        self.assertEqual(opener._chunk, 1)
+        with self.assertRaises(ValueError):
+            opener.finish()
+
+        wrong = container.Opener("wrong_password")
+        with self.assertRaises(InvalidToken):
+            wrong.write(0, packed[:self.body_start + container.STREAM_CHUNK + container.TAG_SIZE])
+
+    def test_tampered_chunks_are_rejected(self):
+        _, _, packed = self.sealed()
+        sealed = container.STREAM_CHUNK + container.TAG_SIZE
+        first = slice(self.body_start, self.body_start + sealed)
+        second = slice(first.stop, first.stop + sealed)
+        flipped = bytearray(packed)
+        flipped[second.start + 10] ^= 1
+        swapped = packed[:first.start] + packed[second] + packed[first] + packed[second.stop:]
+        # A header change is caught too: it is the associated data of every chunk
+        relabelled = bytearray(packed)
+        relabelled[5] ^= container.FLAG_BINARY
+        for tampered in (flipped, swapped, relabelled):
+            with self.assertRaises(InvalidToken):
+                container.unpack(bytes(tampered), self.password)
+
+    def test_pack_many_derives_one_master_key(self):
+        payloads = [f"message {i}" for i in range(5)] + [b"\x00binary"]
+        with patch('kdf.PBKDF2HMAC', wraps=PBKDF2HMAC) as pbkdf2:
+            packed = container.pack_many(payloads, self.password)
+            self.assertEqual(container.unpack_many(packed + [b"junk"], self.password), payloads + [None])
+        # unpack_many found the master key in kdf's cache, keyed on the shared salt
+        self.assertEqual(pbkdf2.call_count, 1)
+        headers = [container.parse_header(data) for data in packed]
+        self.assertEqual(len({header.salt for header in headers}), 1)
+        # ...but every container has its own subkey salt, so no two share a GCM key and nonce
+        start = self.body_start
+        self.assertEqual(len({data[start - container.SUBKEY_SALT:start] for data in packed}), len(packed))
+        self.assertEqual(container.unpack_many(packed[:1], "wrong_password"), [None])
+
+    def test_pack_with_a_master_key(self):
+        key = container.master_key(self.password, iterations=1000)
+        packed = container.pack(self.message, None, key=key)
+        self.assertEqual(container.parse_header(packed).iterations, 1000)
+        with patch('kdf.PBKDF2HMAC') as pbkdf2:
+            self.assertEqual(container.unpack(packed, None, key=key), self.message)
+        pbkdf2.assert_not_called()
+        self.assertEqual(container.unpack(packed, self.password), self.message)
+        with self.assertRaises(InvalidToken):
+            container.unpack(packed, None, key=container.master_key(self.password, iterations=1000))
+
+    def test_unpacks_version_2_containers(self):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        data = self.message.encode()
+        head = container.HEADER.pack(container.MAGIC, container.STREAM_VERSION, container.CODEC_NONE, 0, 1000,
+                                     os.urandom(16), len(data) + container.TAG_SIZE)
+        key = base64.urlsafe_b64decode(derive_key(self.password, container.parse_header(head).salt, 1000))
+        packed = head + AESGCM(key).encrypt(container.NONCE.pack(0, True), data, head)
+        self.assertEqual(container.unpack(packed, self.password), self.message)
+
+    def test_unpacks_fernet_containers(self):
+        salt = os.urandom(16)
+        body = base64.urlsafe_b64decode(Fernet(derive_key(self.password, salt, 1000)).encrypt(self.message.encode()))
+        packed = container.HEADER.pack(container.MAGIC, container.FERNET_VERSION, container.CODEC_NONE, 0, 1000,
+                                       salt, len(body)) + body
+        self.assertEqual(container.unpack(packed, self.password), self.message)
+
+if __name__ == "__main__":
+    unittest.main()
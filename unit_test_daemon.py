@@ -0,0 +1,111 @@
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import numpy as np
+from PIL import Image
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import kdf
+import stego_daemon
+from stego_client import Client, DaemonError
+
+class TestDaemon(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.address = os.path.join(cls.tmpdir, 'daemon.sock')
+        cls.server = stego_daemon.make_server(cls.address, workers=2)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self.image = os.path.join(self.tmpdir, 'carrier.png')
+        Image.fromarray(np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(self.image)
+
+    def test_requests_share_a_connection(self):
+        with Client(self.address) as client:
+            self.assertEqual(client.request('ping')['pid'], os.getpid())
+            output = client.request('encode', input=self.image, message="daemon secret", password="pw")['output']
+            self.assertEqual(client.request('decode', input=output, password="pw"), {'message': "daemon secret"})
+            report = client.request('capacity', input=self.image, payload_size=100)
+            self.assertTrue(report['depths']['1']['fits'])
+
+    def test_binary_payload_round_trip(self):
+        with Client(self.address) as client:
+            output = client.request('encode', input=self.image, payload_b64='AAEC/w==', password="pw")['output']
+            self.assertEqual(client.request('decode', input=output, password="pw"), {'payload_b64': 'AAEC/w=='})
+
+    def test_encodes_share_one_key_derivation(self):
+        kdf.key_cache.clear()
+        with patch('kdf.PBKDF2HMAC', wraps=PBKDF2HMAC) as pbkdf2, Client(self.address) as client:
+            outputs = [client.request('encode', input=self.image, message=f"message {i}", password="pw",
+                                      output=os.path.join(self.tmpdir, f'shared{i}.png'))['output'] for i in range(3)]
+            for i, output in enumerate(outputs):
+                self.assertEqual(client.request('decode', input=output, password="pw"), {'message': f"message {i}"})
+        self.assertEqual(pbkdf2.call_count, 1)
+
+    def test_only_ipv4_loopback_is_accepted(self):
+        for address in ('0.0.0.0:8765', '::1:8765', 'example.com:8765'):
+            with self.assertRaises(ValueError):
+                stego_daemon.make_server(address)
+
+    def test_tcp_requests_need_the_token(self):
+        token_file = os.path.join(self.tmpdir, 'token')
+        server = stego_daemon.make_server('127.0.0.1:0', workers=1, token_file=token_file)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(token_file).st_mode), 0o600)
+            address = '127.0.0.1:%d' % server.server_address[1]
+            with Client(address, token_file=token_file) as client:
+                self.assertEqual(client.request('ping')['pid'], os.getpid())
+            with Client(address, token_file=os.path.join(self.tmpdir, 'missing')) as client:
+                with self.assertRaisesRegex(DaemonError, "token"):
+                    client.request('ping')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_unix_socket_is_not_taken_over(self):
+        # A live daemon is left alone
+        with self.assertRaisesRegex(OSError, "already listening"):
+            stego_daemon.make_server(self.address)
+        with Client(self.address) as client:
+            self.assertIn('pid', client.request('ping'))
+
+        # A socket left behind by a daemon that died is replaced
+        stale = os.path.join(self.tmpdir, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stale)
+        sock.close()
+        server = stego_daemon.make_server(stale)
+        server.server_close()
+        self.assertFalse(os.path.exists(stale))
+
+        # Neither is a file that is not a socket
+        other = os.path.join(self.tmpdir, 'not-a-socket')
+        open(other, 'w').close()
+        with self.assertRaises(OSError):
+            stego_daemon.make_server(other)
+        self.assertTrue(os.path.exists(other))
+
+    def test_errors_are_reported(self):
+        with Client(self.address) as client:
+            with self.assertRaises(DaemonError):
+                client.request('decode', input=os.path.join(self.tmpdir, 'missing.png'), password="pw")
+            with self.assertRaises(DaemonError):
+                client.request('unknown')
+            # The connection is still usable after a failed request
+            self.assertIn('pid', client.request('ping'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from cryptography.fernet import InvalidToken
+from PIL import Image
+import extract_cache
+from extract_cache import ExtractionCache, fingerprint
+from image_core import encode_image, decode_image
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name, data=None):
+        path = os.path.join(self.tmpdir.name, name)
+        if data is not None:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def test_fingerprint_sees_content_changes(self):
+        path = self.path('carrier.bin', os.urandom(300000))
+        before = fingerprint(path)
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'r+b') as f:
+            f.seek(150000 - extract_cache.SAMPLE_SIZE // 2 + 10)
+            f.write(b'x')
+        os.utime(path, ns=(mtime, mtime))
+        after = fingerprint(path)
+        # Same path, size and mtime; only the sampled hash tells them apart
+        self.assertEqual(before[:3], after[:3])
+        self.assertNotEqual(before, after)
+
+    def test_lru_bounds(self):
+        cache = ExtractionCache(maxsize=2, max_bytes=10)
+        cache.put('a', b'1234')
+        cache.put('b', b'1234')
+        cache.get('a')
+        cache.put('c', b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+        # Over max_bytes: the least recently used entry goes
+        cache.put('d', b'123456')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('c'))
+        cache.put('e', b'12345678901')
+        self.assertIsNone(cache.get('e'))
+
+    def test_disk_cache_is_shared_and_private(self):
+        directory = self.path('cache')
+        ExtractionCache(directory=directory).put(('key', 1), b'container')
+        cache = ExtractionCache(directory=directory)
+        self.assertEqual(cache.get(('key', 1)), b'container')
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        for name in os.listdir(directory):
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.join(directory, name)).st_mode), 0o600)
+
+        small = ExtractionCache(directory=directory, max_disk_bytes=15)
+        small.put(('key', 2), b'container')
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertIsNone(ExtractionCache(directory=directory).get(('key', 1)))
+
+    def test_decode_retry_only_decrypts(self):
+        carrier = self.path('carrier.png')
+        Image.new('RGB', (80, 60), (10, 20, 30)).save(carrier)
+        encoded = encode_image(carrier, "secret", "password")
+        cache = ExtractionCache()
+        with self.assertRaises(InvalidToken):
+            decode_image(encoded, "wrong", cache=cache)
+        with patch('lsb_engine.open_image') as open_image:
+            self.assertEqual(decode_image(encoded, "password", cache=cache), "secret")
+        open_image.assert_not_called()
+
+        # Rewriting the file invalidates the entry
+        encode_image(carrier, "other", "password", encoded)
+        self.assertEqual(decode_image(encoded, "password", cache=cache), "other")
+
+if __name__ == '__main__':
+    unittest.main()
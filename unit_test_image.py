@@ -1,7 +1,22 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from image_gui_cli import generate_key, encode_image_cli, decode_image_cli
+from image_core import generate_key, encode_image_cli, decode_image_cli, encode_image, decode_image
 from cryptography.fernet import Fernet
+from PIL import Image
+import numpy as np
+import tempfile
+import json
+import base64
+import io
+import os
+import image_batch
+import image_core
+import image_records
+import kdf
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import lsb_engine
+import container
+import capacity
 
 class TestSteganographyCLI(unittest.TestCase):
     
@@ -20,36 +35,154 @@ class TestSteganographyCLI(unittest.TestCase):
         
 
     
-    @patch('stegano.lsb.hide')
+    @patch('lsb_engine.hide_bytes')
     def test_encode_image_cli(self, mock_hide):
-        # Mock the save method of lsb.hide
+        # Mock the save method of lsb_engine.hide_bytes
         mock_hide.return_value.save = MagicMock()
         
         # Run the function to encode the image
         encode_image_cli(self.test_image, self.test_message, self.password)
         
-        # Get the actual call arguments for lsb.hide
+        # Get the actual call arguments for lsb_engine.hide_bytes
         args, kwargs = mock_hide.call_args
         actual_image = args[0]
-        actual_encrypted_message = args[1]
+        actual_payload = args[1]
 
-        print(f"Actual encrypted message: {actual_encrypted_message}")
-
-        # Since we cannot predict the exact encrypted message, check if hide is called with correct arguments
+        # Since we cannot predict the exact encrypted payload, check it is a binary container
         self.assertEqual(actual_image, self.test_image)
-        self.assertIsInstance(actual_encrypted_message, str)
+        self.assertIsInstance(actual_payload, bytes)
+        self.assertTrue(actual_payload.startswith(container.MAGIC))
         # Ensure the save method was called to save the image
         mock_hide.return_value.save.assert_called_once_with(self.test_image.rsplit('.', 1)[0] + '_encoded.png')
 
-    @patch('stegano.lsb.reveal', return_value='gAAAAABmuWBEyO4ZABnvmSgF4ggztsjGbVwbS9afE-KAX7WHvFxGJzguLSkpLlP_uq59oCKVNQApN2gjQdcSkX5PTYQXBsC-SOkJmGfeBX6e3pyZ7hJWUWE=')
+    @patch('lsb_engine.open_image', return_value=Image.new('RGB', (64, 64)))
+    @patch('lsb_engine.reveal', return_value='gAAAAABmuWBEyO4ZABnvmSgF4ggztsjGbVwbS9afE-KAX7WHvFxGJzguLSkpLlP_uq59oCKVNQApN2gjQdcSkX5PTYQXBsC-SOkJmGfeBX6e3pyZ7hJWUWE=')
     @patch('cryptography.fernet.Fernet.decrypt', return_value=b'This is a test message')
-    def test_decode_image_cli(self, mock_decrypt, mock_reveal):
+    def test_decode_image_cli(self, mock_decrypt, mock_reveal, mock_open):
+        # An image without a binary container falls back to the legacy text format
         decode_image_cli(self.encoded_image, self.password)
         
-        # Ensure lsb.reveal was called with the correct parameters
-        mock_reveal.assert_called_once_with(self.encoded_image)
+        # Ensure lsb_engine.reveal was called on the opened image
+        mock_open.assert_called_once_with(self.encoded_image)
+        mock_reveal.assert_called_once_with(mock_open.return_value)
         # Ensure Fernet.decrypt was called with the correct encrypted message
         mock_decrypt.assert_called_once_with('gAAAAABmuWBEyO4ZABnvmSgF4ggztsjGbVwbS9afE-KAX7WHvFxGJzguLSkpLlP_uq59oCKVNQApN2gjQdcSkX5PTYQXBsC-SOkJmGfeBX6e3pyZ7hJWUWE='.encode('utf-8'))
 
+    def test_encode_decode_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "carrier.png")
+            Image.new('RGB', (80, 60), (10, 20, 30)).save(path)
+
+            output = encode_image(path, self.test_message, self.password)
+            self.assertEqual(decode_image(output, self.password), self.test_message)
+
+            payload = bytes(range(256)) * 2
+            output = encode_image(path, payload, self.password)
+            self.assertEqual(decode_image(output, self.password), payload)
+
+    def test_depth_and_channels_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "carrier.png")
+            Image.new('RGB', (40, 30), (10, 20, 30)).save(path)
+            payload = os.urandom(700)
+            # 700 bytes only fit in 1200 pixels at more than 1 bit per channel
+            with self.assertRaises(Exception):
+                encode_image(path, payload, self.password)
+            for depth, channels in ((2, 'rgb'), (4, 'rb'), (3, 'gb')):
+                mask = lsb_engine.parse_channels(channels)
+                output = encode_image(path, payload, self.password, depth=depth, channels=mask)
+                self.assertEqual(decode_image(output, self.password), payload)
+
+    def test_decode_legacy_image(self):
+        token = Fernet(generate_key(self.password)).encrypt(self.test_message.encode('utf-8'))
+        legacy = lsb_engine.hide(Image.new('RGB', (80, 60)), token.decode('utf-8'))
+        self.assertEqual(decode_image(legacy, self.password), self.test_message)
+
+class TestCapacity(unittest.TestCase):
+
+    def test_image_capacity_reads_header_only(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "carrier.png")
+            Image.new('RGB', (100, 50)).save(path)
+            with patch('PIL.ImageFile.ImageFile.load') as mock_load:
+                report = capacity.plan(path, 1000)
+            mock_load.assert_not_called()
+
+        self.assertEqual(report['depths'][1]['container_bytes'], 100 * 50 * 3 // 8)
+        self.assertTrue(report['depths'][1]['fits'])
+        # The header stays at 1 bit per channel; the body starts on the next whole pixel
+        header_pixels = lsb_engine.body_start(container.HEADER.size)
+        self.assertEqual(report['depths'][4]['container_bytes'],
+                         container.HEADER.size + (100 * 50 - header_pixels) * 3 * 4 // 8)
+
+    def test_packed_size_matches_container(self):
+        for size in (0, 15, 16, 1000):
+            packed = container.pack(os.urandom(size), "testpassword")
+            self.assertEqual(len(packed), capacity.packed_size(size))
+            self.assertGreaterEqual(capacity.max_payload(len(packed)), size)
+
+class TestBatchCLI(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.password = "testpassword"
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.tmpdir.name, f"image{i}.png")
+            Image.fromarray(np.full((40, 60, 3), i * 40, dtype=np.uint8)).save(path)
+            self.images.append(path)
+
+    def test_encode_item_reports_failure(self):
+        result = image_batch.encode_item({'input': 'missing.png', 'message': 'hi', 'password': self.password})
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('missing.png', result['error'])
+
+    def test_batch_round_trip_continues_after_failure(self):
+        items = [{'input': path, 'message': f'message {i}'} for i, path in enumerate(self.images)]
+        items.insert(1, {'input': os.path.join(self.tmpdir.name, 'missing.png'), 'message': 'lost'})
+        results = io.StringIO()
+        succeeded, failed = image_batch.run_batch(image_batch.encode_item, items, self.password, results, workers=2, chunksize=2)
+        self.assertEqual((succeeded, failed), (3, 1))
+
+        encoded = image_batch.build_items(os.path.join(self.tmpdir.name, '*_encoded.png'))
+        results = io.StringIO()
+        image_batch.run_batch(image_batch.decode_item, encoded, self.password, results, workers=2)
+        messages = [json.loads(line)['message'] for line in results.getvalue().splitlines()]
+        self.assertEqual(messages, ['message 0', 'message 1', 'message 2'])
+
+    def test_encode_batch_derives_one_key(self):
+        items = [{'input': path, 'message': f'message {i}'} for i, path in enumerate(self.images)]
+        kdf.key_cache.clear()
+        with patch('kdf.PBKDF2HMAC', wraps=PBKDF2HMAC) as pbkdf2:
+            succeeded, failed = image_batch.run_batch(image_batch.encode_item, items, self.password, io.StringIO(),
+                                                      workers=2, chunksize=1)
+        self.assertEqual((succeeded, failed), (3, 0))
+        self.assertEqual(pbkdf2.call_count, 1)
+        # The workers sealed under the parent's master key rather than deriving their own
+        encoded = [image_core.encoded_image_path(path) for path in self.images]
+        salts = {image_records.open_records(path)[0][0].header.salt for path in encoded}
+        self.assertEqual(len(salts), 1)
+        self.assertEqual(decode_image(encoded[2], self.password), 'message 2')
+
+    def test_batch_binary_payload(self):
+        payload = os.path.join(self.tmpdir.name, 'payload.bin')
+        with open(payload, 'wb') as f:
+            f.write(b'\x00\x01binary\xff')
+        results = io.StringIO()
+        items = [{'input': self.images[0], 'payload': payload}]
+        self.assertEqual(image_batch.run_batch(image_batch.encode_item, items, self.password, results, workers=1), (1, 0))
+
+        encoded = json.loads(results.getvalue())['output']
+        output = os.path.join(self.tmpdir.name, 'decoded.bin')
+        items = [{'input': encoded}, {'input': encoded, 'output': output}]
+        results = io.StringIO()
+        self.assertEqual(image_batch.run_batch(image_batch.decode_item, items, self.password, results, workers=1), (2, 0))
+        first, second = [json.loads(line) for line in results.getvalue().splitlines()]
+        self.assertEqual(base64.b64decode(first['payload_b64']), b'\x00\x01binary\xff')
+        self.assertEqual(second['output'], output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), b'\x00\x01binary\xff')
+
 if __name__ == "__main__":
     unittest.main()
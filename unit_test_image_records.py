@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from PIL import Image
+import image_records
+import strip_stream
+from image_core import encode_image, decode_image
+
+class TestImageRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.array = rng.integers(0, 256, (120, 90, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def carrier(self, name):
+        path = os.path.join(self.tmpdir, name)
+        Image.fromarray(self.array).save(path)
+        return path
+
+    def pixels(self, path):
+        with Image.open(path) as image:
+            return np.asarray(image.convert('RGB')).reshape(-1, 3)
+
+    def test_append_after_encode_and_decode_each_record(self):
+        encoded = encode_image(self.carrier('carrier.png'), 'first', 'pw0')
+        self.assertEqual(image_records.append_record(encoded, b'\x00' * 2000, 'pw1', depth=2), (1, encoded))
+        self.assertEqual(image_records.append_record(encoded, 'third', 'pw2', channels=4), (2, encoded))
+
+        records = image_records.list_records(encoded)
+        self.assertEqual([record['index'] for record in records], [0, 1, 2])
+        self.assertEqual(records[1]['start_pixel'], records[0]['end_pixel'])
+        self.assertEqual((records[1]['depth'], records[2]['channels']), (2, 'b'))
+        self.assertEqual(decode_image(encoded, 'pw0'), 'first')
+        self.assertEqual(decode_image(encoded, 'pw1', record=1), b'\x00' * 2000)
+        self.assertEqual(decode_image(encoded, 'pw2', record=2), 'third')
+        with self.assertRaises(Exception):
+            decode_image(encoded, 'pw2', record=3)
+
+    def test_decoding_one_record_decrypts_only_that_record(self):
+        encoded = encode_image(self.carrier('carrier.png'), 'first', 'pw0')
+        image_records.append_record(encoded, 'second', 'pw1')
+        with mock.patch('container.unpack', return_value='second') as unpack:
+            decode_image(encoded, 'pw1', record=1)
+        self.assertEqual(unpack.call_count, 1)
+
+    def test_append_writes_only_the_new_record(self):
+        for name in ('carrier.png', 'carrier.bmp', 'carrier.ppm'):
+            with self.subTest(name=name):
+                path = self.carrier(name)
+                image_records.append_record(path, 'first', 'pw')
+                before = self.pixels(path).copy()
+                index, output = image_records.append_record(path, b'\xff' * 300, 'pw')
+                self.assertEqual((index, output), (1, path))
+                start, end = [(r['start_pixel'], r['end_pixel']) for r in image_records.list_records(path)][1]
+                changed = np.nonzero((self.pixels(path) != before).any(axis=1))[0]
+                self.assertGreaterEqual(changed.min(), start)
+                self.assertLess(changed.max(), end)
+                self.assertEqual(decode_image(path, 'pw', record=1), b'\xff' * 300)
+
+    def test_append_to_other_formats_saves_a_png(self):
+        path = os.path.join(self.tmpdir, 'carrier.gif')
+        Image.fromarray(self.array).convert('P').save(path)
+        index, output = image_records.append_record(path, 'first', 'pw')
+        self.assertEqual((index, output), (0, os.path.join(self.tmpdir, 'carrier_encoded.png')))
+        self.assertEqual(decode_image(output, 'pw'), 'first')
+
+    def test_append_too_long(self):
+        path = self.carrier('carrier.png')
+        image_records.append_record(path, os.urandom(3000), 'pw', compression='none')
+        before = os.path.getmtime(path), os.path.getsize(path)
+        with self.assertRaises(Exception):
+            image_records.append_record(path, os.urandom(3000), 'pw', compression='none')
+        self.assertEqual((os.path.getmtime(path), os.path.getsize(path)), before)
+
+    def test_reader_pixels_match_the_decoded_image(self):
+        path = self.carrier('carrier.png')
+        flat = self.array.reshape(-1, 3)
+        reader = strip_stream.open_reader(path)
+        try:
+            read_pixels = image_records.ReaderPixels(reader, strip_rows=7)
+            for first, count in ((0, 80), (50, 100), (4000, 90), (9000, 1800)):
+                np.testing.assert_array_equal(read_pixels(first, count), flat[first:first + count])
+            with self.assertRaises(ValueError):
+                read_pixels(0, 10)
+        finally:
+            reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from PIL import Image
+from stegano import lsb
+import lsb_engine
+
+class TestLsbEngine(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.array = rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)
+        self.message = "This is a test message"
+
+    def test_hide_reveal_round_trip(self):
+        encoded = lsb_engine.hide(Image.fromarray(self.array), self.message)
+        self.assertEqual(lsb_engine.reveal(encoded), self.message)
+
+    def test_output_matches_stegano(self):
+        ours = lsb_engine.hide(Image.fromarray(self.array), self.message)
+        theirs = lsb.hide(Image.fromarray(self.array), self.message)
+        np.testing.assert_array_equal(np.asarray(ours), np.asarray(theirs))
+        self.assertEqual(lsb_engine.reveal(theirs), self.message)
+
+    def test_reveal_without_message(self):
+        self.array[0, :4] = 0xFF
+        with self.assertRaises(IndexError):
+            lsb_engine.reveal(Image.fromarray(self.array))
+
+    def test_message_too_long(self):
+        with self.assertRaises(Exception):
+            lsb_engine.hide(Image.fromarray(self.array), "x" * 2000)
+
+    def test_bgr_channel_order(self):
+        bgr = np.ascontiguousarray(self.array[..., ::-1])
+        lsb_engine.embed_bytes(lsb_engine.pixel_view(bgr, (2, 1, 0)), b"payload")
+        rgb = np.ascontiguousarray(bgr[..., ::-1])
+        self.assertEqual(lsb_engine.extract_bytes(lsb_engine.pixel_view(rgb), 7), b"payload")
+
+    def test_multi_bit_depths(self):
+        data = bytes(range(200))
+        for depth in range(1, lsb_engine.MAX_DEPTH + 1):
+            for bit_start in (0, 5, 61):
+                array = self.array.copy()
+                pixels = lsb_engine.pixel_view(array)
+                lsb_engine.embed_bytes(pixels, data, bit_start, depth)
+                self.assertEqual(lsb_engine.extract_bytes(pixels, len(data), bit_start, depth), data)
+                # Only the low ``depth`` bits change, and only where the payload went
+                np.testing.assert_array_equal(array >> depth, self.array >> depth)
+                used = -(-(bit_start + len(data) * 8) // (3 * depth))
+                np.testing.assert_array_equal(array.reshape(-1, 3)[used:], self.array.reshape(-1, 3)[used:])
+
+    @patch('lsb_engine.PARALLEL_MIN_BYTES', 64)
+    def test_parallel_extract_matches_serial(self):
+        pixels = lsb_engine.pixel_view(self.array)
+        for depth, bit_start, nbytes in ((1, 0, 1800), (1, 13, 1700), (3, 7, 5000)):
+            expected = lsb_engine.extract_bytes(pixels, nbytes, bit_start, depth)
+            for workers in (2, 3, 8):
+                self.assertEqual(lsb_engine.extract_bytes_parallel(pixels, nbytes, bit_start, depth, workers), expected)
+        with self.assertRaises(ValueError):
+            lsb_engine.extract_bytes_parallel(pixels, 2000, 0, 1, 4)
+
+    def test_payload_layout(self):
+        data = b"H" * 12 + bytes(range(100))
+        for depth, mask in ((1, lsb_engine.ALL_CHANNELS), (3, lsb_engine.parse_channels('b')),
+                            (2, lsb_engine.parse_channels('rb'))):
+            array = self.array.copy()
+            lsb_engine.embed_payload(array, data, 12, depth, mask)
+            body = lsb_engine.extract_body(array, 100, 12, depth, mask)
+            self.assertEqual(body, data[12:])
+            self.assertEqual(lsb_engine.unpack_layout(lsb_engine.pack_layout(depth, mask)), (depth, mask))
+            for channel in set(range(3)) - set(lsb_engine.mask_channels(mask)):
+                np.testing.assert_array_equal(array.reshape(-1, 3)[32:, channel], self.array.reshape(-1, 3)[32:, channel])
+        self.assertEqual(lsb_engine.pack_layout(), 0)
+        with self.assertRaises(ValueError):
+            lsb_engine.parse_channels('rx')
+
+if __name__ == "__main__":
+    unittest.main()
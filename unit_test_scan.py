@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from cryptography.fernet import Fernet
+from PIL import Image
+import lsb_engine
+import scan
+import strip_stream
+from image_core import encode_image, generate_key
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        array = np.random.default_rng(0).integers(0, 256, (120, 90, 3), dtype=np.uint8)
+        self.plain = self.path("plain.png")
+        Image.fromarray(array).save(self.plain)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def test_detects_container(self):
+        encoded = encode_image(self.plain, b"\x00secret", "password", depth=2,
+                               channels=lsb_engine.parse_channels('rb'))
+        result = scan.scan_item(encoded)
+        self.assertEqual(result['status'], 'ok')
+        self.assertTrue(result['payload'])
+        self.assertEqual((result['format'], result['read'], result['depth'], result['channels'], result['binary']),
+                         ('container', 'prefix', 2, 'rb', True))
+        self.assertFalse(scan.scan_item(self.plain)['payload'])
+
+    def test_reads_only_leading_rows(self):
+        encoded = encode_image(self.plain, "secret", "password")
+        with patch.object(strip_stream.PngReader, 'read_rows', autospec=True,
+                          side_effect=strip_stream.PngReader.read_rows) as read_rows:
+            self.assertTrue(scan.scan_item(encoded)['payload'])
+        read_rows.assert_called_once()
+        self.assertEqual(read_rows.call_args.args[1], 1)
+
+    def test_detects_legacy_and_raw_formats(self):
+        token = Fernet(generate_key("password")).encrypt(b"legacy")
+        lsb_engine.hide(self.plain, token.decode('utf-8')).save(self.path("legacy.bmp"))
+        result = scan.scan_item(self.path("legacy.bmp"))
+        self.assertEqual((result['payload'], result['format'], result['read']), (True, 'legacy', 'prefix'))
+
+        # A JPEG cannot be read partially, and a random prefix is not a payload
+        Image.open(self.plain).save(self.path("photo.jpg"))
+        result = scan.scan_item(self.path("photo.jpg"))
+        self.assertEqual((result['payload'], result['read']), (False, 'full'))
+
+    def test_detects_video_layouts(self):
+        import cv2
+        from video import hide_video
+        source = self.path("source.avi")
+        out = cv2.VideoWriter(source, cv2.VideoWriter_fourcc(*'FFV1'), 10, (64, 48))
+        for i in range(12):
+            out.write(np.full((48, 64, 3), i * 20, dtype=np.uint8))
+        out.release()
+
+        self.assertFalse(scan.scan_item(source)['payload'])
+        for keyed, layout in ((False, 'sequential'), (True, 'keyed')):
+            output = self.path(f"{layout}.avi")
+            hide_video(source, output, 10, 64, 48, cv2.VideoWriter_fourcc(*'FFV1'), "x" * 3000, "password", keyed=keyed)
+            result = scan.scan_item(output)
+            self.assertEqual((result['payload'], result['format'], result['frames_read']), (True, layout, 1))
+
+    def test_run_scan_streams_jsonl(self):
+        encoded = encode_image(self.plain, "secret", "password")
+        with open(self.path("broken.png"), 'wb') as f:
+            f.write(b"not an image")
+        paths = scan.expand_paths([self.tmpdir])
+        self.assertEqual(paths, sorted([self.plain, encoded, self.path("broken.png")]))
+
+        results = io.StringIO()
+        self.assertEqual(scan.run_scan(paths, results, workers=2, chunksize=1), (1, 1, 1))
+        lines = [json.loads(line) for line in results.getvalue().splitlines()]
+        # Lines are written in completion order
+        self.assertEqual(sorted(line['path'] for line in lines), paths)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+import lsb_engine
+import strip_stream
+from image_core import encode_image, decode_image
+
+class TestStripStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        yy, xx = np.mgrid[0:90, 0:70]
+        # Smooth rows and noisy rows so the encoder picks a mix of PNG filters
+        self.array = np.stack([(xx + yy) % 256, (xx * 3) % 256, yy % 256], -1).astype(np.uint8)
+        self.array[30:60] = rng.integers(0, 256, (30, 70, 3), dtype=np.uint8)
+        self.data = rng.integers(0, 256, 1500, dtype=np.uint8).tobytes()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir, name)
+
+    def assert_matches_in_memory(self, source, strip_rows, **layout):
+        expected = np.asarray(lsb_engine.hide_bytes(source, self.data, **layout))
+        strip_stream.hide_bytes(source, self.path('out.png'), self.data, strip_rows, **layout)
+        with Image.open(self.path('out.png')) as image:
+            np.testing.assert_array_equal(np.asarray(image), expected)
+
+    def test_png_matches_in_memory_embed(self):
+        for mode in ('RGB', 'RGBA'):
+            Image.fromarray(self.array).convert(mode).save(self.path('in.png'))
+            for strip_rows in (1, 7, 1000):
+                self.assert_matches_in_memory(self.path('in.png'), strip_rows)
+
+    def test_raw_formats_match_in_memory_embed(self):
+        for name in ('in.ppm', 'in.bmp', 'in.tif'):
+            Image.fromarray(self.array).save(self.path(name))
+            self.assert_matches_in_memory(self.path(name), 16)
+
+    def test_layout_matches_in_memory_embed(self):
+        Image.fromarray(self.array).save(self.path('in.png'))
+        for strip_rows in (1, 5):
+            self.assert_matches_in_memory(self.path('in.png'), strip_rows, header_size=30, depth=3,
+                                          mask=lsb_engine.parse_channels('rb'))
+
+    def test_rejects_unstreamable_carriers(self):
+        Image.fromarray(self.array).save(self.path('in.tif'), compression='tiff_lzw')
+        Image.fromarray(self.array).convert('P').save(self.path('palette.png'))
+        for name in ('in.tif', 'palette.png'):
+            with self.assertRaises(ValueError):
+                strip_stream.hide_bytes(self.path(name), self.path('out.png'), self.data)
+
+    def test_payload_too_long(self):
+        Image.fromarray(self.array).save(self.path('in.png'))
+        with self.assertRaises(Exception):
+            strip_stream.hide_bytes(self.path('in.png'), self.path('out.png'), bytes(90 * 70))
+
+    def test_streamed_encode_round_trip(self):
+        Image.fromarray(self.array).save(self.path('in.png'))
+        output = encode_image(self.path('in.png'), "streamed secret", "password", stream=True, strip_rows=4)
+        self.assertEqual(decode_image(output, "password"), "streamed secret")
+
+if __name__ == "__main__":
+    unittest.main()
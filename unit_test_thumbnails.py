@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from PIL import Image, JpegImagePlugin
+import thumbnails
+
+class TestThumbnails(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        array = np.random.default_rng(0).integers(0, 256, (600, 800, 3), dtype=np.uint8)
+        self.jpeg = os.path.join(self.tmpdir, "carrier.jpg")
+        self.png = os.path.join(self.tmpdir, "carrier.png")
+        Image.fromarray(array).save(self.jpeg)
+        Image.fromarray(array).save(self.png)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_thumbnail_fits(self):
+        for path in (self.jpeg, self.png):
+            thumbnail = thumbnails.make_thumbnail(path)
+            self.assertEqual(thumbnail.size, (100, 75))
+            self.assertEqual(thumbnail.mode, 'RGB')
+
+    def test_decodes_downscaled(self):
+        with patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True,
+                          side_effect=JpegImagePlugin.JpegImageFile.draft) as draft:
+            thumbnails.make_thumbnail(self.jpeg)
+        draft.assert_called_once()
+        with patch.object(Image.Image, 'reduce', autospec=True, side_effect=Image.Image.reduce) as reduce:
+            thumbnails.make_thumbnail(self.png)
+        reduce.assert_called_once()
+
+    def test_cache_keys_on_file_state(self):
+        cache = thumbnails.ThumbnailCache(maxsize=1)
+        self.assertIsNone(cache.cached(self.png))
+        first = cache.get(self.png)
+        self.assertIs(cache.get(self.png), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # A rewritten file gets a new entry
+        os.utime(self.png, ns=(0, 0))
+        self.assertIsNot(cache.get(self.png), first)
+        # The bound evicts the least recently used entry
+        cache.get(self.jpeg)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.cached(self.png))
+
+if __name__ == "__main__":
+    unittest.main()
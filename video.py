@@ -1,28 +1,30 @@
 import argparse
 import cv2
 import numpy as np
-from stegano import lsb
+import lsb_engine
+import video_pipeline
+import container
+import capacity
+import scan
+from stats import NULL_STATS, Stats
 from PIL import Image
 import os
+import hashlib
+import hmac
+import multiprocessing
+import queue
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import tracemalloc
 import zlib
 from base64 import b64encode, b64decode
-from cryptography.fernet import Fernet
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-import base64
+from cryptography.fernet import Fernet, InvalidToken
+from kdf import derive_key
 
 def encrypt_message(message, password):
     salt = os.urandom(16)
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
-    )
-    key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-    cipher = Fernet(key)
+    cipher = Fernet(derive_key(password, salt))
     encrypted_data = cipher.encrypt(message.encode())
     return salt + encrypted_data
 
@@ -30,15 +32,7 @@ def decrypt_message(encrypted_data, password):
     try:
         salt = encrypted_data[:16]
         encrypted_data = encrypted_data[16:]
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        cipher = Fernet(key)
+        cipher = Fernet(derive_key(password, salt))
         decrypted_data = cipher.decrypt(encrypted_data)
         return decrypted_data.decode()
     except Exception as e:
@@ -63,8 +57,166 @@ def frame_to_pil_image(frame):
 def pil_image_to_opencv(pil_img):
     return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
 
-def hide_data_in_video(input_video_path, output_video_path, frame_rate, frame_width, frame_height, codec, message, password):
-    try:
+# Every carrier frame starts with this header, embedded at 1 bit per channel
+# in the first few dozen pixels: magic, version, carrier layout (see
+# lsb_engine), chunk index, chunk count, total payload length, and the offset
+# and length of the chunk that follows it in the same frame. The chunk is
+# written with the recorded layout from the next whole pixel on. Version 1
+# frames have no layout byte and the chunk follows the header bit for bit.
+FRAME_MAGIC = b'SGVF'
+FRAME_VERSION = 2
+FRAME_HEADER = struct.Struct('>4sBBIIIII')
+FRAME_HEADER_V1 = struct.Struct('>4sBIIIII')
+
+ChunkHeader = namedtuple('ChunkHeader', 'index count total_length offset length version depth mask')
+
+# In the keyed layout frame 0 carries only this header and the chunks go to
+# frames picked by carrier_positions(); the salt and iterations are those of
+# the payload container, so the key derived here is reused to decrypt it. The
+# header ends with a short key check so a wrong password fails before any
+# frame is searched.
+KEY_MAGIC = b'SGVK'
+KEY_VERSION = 1
+KEY_HEADER = struct.Struct('>4sBIIII16s4s')
+# Gaps shorter than this are skipped with grab() rather than a seek
+SEEK_MIN_GAP = 32
+
+def frame_capacity(frame_width, frame_height, depth=1, mask=lsb_engine.ALL_CHANNELS):
+    """Number of payload bytes one frame can carry after the chunk header."""
+    return lsb_engine.body_capacity(frame_width * frame_height, FRAME_HEADER.size, depth, mask)
+
+def embed_chunk(frame, index, count, total_length, offset, chunk, depth=1, mask=lsb_engine.ALL_CHANNELS):
+    """Embed one chunk and its header. Returns the number of pixels written."""
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, lsb_engine.pack_layout(depth, mask),
+                               index, count, total_length, offset, len(chunk))
+    return lsb_engine.embed_payload(frame, header + chunk, FRAME_HEADER.size, depth, mask, lsb_engine.BGR_CHANNELS)
+
+def read_chunk_header(frame):
+    """Return a ChunkHeader, or None for a non-carrier frame."""
+    pixels = lsb_engine.pixel_view(frame, lsb_engine.BGR_CHANNELS)
+    if lsb_engine.capacity_bits(pixels) < FRAME_HEADER.size * 8:
+        return None
+    head = lsb_engine.extract_bytes(pixels, FRAME_HEADER.size)
+    if head[:4] != FRAME_MAGIC:
+        return None
+    npixels = pixels.shape[0]
+    if head[4] == 1:
+        _, version, index, count, total_length, offset, length = FRAME_HEADER_V1.unpack_from(head)
+        depth, mask = 1, lsb_engine.ALL_CHANNELS
+        capacity = npixels * 3 // 8 - FRAME_HEADER_V1.size
+    elif head[4] == FRAME_VERSION:
+        _, version, layout, index, count, total_length, offset, length = FRAME_HEADER.unpack(head)
+        try:
+            depth, mask = lsb_engine.unpack_layout(layout)
+        except ValueError:
+            return None
+        capacity = lsb_engine.body_capacity(npixels, FRAME_HEADER.size, depth, mask)
+    else:
+        return None
+    if index >= count or offset + length > total_length or length > capacity:
+        return None
+    return ChunkHeader(index, count, total_length, offset, length, version, depth, mask)
+
+def layout_key(password, salt, iterations, master=None):
+    """Key for frame selection, derived from (and not revealing) the payload's master key.
+
+    A container.MasterKey ``master`` for ``salt`` is used instead of deriving it from ``password``.
+    """
+    if master is None or (master.salt, master.iterations) != (salt, iterations):
+        master = container.master_key(password, salt, iterations)
+    return hmac.new(master.key, b'SGVK carrier frames', hashlib.sha256).digest()
+
+def key_check(key):
+    return hmac.new(key, b'SGVK key check', hashlib.sha256).digest()[:4]
+
+def embed_key_header(frame, key, iterations, frame_count, chunk_count, total_length, salt):
+    header = KEY_HEADER.pack(KEY_MAGIC, KEY_VERSION, iterations, frame_count, chunk_count, total_length, salt, key_check(key))
+    lsb_engine.embed_bytes(lsb_engine.pixel_view(frame, lsb_engine.BGR_CHANNELS), header)
+
+def read_key_header(frame):
+    """Return (iterations, frame_count, chunk_count, total_length, salt, check) or None if the layout is not keyed."""
+    pixels = lsb_engine.pixel_view(frame, lsb_engine.BGR_CHANNELS)
+    if lsb_engine.capacity_bits(pixels) < KEY_HEADER.size * 8:
+        return None
+    magic, version, *fields = KEY_HEADER.unpack(lsb_engine.extract_bytes(pixels, KEY_HEADER.size))
+    if magic != KEY_MAGIC or version != KEY_VERSION or not 0 < fields[2] < fields[1]:
+        return None
+    return tuple(fields)
+
+def carrier_positions(key, frame_count, chunk_count):
+    """Frame indices, ascending, that hold chunks 0..chunk_count-1 in the keyed layout.
+
+    Frames are drawn from 1..frame_count-1 with Floyd's sampling, driven by
+    HMAC-SHA256 in counter mode under ``layout_key()``, so the layout does
+    not depend on any library's PRNG.
+    """
+    population = frame_count - 1
+    chosen = set()
+    for counter, j in enumerate(range(population - chunk_count, population)):
+        digest = hmac.new(key, counter.to_bytes(8, 'big'), hashlib.sha256).digest()
+        pick = int.from_bytes(digest, 'big') % (j + 1)
+        chosen.add(j if pick in chosen else pick)
+    return sorted(pick + 1 for pick in chosen)
+
+def extract_chunk(frame, header):
+    if header.version == 1:
+        pixels = lsb_engine.pixel_view(frame, lsb_engine.BGR_CHANNELS)
+        return lsb_engine.extract_bytes(pixels, header.length, FRAME_HEADER_V1.size * 8)
+    return lsb_engine.extract_body(frame, header.length, FRAME_HEADER.size, header.depth, header.mask,
+                                   lsb_engine.BGR_CHANNELS)
+
+class FrameAllocationReport:
+    """Tracks Python/NumPy heap allocations per frame with tracemalloc.
+
+    Allocations made inside OpenCV's C++ code are not visible to tracemalloc,
+    which is why the frame loop reads into a reused buffer.
+    """
+
+    def __init__(self):
+        self.carrier_frames = []
+        self.passthrough_frames = []
+        self.frame_nbytes = 0
+        self._baseline = 0
+        tracemalloc.start()
+
+    def start_frame(self):
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+
+    def end_frame(self, frame, carrier):
+        self.frame_nbytes = frame.nbytes
+        peak = tracemalloc.get_traced_memory()[1] - self._baseline
+        (self.carrier_frames if carrier else self.passthrough_frames).append(peak)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def summary(self):
+        lines = []
+        for label, samples in (("carrier", self.carrier_frames), ("passthrough", self.passthrough_frames)):
+            if not samples:
+                continue
+            peak = max(samples)
+            mean = sum(samples) / len(samples)
+            copies = peak / self.frame_nbytes if self.frame_nbytes else 0
+            lines.append(f"{label} frames: {len(samples)}, mean {mean / 1024:.1f} KiB, "
+                         f"peak {peak / 1024:.1f} KiB allocated per frame (~{copies:.2f} frame copies)")
+        return "\n".join(lines)
+
+def hide_video(input_video_path, output_video_path, frame_rate, frame_width, frame_height, codec, message, password, alloc_report=False, workers=1, queue_depth=16, stats=NULL_STATS, progress=None, keyed=False, depth=1, channels=lsb_engine.ALL_CHANNELS, compression='auto', compression_level=None, key=None):
+    """Hide ``message`` in a copy of the video. Returns the number of carrier frames.
+
+    ``progress(frames_done, total_frames)`` is called after every frame and may
+    raise to abort the job; ``total_frames`` is the container's frame count.
+    With ``keyed`` the chunks go to password-selected frames instead of the
+    leading ones (see carrier_positions). Chunks are written ``depth`` bits
+    per channel into the channels of the ``channels`` mask. The plaintext is
+    compressed with ``compression`` before encryption (see container.compress).
+    A container.MasterKey ``key`` saves deriving one from ``password``.
+    """
+    if alloc_report and workers > 1:
+        raise ValueError("The allocation report needs the single-threaded encoder (workers=1)")
+    with stats.span('open'):
         cap = cv2.VideoCapture(input_video_path)
         if not cap.isOpened():
             raise Exception(f"Error opening input video file {input_video_path}.")
@@ -74,24 +226,111 @@ def hide_data_in_video(input_video_path, output_video_path, frame_rate, frame_wi
             cap.release()
             raise Exception(f"Could not open VideoWriter with the specified codec or output file path: {output_video_path}")
 
-        encrypted_message = encrypt_message(message, password)
-        compressed_message = compress_message(encrypted_message.decode('latin1'))
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # The container is encrypted a frame's worth at a time as the frames
+        # are embedded, so its ciphertext is never held whole
+        sealer = container.Sealer(message, password, stats=stats, codec=compression, level=compression_level, key=key)
+        total_length = sealer.total_length
+
+        # Only the frames needed to hold the payload are carriers; every other
+        # frame goes straight from the decoder to the writer.
+        chunk_size = frame_capacity(frame_width, frame_height, depth, channels)
+        chunk_count = -(-total_length // chunk_size)
+        key_header = None
+        if keyed:
+            if total_frames <= chunk_count:
+                raise Exception(f"Keyed layout needs {chunk_count + 1} frames but the video reports {total_frames}.")
+            header = sealer.header
+            with stats.span('kdf'):
+                frames_key = layout_key(password, header.salt, header.iterations, key)
+            key_header = (frames_key, header.iterations, total_frames, chunk_count, total_length, header.salt)
+            positions = carrier_positions(frames_key, total_frames, chunk_count)
+        else:
+            positions = range(chunk_count)
+        chunk_at = {position: index for index, position in enumerate(positions)}
+        last_carrier = max(chunk_at, default=-1)
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        def embed_frame(index, frame):
+            stats.count('frames')
+            if index == 0 and key_header:
+                embed_key_header(frame, *key_header)
+            chunk = chunk_at.get(index)
+            if chunk is not None:
+                data = sealer.read(chunk * chunk_size, chunk_size)
+                with stats.span('embed'):
+                    touched = embed_chunk(frame, chunk, chunk_count, total_length, chunk * chunk_size, data,
+                                          depth, channels)
+                stats.count('carrier_frames')
+                stats.count('bytes_embedded', FRAME_HEADER.size + len(data))
+                stats.count('pixels_touched', touched)
+
+        def frame_written(frames_done):
+            if progress:
+                progress(frames_done, total_frames)
 
-            pil_img = frame_to_pil_image(frame)
-            secret_pil_img = lsb.hide(pil_img, compressed_message)
-            frame = pil_image_to_opencv(secret_pil_img)
-            out.write(frame)
+        if workers > 1:
+            with stats.span(video_pipeline.PIPELINE_SPAN):
+                frame_index, timers = video_pipeline.run_pipeline(cap, out, embed_frame, workers, queue_depth,
+                                                                  frame_written)
+            for timer, name in zip(timers, video_pipeline.STAGE_SPANS):
+                stats.add_span(name, int(timer.busy * 1e9), timer.frames)
+        else:
+            frame_index = 0
+            report = FrameAllocationReport() if alloc_report else None
+
+            # cap.read() decodes into the same buffer every iteration and the chunk
+            # is embedded into it in place, with R, G, B mapped onto the BGR layout.
+            # The buffer is allocated here so no frame's sample pays for it.
+            frame = np.empty((frame_height, frame_width, 3), np.uint8)
+            try:
+                while True:
+                    if report:
+                        report.start_frame()
+                    with stats.span('decode'):
+                        ret, frame = cap.read(frame)
+                    if not ret:
+                        break
+
+                    embed_frame(frame_index, frame)
+                    with stats.span('write'):
+                        out.write(frame)
+                    if report:
+                        report.end_frame(frame, frame_index in chunk_at)
+                    frame_index += 1
+                    frame_written(frame_index)
+            finally:
+                if report:
+                    report.stop()
+            if report:
+                print(report.summary())
 
+        if frame_index <= last_carrier:
+            raise Exception(f"Message needs frames up to {last_carrier} but the video only has {frame_index}.")
+    except BaseException:
         cap.release()
         out.release()
+        # The output was created by this call, so a failed or cancelled run removes what it wrote
+        if os.path.exists(output_video_path):
+            os.remove(output_video_path)
+        raise
+    cap.release()
+    out.release()
+    return chunk_count
+
+def hide_data_in_video(input_video_path, output_video_path, frame_rate, frame_width, frame_height, codec, message, password, alloc_report=False, workers=1, queue_depth=16, stats=NULL_STATS, keyed=False, depth=1, channels=lsb_engine.ALL_CHANNELS, compression='auto', compression_level=None):
+    if workers > 1 and not stats.enabled:
+        # The stage report is read back from the pipeline's spans
+        stats = Stats()
+    try:
+        carriers = hide_video(input_video_path, output_video_path, frame_rate, frame_width, frame_height, codec, message, password,
+                              alloc_report, workers, queue_depth, stats, keyed=keyed, depth=depth, channels=channels,
+                              compression=compression, compression_level=compression_level)
+        if workers > 1:
+            print(video_pipeline.format_stage_report(stats))
 
           # Confirmation message
-        print(f"Message successfully hidden in {output_video_path}.")
+        print(f"Message successfully hidden in {output_video_path} using {carriers} carrier frame(s).")
     except Exception as e:
         print(f"Error hiding data in video: {e}")
         
@@ -99,29 +338,288 @@ def hide_data_in_video(input_video_path, output_video_path, frame_rate, frame_wi
         #print(f"Error hiding data in video: {e}")
 
 
-def unhide_data_from_video(video_path, password):
-    try:
-        cap = cv2.VideoCapture(video_path)
-        decoded_messages = []
+def _frames(cap, frame, stats):
+    """Yield ``frame`` and then every following frame, decoded into one reused buffer."""
+    while True:
+        yield frame
+        with stats.span('decode'):
+            ret, frame = cap.read(frame)
+        if not ret:
+            return
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+def _read_sequential(cap, first_frame, opener, stats, progress):
+    """Feed the chunks of the leading carrier frames to ``opener``. Returns True once all have been read."""
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    received = set()
+    chunk_count = None
+    total_length = None
+    frames_done = 0
+
+    for frame in _frames(cap, first_frame, stats):
+        stats.count('frames')
+        frames_done += 1
+        if progress:
+            progress(frames_done, total_frames)
+
+        # Only the header pixels are read from frames that carry no chunk
+        with stats.span('header'):
+            header = read_chunk_header(frame)
+        if header is None:
+            continue
+        if chunk_count is None:
+            chunk_count, total_length = header.count, header.total_length
+        elif header.count != chunk_count or header.total_length != total_length or header.index in received:
+            continue
+
+        with stats.span('extract'):
+            chunk = extract_chunk(frame, header)
+        # Decrypts every sealed chunk this completes, while later frames are still to be decoded
+        opener.write(header.offset, chunk)
+        received.add(header.index)
+        stats.count('carrier_frames')
+        stats.count('bytes_extracted', FRAME_HEADER.size + header.length)
+        if len(received) == chunk_count:
+            return True
+    return False
+
+def _read_keyed(video_path, cap, key_header, password, opener, stats, progress, seek):
+    """Feed the chunks of a keyed layout to ``opener``, visiting only their frames. Returns True once all have been read.
+
+    ``cap`` is positioned after frame 0.
+    """
+    iterations, frame_count, chunk_count, total_length, salt, check = key_header
+    with stats.span('kdf'):
+        key = layout_key(password, salt, iterations)
+    if key_check(key) != check:
+        raise InvalidToken
+    positions = carrier_positions(key, frame_count, chunk_count)
+    position = 1
+    frame = None
+    for index, target in enumerate(positions):
+        seeked = False
+        if seek == 'auto' and target - position >= SEEK_MIN_GAP:
+            with stats.span('seek'):
+                seeked = cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            stats.count('seeks')
+        if not seeked:
+            # grab() demuxes and decodes but skips the conversion and copy of retrieve()
+            with stats.span('grab'):
+                while position < target:
+                    if not cap.grab():
+                        return False
+                    position += 1
+                    stats.count('frames_grabbed')
+        with stats.span('decode'):
+            ret, frame = cap.read(frame)
+        position = target + 1
+        stats.count('frames')
+
+        header = read_chunk_header(frame) if ret else None
+        if header is None or header[:3] != (index, chunk_count, total_length):
+            if not seeked:
+                # Damaged, or the frames were re-encoded or cut after hiding
+                return False
+            # Seeking is not frame-accurate for this file; start over with grab().
+            # The opener skips the chunks it already has.
+            stats.count('seek_fallbacks')
+            fresh = cv2.VideoCapture(video_path)
+            try:
+                fresh.grab()
+                return _read_keyed(video_path, fresh, key_header, password, opener, stats, progress, 'grab')
+            finally:
+                fresh.release()
+
+        with stats.span('extract'):
+            chunk = extract_chunk(frame, header)
+        opener.write(header.offset, chunk)
+        stats.count('carrier_frames')
+        stats.count('bytes_extracted', FRAME_HEADER.size + header.length)
+        if progress:
+            progress(index + 1, chunk_count)
+    return True
+
+# Parallel extraction: frame 0 is read first to learn which frames carry the
+# chunks, and those frames are split into one contiguous range per worker
+# process. Each worker opens its own capture, seeks to the start of its range
+# and sends every chunk back as it is extracted; the chunks go to the opener
+# by offset, so decryption overlaps decoding. The workers are told to stop
+# once every chunk has arrived or the job is cancelled.
+PARALLEL_MIN_CARRIERS = 8
+_range_stop = None
+_range_results = None
+
+def _init_range_worker(stop, results):
+    global _range_stop, _range_results
+    _range_stop, _range_results = stop, results
+    # Unsent chunks are only left over when the job was stopped early
+    results.cancel_join_thread()
+
+def _extract_range(video_path, carriers, chunk_count, total_length, seek=True):
+    """Process pool worker: extract the chunks at ``carriers``, ascending (chunk index, frame) pairs.
+
+    Sends (offset, data) for each to the results queue and returns how many it sent.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        position = 0
+        first = carriers[0][1]
+        seeked = seek and first > 0 and cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        if seeked:
+            position = first
+        frame = None
+        sent = 0
+        for index, target in carriers:
+            if _range_stop.is_set():
                 break
+            while position < target:
+                if not cap.grab():
+                    return sent
+                position += 1
+            ret, frame = cap.read(frame)
+            position += 1
+            header = read_chunk_header(frame) if ret else None
+            if header is None or header[:3] != (index, chunk_count, total_length):
+                if seeked and not sent:
+                    # Seeking is not frame-accurate for this file; reach the range with grab() instead
+                    cap.release()
+                    return _extract_range(video_path, carriers, chunk_count, total_length, seek=False)
+                return sent
+            _range_results.put((header.offset, extract_chunk(frame, header)))
+            sent += 1
+        return sent
+    finally:
+        cap.release()
+
+def _read_parallel(video_path, first_frame, key_header, password, opener, stats, progress, workers):
+    """Feed the chunks to ``opener`` from ``workers`` processes. Returns True once all have been read.
+
+    Returns None, having read nothing, when there are too few carrier frames
+    to be worth it or frame 0 does not start a sequential layout.
+    """
+    if key_header:
+        iterations, frame_count, chunk_count, total_length, salt, check = key_header
+        with stats.span('kdf'):
+            key = layout_key(password, salt, iterations)
+        if key_check(key) != check:
+            raise InvalidToken
+        carriers = list(enumerate(carrier_positions(key, frame_count, chunk_count)))
+    else:
+        header = read_chunk_header(first_frame)
+        if header is None or header.index != 0:
+            return None
+        chunk_count, total_length = header.count, header.total_length
+        carriers = [(index, index) for index in range(1, chunk_count)]
+    if len(carriers) < PARALLEL_MIN_CARRIERS:
+        return None
+
+    received = 0
+    if not key_header:
+        with stats.span('extract'):
+            opener.write(0, extract_chunk(first_frame, header))
+        received = 1
+        stats.count('carrier_frames')
+        stats.count('bytes_extracted', FRAME_HEADER.size + header.length)
+    workers = min(workers, len(carriers))
+    bounds = [len(carriers) * i // workers for i in range(workers + 1)]
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_range_worker, initargs=(stop, results))
+    try:
+        futures = [executor.submit(_extract_range, video_path, carriers[bounds[i]:bounds[i + 1]], chunk_count, total_length)
+                   for i in range(workers)]
+        expected = None
+        while received < chunk_count:
+            try:
+                offset, data = results.get(timeout=0.1)
+            except queue.Empty:
+                if expected is None and all(future.done() for future in futures):
+                    # Chunks still in the queue are counted in the workers' results
+                    expected = sum(future.result() for future in futures) + (0 if key_header else 1)
+                if expected is not None and received >= expected:
+                    break
+                continue
+            opener.write(offset, data)
+            received += 1
+            stats.count('carrier_frames')
+            stats.count('bytes_extracted', FRAME_HEADER.size + len(data))
+            if progress:
+                progress(received, chunk_count)
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    return received == chunk_count
+
+class _ChunkCollector:
+    """Takes the place of a container.Opener to keep the extracted container for a cache."""
+
+    def __init__(self):
+        self.pieces = {}
 
-            pil_img = frame_to_pil_image(frame)
-            compressed_base64_message_chunk = lsb.reveal(pil_img)
+    def write(self, offset, data):
+        self.pieces[offset] = bytes(data)
 
-            if compressed_base64_message_chunk:
-                decoded_message = decompress_message(compressed_base64_message_chunk)
-                if decoded_message:
-                    decoded_messages.append(decoded_message)
+    def data(self):
+        return b''.join(self.pieces[offset] for offset in sorted(self.pieces))
 
+def unhide_video(video_path, password, stats=NULL_STATS, progress=None, seek='auto', cache=None, workers=1):
+    """Extract and decrypt the payload. Returns None if the video carries none.
+
+    Raises if the payload cannot be decrypted. ``progress`` works as in hide_video.
+    Each sealed chunk of the container is verified and decrypted as soon as
+    its frames have been extracted, so a wrong password fails at the first
+    one. In a keyed layout only the carrier frames are decoded: with
+    ``seek='auto'`` long gaps are crossed with CAP_PROP_POS_FRAMES, checked
+    against the chunk header and redone with grab() if the seek landed
+    elsewhere; ``seek='grab'`` never seeks.
+
+    With an extract_cache.ExtractionCache as ``cache`` the container is
+    extracted whole and cached before it is decrypted, and a later call on
+    the unchanged file decrypts the cached copy without decoding a frame.
+
+    With ``workers`` > 1 the carrier frames are split into ranges read by
+    that many processes (see _read_parallel); ``progress`` then counts chunks.
+    """
+    if cache is not None:
+        with stats.span('cache'):
+            key = cache.make_key(video_path, 'video')
+            payload = cache.get(key)
+        if payload is not None:
+            stats.count('cache_hits')
+            return container.unpack(payload, password, stats=stats)
+        opener = _ChunkCollector()
+    else:
+        opener = container.Opener(password, stats)
+    with stats.span('open'):
+        cap = cv2.VideoCapture(video_path)
+    try:
+        with stats.span('decode'):
+            ret, frame = cap.read()
+        if not ret:
+            return None
+        key_header = read_key_header(frame)
+        complete = None
+        if workers > 1:
+            complete = _read_parallel(video_path, frame, key_header, password, opener, stats, progress, workers)
+        if complete is None and key_header:
+            complete = _read_keyed(video_path, cap, key_header, password, opener, stats, progress, seek)
+        elif complete is None:
+            complete = _read_sequential(cap, frame, opener, stats, progress)
+    finally:
         cap.release()
-        hidden_message = ''.join(decoded_messages)
-        return decrypt_message(hidden_message.encode('latin1'), password)
+
+    if not complete:
+        return None
+    if cache is not None:
+        payload = opener.data()
+        cache.put(key, payload)
+        return container.unpack(payload, password, stats=stats)
+    return opener.finish()
+
+def unhide_data_from_video(video_path, password, stats=NULL_STATS, seek='auto', cache=None, workers=1):
+    try:
+        return unhide_video(video_path, password, stats, seek=seek, cache=cache, workers=workers)
     except Exception as e:
-        print(f"Error unhiding data from video: {e}")
+        print(f"Error unhiding data from video: {str(e) or type(e).__name__}")
         return None
     
 def main():
@@ -135,13 +633,40 @@ def main():
     hide_parser.add_argument('output_video', help='Path to save the output video file with the hidden message')
     hide_parser.add_argument('message', help='Message to hide in the video')
     hide_parser.add_argument('password', help='Password for encrypting the message')
+    hide_parser.add_argument('--file', action='store_true', help='Treat MESSAGE as the path of a (binary) file to hide')
+    hide_parser.add_argument('--keyed', action='store_true', help='Put the chunks in password-selected frames so unhide can seek straight to them')
+    hide_parser.add_argument('--depth', type=int, choices=range(1, lsb_engine.MAX_DEPTH + 1), default=1, help='Bits per channel (default 1)')
+    hide_parser.add_argument('--channels', type=lsb_engine.parse_channels, default=lsb_engine.ALL_CHANNELS, help="Channels to embed in, e.g. 'rgb' (default) or 'b'")
+    hide_parser.add_argument('--compression', choices=container.CODEC_NAMES, default='auto', help="Codec for the plaintext before encryption; 'auto' (default) keeps the smallest result")
+    hide_parser.add_argument('--level', type=int, help='Compression level for a named codec')
+    hide_parser.add_argument('--alloc-report', action='store_true', help='Print per-frame memory allocation statistics')
+    hide_parser.add_argument('--workers', type=int, default=1, help='Embed worker threads; more than 1 enables the pipelined encoder')
+    hide_parser.add_argument('--queue-depth', type=int, default=16, help='Decoded frames buffered ahead of the embed workers')
+    hide_parser.add_argument('--stats', metavar='PATH', help="Write per-stage timings and counters as JSON, or CSV if PATH ends in .csv ('-' for stdout)")
 
     # Subparser for unhiding data
     unhide_parser = subparsers.add_parser('unhide', help='Unhide a message from a video file')
     unhide_parser.add_argument('video', help='Path to the video file with the hidden message')
     unhide_parser.add_argument('password', help='Password for decrypting the hidden message')
+    unhide_parser.add_argument('--seek', choices=('auto', 'grab'), default='auto',
+                               help="How keyed videos skip non-carrier frames: 'auto' seeks across long gaps, 'grab' never seeks")
+    unhide_parser.add_argument('--output', help='Write the payload to this file (binary payloads default to <video>_payload.bin)')
+    unhide_parser.add_argument('--workers', type=int, default=1, help='Processes extracting ranges of carrier frames; more than 1 enables parallel extraction')
+    unhide_parser.add_argument('--cache-dir', help='Keep extracted (still encrypted) payloads in this directory so unhiding the unchanged video again only decrypts')
+    unhide_parser.add_argument('--stats', metavar='PATH', help="Write per-stage timings and counters as JSON, or CSV if PATH ends in .csv ('-' for stdout)")
+
+    # Capacity command
+    capacity_parser = subparsers.add_parser('capacity', help='Report how much payload a carrier can hold without encoding')
+    capacity.add_capacity_arguments(capacity_parser)
+
+    # Scan command
+    scan_parser = subparsers.add_parser('scan', help='List which images and videos carry a payload, reading only their first frames')
+    scan.add_scan_arguments(scan_parser)
 
     args = parser.parse_args()
+    if args.command == 'hide' and args.alloc_report and args.workers > 1:
+        parser.error("--alloc-report needs --workers 1")
+    stats = Stats() if getattr(args, 'stats', None) else NULL_STATS
 
     if args.command == 'hide':
         # Open the video to get frame rate, width, height, and codec information
@@ -158,16 +683,41 @@ def main():
 
         cap.release()
 
-        hide_data_in_video(args.input_video, args.output_video, frame_rate, frame_width, frame_height, codec, args.message, args.password)
+        message = args.message
+        if args.file:
+            with open(message, 'rb') as f:
+                message = f.read()
+
+        hide_data_in_video(args.input_video, args.output_video, frame_rate, frame_width, frame_height, codec, message, args.password, alloc_report=args.alloc_report,
+                           workers=args.workers, queue_depth=args.queue_depth, stats=stats, keyed=args.keyed,
+                           depth=args.depth, channels=args.channels, compression=args.compression,
+                           compression_level=args.level)
+    elif args.command == 'capacity':
+        capacity.capacity_cli(args)
+    elif args.command == 'scan':
+        scan.scan_cli(args)
     elif args.command == 'unhide':
-        decrypted_message = unhide_data_from_video(args.video, args.password)
-        if decrypted_message:
+        cache = None
+        if args.cache_dir:
+            from extract_cache import ExtractionCache
+            cache = ExtractionCache(directory=args.cache_dir)
+        decrypted_message = unhide_data_from_video(args.video, args.password, stats=stats, seek=args.seek, cache=cache,
+                                                   workers=args.workers)
+        if decrypted_message and (isinstance(decrypted_message, bytes) or args.output):
+            output = args.output or args.video.rsplit('.', 1)[0] + '_payload.bin'
+            with open(output, 'wb') as f:
+                f.write(decrypted_message if isinstance(decrypted_message, bytes) else decrypted_message.encode())
+            print(f"Decrypted payload ({len(decrypted_message)} bytes) saved to {output}")
+        elif decrypted_message:
             print(f"Decrypted Message: {decrypted_message}")
         else:
             print("Failed to decrypt the message or no hidden message found.")
     else:
         parser.print_help()
 
+    if stats.enabled:
+        stats.write(args.stats)
+
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
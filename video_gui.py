@@ -1,7 +1,9 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import cv2
-from video import encrypt_message, decrypt_message, hide_data_in_video, unhide_data_from_video
+from video import hide_video, unhide_video
+from extract_cache import extraction_cache
+from gui_jobs import JobCancelled, JobRunner, describe_error
 
 class VideoSteganographyGUI(ctk.CTk):
     def __init__(self):
@@ -10,7 +12,7 @@ class VideoSteganographyGUI(ctk.CTk):
 
         # Set the window size
         window_width = 700
-        window_height = 530
+        window_height = 590
 
         # Calculate the center position
         screen_width = self.winfo_screenwidth()
@@ -26,6 +28,7 @@ class VideoSteganographyGUI(ctk.CTk):
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
 
+        self.jobs = JobRunner(self, self.show_progress)
         self.create_widgets()
 
     def create_widgets(self):
@@ -46,7 +49,18 @@ class VideoSteganographyGUI(ctk.CTk):
         
         # Unhide Data Tab Widgets
         self.create_unhide_tab_widgets(unhide_tab)
-        
+
+        # Progress of the running job, shared by both tabs (one job per window)
+        status = ctk.CTkFrame(self)
+        status.pack(padx=20, pady=(0, 10), fill="x")
+        self.progress_bar = ctk.CTkProgressBar(status)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side="left", padx=10, pady=10, fill="x", expand=True)
+        self.status_label = ctk.CTkLabel(status, text="Idle", font=("Arial", 12), width=260, anchor="w")
+        self.status_label.pack(side="left", padx=10)
+        self.cancel_button = ctk.CTkButton(status, text="Cancel", width=80, state="disabled", command=self.cancel_job)
+        self.cancel_button.pack(side="left", padx=10)
+
     def create_hide_tab_widgets(self, parent):
         ctk.CTkLabel(parent, text="Input Video File:", font=("Arial", 12)).grid(row=0, column=0, padx=10, pady=10, sticky="w")
         self.input_video_path = ctk.CTkEntry(parent, width=300)
@@ -107,6 +121,27 @@ class VideoSteganographyGUI(ctk.CTk):
             self.unhide_input_video_path.delete(0, ctk.END)
             self.unhide_input_video_path.insert(0, file_path)
 
+    def show_progress(self, done, total, text):
+        if total:
+            self.progress_bar.set(min(done / total, 1.0))
+        self.status_label.configure(text=text)
+
+    def start_job(self, func, on_done, on_error):
+        if not self.jobs.start(func, on_done, on_error):
+            messagebox.showinfo("Busy", "Another job is still running in this window.")
+            return
+        self.progress_bar.set(0)
+        self.status_label.configure(text="Starting...")
+        self.cancel_button.configure(state="normal")
+
+    def finish_job(self, text):
+        self.cancel_button.configure(state="disabled")
+        self.status_label.configure(text=text)
+
+    def cancel_job(self):
+        self.jobs.cancel()
+        self.status_label.configure(text="Cancelling...")
+
     def hide_data(self):
         input_path = self.input_video_path.get()
         output_path = self.output_video_path.get()
@@ -118,15 +153,34 @@ class VideoSteganographyGUI(ctk.CTk):
             messagebox.showerror("Input Error", "Please fill in all fields.")
             return
 
+        if self.jobs.busy:
+            messagebox.showinfo("Busy", "Another job is still running in this window.")
+            return
+
         try:
-            encrypted_message = encrypt_message(message, password)
             frame_rate, frame_width, frame_height = self.get_video_properties(input_path)
-            codec_dict = {'HFYU': cv2.VideoWriter_fourcc(*'HFYU'), 'FFV1': cv2.VideoWriter_fourcc(*'FFV1')}
-            codec = codec_dict.get(codec, cv2.VideoWriter_fourcc(*'XVID'))
-            hide_data_in_video(input_path, output_path, frame_rate, frame_width, frame_height, codec, message, password)
-            messagebox.showinfo("Success", "Data hidden in video successfully.")
         except Exception as e:
             messagebox.showerror("Error", f"Error hiding data: {e}")
+            return
+        codec_dict = {'HFYU': cv2.VideoWriter_fourcc(*'HFYU'), 'FFV1': cv2.VideoWriter_fourcc(*'FFV1')}
+        codec = codec_dict.get(codec, cv2.VideoWriter_fourcc(*'XVID'))
+
+        def job(progress):
+            return hide_video(input_path, output_path, frame_rate, frame_width, frame_height, codec, message, password, progress=progress)
+
+        def done(carriers):
+            self.finish_job(f"Done - payload spread over {carriers} frame(s)")
+            messagebox.showinfo("Success", "Data hidden in video successfully.")
+
+        def failed(error):
+            # hide_video() removes a partial output itself
+            if isinstance(error, JobCancelled):
+                self.finish_job("Cancelled")
+            else:
+                self.finish_job("Failed")
+                messagebox.showerror("Error", f"Error hiding data: {describe_error(error)}")
+
+        self.start_job(job, done, failed)
 
 
     def unhide_data(self):
@@ -137,15 +191,29 @@ class VideoSteganographyGUI(ctk.CTk):
             messagebox.showerror("Input Error", "Please fill in all fields.")
             return
 
-        try:
-            decrypted_message = unhide_data_from_video(video_path, password)
+        def job(progress):
+            # A retry after a wrong password only repeats the decryption
+            return unhide_video(video_path, password, progress=progress, cache=extraction_cache)
+
+        def done(decrypted_message):
             if decrypted_message:
+                if isinstance(decrypted_message, bytes):
+                    decrypted_message = f"<binary payload, {len(decrypted_message)} bytes>"
+                self.finish_job("Done")
                 self.unhide_message_textbox.delete("1.0", ctk.END)
                 self.unhide_message_textbox.insert("1.0", decrypted_message)
             else:
+                self.finish_job("No hidden data found")
                 messagebox.showerror("Error", "Failed to unhide data or incorrect password.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error unhiding data: {e}")
+
+        def failed(error):
+            if isinstance(error, JobCancelled):
+                self.finish_job("Cancelled")
+            else:
+                self.finish_job("Failed")
+                messagebox.showerror("Error", f"Error unhiding data: {describe_error(error)}")
+
+        self.start_job(job, done, failed)
 
 
     def get_video_properties(self, video_path):
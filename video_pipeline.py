@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageTimer:
+    """Frames handled and busy time for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.frames += 1
+            self.busy += seconds
+
+    def fps(self):
+        return self.frames / self.busy if self.busy else 0.0
+
+
+def run_pipeline(cap, out, process_frame, workers=4, queue_depth=16, frame_written=None):
+    """Decode, process and encode frames concurrently.
+
+    A reader thread decodes frames into a bounded queue, ``workers`` threads
+    call ``process_frame(index, frame)`` (NumPy and OpenCV release the GIL for
+    the heavy work), and the calling thread writes the results in index order.
+    At most ``queue_depth + workers`` frames are held in memory at once.
+    ``frame_written(count)`` is called after each write; if it or the write
+    raises, the pipeline stops and the exception is re-raised once every
+    thread has finished.
+
+    Returns the number of frames written and the per-stage timers.
+    """
+    read_timer = StageTimer('read')
+    embed_timer = StageTimer('embed')
+    write_timer = StageTimer('write')
+
+    frames_in = queue.Queue(maxsize=queue_depth)
+    frames_out = queue.Queue()
+    # Frames in flight between the reader and the writer; bounds the reorder buffer
+    slots = threading.Semaphore(queue_depth + workers)
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        index = 0
+        try:
+            while not stop.is_set():
+                slots.acquire()
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                read_timer.add(time.perf_counter() - start)
+                frames_in.put((index, frame))
+                index += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                frames_in.put(_DONE)
+
+    def worker():
+        while True:
+            item = frames_in.get()
+            if item is _DONE:
+                frames_out.put(_DONE)
+                return
+            index, frame = item
+            try:
+                if not stop.is_set():
+                    start = time.perf_counter()
+                    process_frame(index, frame)
+                    embed_timer.add(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            frames_out.put((index, frame))
+
+    threads = [threading.Thread(target=reader, daemon=True)]
+    threads += [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    pending = {}
+    next_index = 0
+    finished_workers = 0
+    while finished_workers < workers:
+        item = frames_out.get()
+        if item is _DONE:
+            finished_workers += 1
+            continue
+        index, frame = item
+        pending[index] = frame
+        while next_index in pending:
+            frame = pending.pop(next_index)
+            if not stop.is_set():
+                # A failed write stops the pipeline like any other error, so the
+                # reader and workers have exited before the caller releases cap
+                try:
+                    start = time.perf_counter()
+                    out.write(frame)
+                    write_timer.add(time.perf_counter() - start)
+                    if frame_written:
+                        frame_written(next_index + 1)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+            next_index += 1
+            slots.release()
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return next_index, (read_timer, embed_timer, write_timer)
+
+
+# Stats span names hide_video() records for the three stages and the whole run
+STAGE_SPANS = ('decode', 'process', 'write')
+PIPELINE_SPAN = 'pipeline'
+
+
+def format_stage_report(stats):
+    """Frames/sec table for the pipeline stages recorded in ``stats``."""
+    lines = [f"{'stage':<8}{'frames':>8}{'busy s':>10}{'frames/s':>10}"]
+    for name in STAGE_SPANS:
+        frames, ns = stats.spans.get(name, (0, 0))
+        busy = ns / 1e9
+        lines.append(f"{name:<8}{frames:>8}{busy:>10.3f}{frames / busy if busy else 0:>10.1f}")
+    wall_time = stats.spans.get(PIPELINE_SPAN, (0, 0))[1] / 1e9
+    lines.append(f"overall: {frames} frames in {wall_time:.3f} s ({frames / wall_time if wall_time else 0:.1f} frames/s)")
+    return "\n".join(lines)